@@ -0,0 +1,145 @@
+###################################################################################################################
+# Runs batches of simulations (each a combination of scenario, algorithm and route file) across a pool of         #
+# processes, so that the simulations are spread over all of the cores of the machine rather than ran one after    #
+# another.                                                                                                        #
+#                                                                                                                 #
+# Each process runs a single chain of simulations with its own labelled SUMO connection and its own database,     #
+# and is then replaced, so no simulation state is shared between processes. Within a chain, the road network      #
+# held in memory is reused by each simulation of the same scenario rather than built again.                       #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import collections
+import datetime
+import multiprocessing
+import os
+
+from src.code import SumoConnection as sumo
+from src.code.SimulationContext import SimulationContext
+
+#############
+# CONSTANTS #
+#############
+
+# The number of processes in which to run simulations, None uses the number of cores of the machine
+BATCH_PROCESSES = None
+# When True, every simulation is ran independently with its own database, so the fairness metrics of each vehicle
+# aren't carried over from the previous simulation (with the same scenario and algorithm). This spreads the simulations
+# over the most processes. When False, the simulations of each (scenario, algorithm) are ran in order within a single
+# process, sharing a database as they would if ran one after another
+BATCH_INDEPENDENT_RUNS = False
+
+# The name given to the results of each ALGORITHM
+ALGORITHM_REFERENCES = {0: 'noRerouting',
+                        1: 'DSP',
+                        2: 'kPaths',
+                        3: 'DSP_fairness',
+                        4: 'fairness',
+                        5: 'viaPaths'}
+
+# A single simulation, with routeNumber being the number of the route file for the scenario
+BatchJob = collections.namedtuple('BatchJob', ['scenario', 'algorithm', 'routeNumber'])
+
+
+def createJobs(scenarios, algorithms, routeFiles):
+    """
+    Creates the jobs for every combination of scenario, algorithm and route file
+
+    Args:
+        scenarios (int[]): The SCENARIOs to be ran
+        algorithms (int[]): The ALGORITHMs to be ran
+        routeFiles (int): The number of route files for each scenario
+    Returns:
+        [[BatchJob]]: The chains of jobs, each to be ran in order within a single process
+    """
+    chains = []
+    for scenario in scenarios:
+        for algorithm in algorithms:
+            jobs = [BatchJob(scenario, algorithm, routeNumber) for routeNumber in range(1, routeFiles + 1)]
+
+            if BATCH_INDEPENDENT_RUNS:
+                chains.extend([job] for job in jobs)
+            else:
+                chains.append(jobs)
+
+    return chains
+
+
+def runJobChain(jobs):
+    """
+    Runs a chain of simulations in order, each with its own context (sharing the road network of the previous
+    simulation when of the same scenario). This is ran within a worker process.
+
+    Args:
+        jobs ([BatchJob]): The simulations to be ran
+    Returns:
+        [(str, float)]: The simulation reference and time taken (in seconds) of each simulation
+    """
+    sumo.AUTOMATED_TESTING = True
+    # The GUI can't be used when running simulations in parallel
+    sumo.SUMO_GUI = False
+    sumo.SUMO_BINARY = sumo.SUMO_BINARY.replace('sumo-gui', 'sumo')
+
+    timesTaken = []
+    # The context of the previous simulation, holding the road network of the current scenario
+    network = None
+
+    for job in jobs:
+        if job.scenario != sumo.SCENARIO:
+            sumo.loadScenario(job.scenario)
+            network = None
+
+        reference = '{}_2_hours_{}'.format(sumo.SCENARIO_NAME, ALGORITHM_REFERENCES[job.algorithm])
+        if BATCH_INDEPENDENT_RUNS:
+            databaseReference = '{}_{}'.format(reference, job.routeNumber)
+        else:
+            databaseReference = reference
+
+        simulationReference = "{reference}_{simNum}_".format(reference=reference, simNum=job.routeNumber)
+        # Each simulation has its own uniquely labelled connection and its own settings
+        context = SimulationContext(network=network, label="{}{}".format(simulationReference, os.getpid()),
+                                    algorithm=job.algorithm,
+                                    databaseLocation="{location}{reference}.sqlite".format(
+                                        location=sumo.DATABASE_DIR, reference=databaseReference),
+                                    simulationReference=simulationReference)
+
+        print('########################')
+        print('Simulation reference: {} (process {})'.format(simulationReference, os.getpid()))
+        print('########################')
+
+        startTime = datetime.datetime.now()
+        network = sumo.createSim('routes_{}_2hours_{}.xml'.format(sumo.SCENARIO_NAME, job.routeNumber),
+                                 context=context)
+        timesTaken.append((simulationReference, (datetime.datetime.now() - startTime).total_seconds()))
+
+    return timesTaken
+
+
+def runBatch(chains, processes=None):
+    """
+    Runs the chains of simulations across a pool of processes
+
+    Args:
+        chains ([[BatchJob]]): The chains of simulations, as given by createJobs()
+        processes (int): The number of processes, None uses BATCH_PROCESSES
+    Returns:
+        [(str, float)]: The simulation reference and time taken (in seconds) of every simulation
+    """
+    if processes is None:
+        processes = BATCH_PROCESSES or os.cpu_count()
+
+    timesTaken = []
+
+    # Each process is replaced after running a single chain so that every chain starts with fresh simulation variables
+    with multiprocessing.Pool(processes=max(1, min(processes, len(chains))), maxtasksperchild=1) as pool:
+        for chainTimesTaken in pool.imap_unordered(runJobChain, chains):
+            timesTaken.extend(chainTimesTaken)
+
+    return timesTaken
@@ -0,0 +1,496 @@
+###################################################################################################################
+# A customisable contraction hierarchy of the routing graph (see PathFinding), allowing the routes of many        #
+# vehicles to be found during each rerouting period without searching the road network for each of them.          #
+#                                                                                                                 #
+# The hierarchy is built in two stages. The edges of the routing graph are first contracted in a fixed order (the #
+# edge with the fewest remaining neighbours first), adding a shortcut between every pair of neighbours of each    #
+# contracted edge. This only depends on the road network, so is built once and stored alongside it (see           #
+# NetworkCache). The hierarchy is then customised with the edge weights, giving the cost of every shortcut        #
+# through a single pass over the triangles of the hierarchy (vectorised through NumPy), each time the edge        #
+# weights change.                                                                                                 #
+#                                                                                                                 #
+# Routes are found by searching upwards through the hierarchy from both the source and the target, while every    #
+# route to a single target (see reverseShortestPathTree()) is found by searching upwards from the target and then #
+# sweeping down through the hierarchy.                                                                            #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import heapq
+import numpy as np
+
+from collections.abc import Mapping
+
+from src.code.EdgeWeights import EdgeWeightView
+from src.code.SimulationContext import getContext
+
+#############
+# VARIABLES #
+#############
+
+# Stores the contraction hierarchy of the routing graph (see buildContractionHierarchy()), None if not built
+contractionHierarchy = None
+
+# The label of an edge not yet reached during a search through the hierarchy
+_UNREACHED = (float("inf"), None)
+
+
+def buildContractionHierarchy(context=None):
+    """
+    Builds the contraction hierarchy of the routing graph (which must already be built, see
+    PathFinding.buildRoutingGraph())
+
+    Args:
+        context (SimulationContext): The simulation in which to store the hierarchy, by default the module variables
+    """
+    context = getContext(context)
+    context.contractionHierarchy = ContractionHierarchy(context.successors)
+
+
+class ContractionHierarchy:
+    """
+    The routing graph with its edges (the nodes of the hierarchy) contracted in a fixed order. Each edge is given its
+    position in the contraction order (its rank), with the hierarchy being held as the arcs between each edge and its
+    higher ranked neighbours, where an arc may be travelled in either direction.
+    """
+
+    def __init__(self, graph):
+        """
+        Args:
+            graph ({str: (str)}): The graph in the form {edge: (outgoingEdges)}
+        """
+        edges = sorted(set(graph).union(*graph.values()))
+        edgeIndex = {edge: index for index, edge in enumerate(edges)}
+
+        # The neighbours of each edge in either direction, to which shortcuts are added as edges are contracted
+        neighbours = [set() for _ in edges]
+        for edge, outgoingEdges in graph.items():
+            for outgoingEdge in outgoingEdges:
+                if outgoingEdge != edge:
+                    neighbours[edgeIndex[edge]].add(edgeIndex[outgoingEdge])
+                    neighbours[edgeIndex[outgoingEdge]].add(edgeIndex[edge])
+
+        order, higherNeighbours = self._contract(neighbours)
+
+        rank = [0] * len(edges)
+        for position, index in enumerate(order):
+            rank[index] = position
+
+        # Edges are held by rank from now on
+        self.edges = tuple(edges[index] for index in order)
+        self.edgeIndex = {edge: position for position, edge in enumerate(self.edges)}
+        self.edgeArray = np.array(self.edges, dtype=object)
+
+        # The arcs from each edge to its higher ranked neighbours, in the form [[(neighbour, arc)]], the arcs of each
+        # edge being ordered by the rank of the neighbour
+        self.upwardArcs = []
+        arcIndex = {}
+        arcTails = []
+        arcHeads = []
+        for position, index in enumerate(order):
+            upwardArcs = []
+            for neighbour in sorted(rank[higher] for higher in higherNeighbours[index]):
+                arcIndex[(position, neighbour)] = len(arcTails)
+                upwardArcs.append((neighbour, len(arcTails)))
+                arcTails.append(position)
+                arcHeads.append(neighbour)
+            self.upwardArcs.append(upwardArcs)
+
+        self.arcTails = np.array(arcTails, dtype=np.int64)
+        self.arcHeads = np.array(arcHeads, dtype=np.int64)
+
+        # The parent of each edge within the elimination tree (its lowest ranked higher neighbour, -1 if none), every
+        # higher neighbour of an edge being one of its ancestors
+        self.parent = [upwardArcs[0][0] if upwardArcs else -1 for upwardArcs in self.upwardArcs]
+        depth = np.zeros(len(self.edges), dtype=np.int64)
+        for position in range(len(self.edges) - 1, -1, -1):
+            if self.parent[position] >= 0:
+                depth[position] = depth[self.parent[position]] + 1
+
+        self._buildTriangles(arcIndex)
+
+        # The arcs ordered by the depth of their lower edge, so that the sweep down through the hierarchy handles each
+        # depth at once, with the arcs of each depth given by sweepStarts
+        sweepOrder = np.argsort(depth[self.arcTails], kind='stable')
+        self.sweepArcs = sweepOrder
+        self.sweepTails = self.arcTails[sweepOrder]
+        self.sweepHeads = self.arcHeads[sweepOrder]
+        self.sweepStarts = np.searchsorted(depth[self.sweepTails], np.arange(depth.max(initial=0) + 2))
+
+        # The connections of the routing graph, each given as the arc between its edges and whether it is travelled
+        # upwards (from the lower to the higher ranked edge)
+        inputTails = []
+        inputHeads = []
+        for edge in self.edges:
+            for outgoingEdge in graph.get(edge, ()):
+                if outgoingEdge != edge:
+                    inputTails.append(self.edgeIndex[edge])
+                    inputHeads.append(self.edgeIndex[outgoingEdge])
+        self.inputTails = np.array(inputTails, dtype=np.int64)
+        self.inputHeads = np.array(inputHeads, dtype=np.int64)
+        self.inputUpward = self.inputTails < self.inputHeads
+        self.inputArcs = np.array([arcIndex[(min(tail, head), max(tail, head))]
+                                   for tail, head in zip(inputTails, inputHeads)], dtype=np.int64)
+        # The connections of each edge are consecutive, with the connections of the edges in inputGroupTails beginning
+        # at inputGroupStarts
+        self.inputGroupStarts = np.flatnonzero(np.r_[True, self.inputTails[1:] != self.inputTails[:-1]]) \
+            if inputTails else np.zeros(0, dtype=np.int64)
+        self.inputGroupTails = self.inputTails[self.inputGroupStarts]
+        self.inputGroups = np.repeat(np.arange(len(self.inputGroupStarts)),
+                                     np.diff(np.r_[self.inputGroupStarts, len(inputTails)]))
+
+    def __len__(self):
+        return len(self.edges)
+
+    @staticmethod
+    def _contract(neighbours):
+        """
+        Contracts the edges, always contracting the edge with the fewest remaining neighbours next (keeping the number
+        of shortcuts added low)
+
+        Args:
+            neighbours ([{int}]): The neighbours of each edge, which are altered by the contraction
+        Returns:
+            order (int[]): The edges in the order in which they were contracted
+            higherNeighbours ([{int}]): The neighbours of each edge at the time it was contracted (its higher ranked
+                neighbours)
+        """
+        contracted = [False] * len(neighbours)
+        queue = [(len(edgeNeighbours), index) for index, edgeNeighbours in enumerate(neighbours)]
+        heapq.heapify(queue)
+        order = []
+        higherNeighbours = [None] * len(neighbours)
+
+        while queue:
+            degree, index = heapq.heappop(queue)
+            # The number of neighbours of the edge has changed since it was queued
+            if contracted[index] or degree != len(neighbours[index]):
+                continue
+
+            contracted[index] = True
+            order.append(index)
+            remaining = higherNeighbours[index] = neighbours[index]
+
+            # Each pair of remaining neighbours is joined by a shortcut through the contracted edge
+            for neighbour in remaining:
+                neighbourNeighbours = neighbours[neighbour]
+                neighbourNeighbours.discard(index)
+                neighbourNeighbours.update(remaining)
+                neighbourNeighbours.discard(neighbour)
+                heapq.heappush(queue, (len(neighbourNeighbours), neighbour))
+
+        return order, higherNeighbours
+
+    def _buildTriangles(self, arcIndex):
+        """
+        Finds the lower triangles of every arc (the edges ranked below both edges of the arc which neighbour them both),
+        through which the cost of the arc is found during customisation
+
+        Args:
+            arcIndex ({(int, int): int}): The arc between each pair of neighbouring edges, in the form
+                {(lowerEdge, higherEdge): arc}
+        """
+        # The customisation level of each edge, the triangles of an edge only depending on those of lower levels
+        level = [0] * len(self.edges)
+        lowerArcs = []
+        upperArcs = []
+        shortcutArcs = []
+        triangleLevels = []
+
+        for position, upwardArcs in enumerate(self.upwardArcs):
+            for first, (lowerNeighbour, lowerArc) in enumerate(upwardArcs):
+                level[lowerNeighbour] = max(level[lowerNeighbour], level[position] + 1)
+                for upperNeighbour, upperArc in upwardArcs[first + 1:]:
+                    lowerArcs.append(lowerArc)
+                    upperArcs.append(upperArc)
+                    shortcutArcs.append(arcIndex[(lowerNeighbour, upperNeighbour)])
+                    triangleLevels.append(level[position])
+
+        triangleOrder = np.argsort(np.array(triangleLevels, dtype=np.int64), kind='stable')
+        # The triangles {edge, lowerNeighbour, upperNeighbour}, of the edge ranked below both neighbours, each given as
+        # the arcs (edge, lowerNeighbour), (edge, upperNeighbour) and (lowerNeighbour, upperNeighbour)
+        self.triangleLowerArcs = np.array(lowerArcs, dtype=np.int64)[triangleOrder]
+        self.triangleUpperArcs = np.array(upperArcs, dtype=np.int64)[triangleOrder]
+        self.triangleShortcutArcs = np.array(shortcutArcs, dtype=np.int64)[triangleOrder]
+        self.levelStarts = np.searchsorted(np.array(triangleLevels, dtype=np.int64)[triangleOrder],
+                                           np.arange(max(level, default=0) + 2))
+
+    def customise(self, weights, version=None):
+        """
+        Gives the cost of travelling each arc of the hierarchy in either direction for the edge weights
+
+        Args:
+            weights ({str: float}): The cost (estimated travel time) of each edge
+            version (int): The version of the edge weights (see EdgeWeights.EdgeWeightStore.version)
+        Returns:
+            CustomisedHierarchy: The hierarchy customised with the edge weights
+        """
+        if isinstance(weights, EdgeWeightView):
+            edgeWeights = weights.getWeights(self.edges)
+        else:
+            edgeWeights = np.fromiter((weights[edge] for edge in self.edges), dtype=float, count=len(self.edges))
+
+        # The cost of travelling each arc upwards and downwards, where entering an edge costs its weight
+        upwardCosts = np.full(len(self.arcTails), np.inf)
+        downwardCosts = np.full(len(self.arcTails), np.inf)
+        upward = self.inputUpward
+        upwardCosts[self.inputArcs[upward]] = edgeWeights[self.inputHeads[upward]]
+        downwardCosts[self.inputArcs[~upward]] = edgeWeights[self.inputHeads[~upward]]
+
+        lowerArcs = self.triangleLowerArcs
+        upperArcs = self.triangleUpperArcs
+        shortcutArcs = self.triangleShortcutArcs
+
+        # A shortcut may be travelled through each of its lower triangles, the arcs of a triangle already being final
+        # once every lower level has been handled
+        for start, end in zip(self.levelStarts[:-1].tolist(), self.levelStarts[1:].tolist()):
+            if start == end:
+                continue
+            lower = lowerArcs[start:end]
+            upper = upperArcs[start:end]
+            np.minimum.at(upwardCosts, shortcutArcs[start:end], downwardCosts[lower] + upwardCosts[upper])
+            np.minimum.at(downwardCosts, shortcutArcs[start:end], downwardCosts[upper] + upwardCosts[lower])
+
+        # The triangle through which each arc is travelled at its cost (-1 if travelled directly), used to unpack the
+        # arcs of a route into edges
+        upwardVia = np.full(len(self.arcTails), -1, dtype=np.int64)
+        downwardVia = np.full(len(self.arcTails), -1, dtype=np.int64)
+        for via, costs, throughCosts in ((upwardVia, upwardCosts, downwardCosts[lowerArcs] + upwardCosts[upperArcs]),
+                                         (downwardVia, downwardCosts,
+                                          downwardCosts[upperArcs] + upwardCosts[lowerArcs])):
+            tight = np.flatnonzero((throughCosts == costs[shortcutArcs]) & np.isfinite(throughCosts))
+            via[shortcutArcs[tight]] = tight
+
+        return CustomisedHierarchy(self, edgeWeights, upwardCosts, downwardCosts, upwardVia, downwardVia, version)
+
+
+class CustomisedHierarchy:
+    """
+    A contraction hierarchy customised with a set of edge weights, through which the lowest cost routes over those
+    weights are found
+    """
+
+    def __init__(self, hierarchy, edgeWeights, upwardCosts, downwardCosts, upwardVia, downwardVia, version=None):
+        """
+        Args:
+            hierarchy (ContractionHierarchy): The hierarchy
+            edgeWeights (np.ndarray): The weight of each edge, by rank
+            upwardCosts (np.ndarray): The cost of travelling each arc upwards
+            downwardCosts (np.ndarray): The cost of travelling each arc downwards
+            upwardVia (np.ndarray): The triangle through which each arc is travelled upwards, -1 if travelled directly
+            downwardVia (np.ndarray): The triangle through which each arc is travelled downwards, -1 if travelled
+                directly
+            version (int): The version of the edge weights
+        """
+        self.hierarchy = hierarchy
+        self.edgeWeights = edgeWeights
+        self.upwardCosts = upwardCosts
+        self.downwardCosts = downwardCosts
+        self.version = version
+
+        # Searches through the hierarchy are made edge by edge, which is quicker through lists than arrays
+        self._weights = edgeWeights.tolist()
+        self._upwardCosts = upwardCosts.tolist()
+        self._downwardCosts = downwardCosts.tolist()
+        self._upwardVia = upwardVia.tolist()
+        self._downwardVia = downwardVia.tolist()
+        # The costs of the arcs in the order in which they are swept (see reverseShortestPathTree())
+        self._sweepCosts = upwardCosts[hierarchy.sweepArcs]
+
+    def _searchUpwards(self, start, costs):
+        """
+        Searches upwards through the hierarchy from an edge, following the elimination tree (which holds every edge
+        reachable upwards from the edge)
+
+        Args:
+            start (int): The rank of the edge
+            costs ([float]): The cost of each arc, upwards when searching from the source of a route and downwards
+                when searching from the target
+        Returns:
+            {int: (float, (int, int))}: The lowest cost of each edge reached, alongside the previous edge and arc
+        """
+        upwardArcs = self.hierarchy.upwardArcs
+        parent = self.hierarchy.parent
+
+        labels = {start: (0.0, None)}
+        edge = start
+        while edge >= 0:
+            label = labels.get(edge)
+            if label is not None:
+                cost = label[0]
+                for neighbour, arc in upwardArcs[edge]:
+                    newCost = cost + costs[arc]
+                    if newCost < labels.get(neighbour, _UNREACHED)[0]:
+                        labels[neighbour] = (newCost, (edge, arc))
+            edge = parent[edge]
+
+        return labels
+
+    def _unpackArc(self, route, arc, upwards):
+        """
+        Adds the edges travelled through an arc onto the end of the route (excluding the edge in which the arc begins)
+
+        Args:
+            route (int[]): The ranks of the edges of the route
+            arc (int): The arc
+            upwards (bool): True if the arc is travelled upwards
+        """
+        hierarchy = self.hierarchy
+        stack = [(arc, upwards)]
+
+        while stack:
+            arc, upwards = stack.pop()
+            triangle = self._upwardVia[arc] if upwards else self._downwardVia[arc]
+
+            if triangle < 0:
+                route.append(int(hierarchy.arcHeads[arc] if upwards else hierarchy.arcTails[arc]))
+            elif upwards:
+                # Down to the lowest edge of the triangle, then up to the higher neighbour
+                stack.append((int(hierarchy.triangleUpperArcs[triangle]), True))
+                stack.append((int(hierarchy.triangleLowerArcs[triangle]), False))
+            else:
+                stack.append((int(hierarchy.triangleLowerArcs[triangle]), True))
+                stack.append((int(hierarchy.triangleUpperArcs[triangle]), False))
+
+    def shortestPath(self, source, target):
+        """
+        Finds the lowest cost route from the source edge to the target edge. The cost of the route includes the cost
+        of the source edge itself.
+
+        Args:
+            source (str): The edge in which the route begins
+            target (str): The edge in which the route ends
+        Returns:
+            (float, str[]): The cost of the route and the route itself, (None, None) if no route exists
+        """
+        edgeIndex = self.hierarchy.edgeIndex
+        sourceRank = edgeIndex.get(source)
+        targetRank = edgeIndex.get(target)
+
+        if sourceRank is None or targetRank is None:
+            return None, None
+        if sourceRank == targetRank:
+            return self._weights[sourceRank], [source]
+
+        forward = self._searchUpwards(sourceRank, self._upwardCosts)
+        backward = self._searchUpwards(targetRank, self._downwardCosts)
+
+        # The edge at the top of the lowest cost route
+        meeting = None
+        bestCost = float("inf")
+        for edge, (cost, _) in forward.items():
+            backwardLabel = backward.get(edge)
+            if backwardLabel is not None and cost + backwardLabel[0] < bestCost:
+                bestCost = cost + backwardLabel[0]
+                meeting = edge
+
+        if meeting is None:
+            return None, None
+
+        arcs = []
+        edge = meeting
+        while edge != sourceRank:
+            edge, arc = forward[edge][1]
+            arcs.append(arc)
+
+        route = [sourceRank]
+        for arc in reversed(arcs):
+            self._unpackArc(route, arc, True)
+        edge = meeting
+        while edge != targetRank:
+            edge, arc = backward[edge][1]
+            self._unpackArc(route, arc, False)
+
+        # The cost is summed along the route, as it would be by a search through the road network
+        cost = 0
+        for edge in route:
+            cost += self._weights[edge]
+
+        edges = self.hierarchy.edges
+        return cost, [edges[edge] for edge in route]
+
+    def reverseShortestPathTree(self, target):
+        """
+        Finds the lowest cost from every edge to the target edge, by searching upwards through the hierarchy from the
+        target and then sweeping down through the hierarchy (a single sweep serves any number of source edges)
+
+        Args:
+            target (str): The edge in which routes end
+        Returns:
+            remainingCost ({str: float}): The lowest cost from each edge to the target, excluding the cost of the edge
+                itself (only containing edges which can reach the target)
+            nextEdge ({str: str}): The edge after each edge on its lowest cost route to the target
+            (both given as read-only views over the costs found)
+        """
+        hierarchy = self.hierarchy
+        targetRank = hierarchy.edgeIndex.get(target)
+        if targetRank is None:
+            return {target: 0}, {target: None}
+
+        # The lowest cost from each edge to the target, first through the edges above the target
+        costs = np.full(len(hierarchy), np.inf)
+        labels = self._searchUpwards(targetRank, self._downwardCosts)
+        costs[np.fromiter(labels, dtype=np.int64, count=len(labels))] = [label[0] for label in labels.values()]
+
+        # Then down through the hierarchy, with every higher neighbour of an edge (each being at a lesser depth)
+        # already having its lowest cost
+        sweepStarts = hierarchy.sweepStarts.tolist()
+        for start, end in zip(sweepStarts[1:-1], sweepStarts[2:]):
+            np.minimum.at(costs, hierarchy.sweepTails[start:end],
+                          self._sweepCosts[start:end] + costs[hierarchy.sweepHeads[start:end]])
+
+        # The next edge of each edge is the first outgoing edge through which it reaches the target at the lowest cost
+        nextRanks = np.full(len(hierarchy), -1, dtype=np.int64)
+        if len(hierarchy.inputHeads):
+            throughCosts = self.edgeWeights[hierarchy.inputHeads] + costs[hierarchy.inputHeads]
+            lowestCosts = np.minimum.reduceat(throughCosts, hierarchy.inputGroupStarts)
+            positions = np.where(throughCosts == lowestCosts[hierarchy.inputGroups], np.arange(len(throughCosts)),
+                                 len(throughCosts))
+            nextRanks[hierarchy.inputGroupTails] = hierarchy.inputHeads[np.minimum.reduceat(positions,
+                                                                                            hierarchy.inputGroupStarts)]
+
+        reached = np.isfinite(costs).tolist()
+        nextEdges = hierarchy.edgeArray[nextRanks].tolist()
+        nextEdges[targetRank] = None
+
+        return _TreeView(hierarchy, costs.tolist(), reached), _TreeView(hierarchy, nextEdges, reached)
+
+
+class _TreeView(Mapping):
+    """
+    A read-only {edge: value} view over a value given to every edge of a hierarchy, only holding the edges which are
+    able to reach the target of a reverse shortest path tree (see CustomisedHierarchy.reverseShortestPathTree())
+    """
+
+    def __init__(self, hierarchy, values, reached):
+        """
+        Args:
+            hierarchy (ContractionHierarchy): The hierarchy
+            values (list): The value of each edge, by rank
+            reached (bool[]): True for each edge (by rank) able to reach the target
+        """
+        self._hierarchy = hierarchy
+        self._values = values
+        self._reached = reached
+
+    def __getitem__(self, edge):
+        rank = self._hierarchy.edgeIndex.get(edge)
+        if rank is None or not self._reached[rank]:
+            raise KeyError(edge)
+        return self._values[rank]
+
+    def __contains__(self, edge):
+        rank = self._hierarchy.edgeIndex.get(edge)
+        return rank is not None and self._reached[rank]
+
+    def __iter__(self):
+        return (edge for edge, reached in zip(self._hierarchy.edges, self._reached) if reached)
+
+    def __len__(self):
+        return sum(self._reached)
@@ -10,11 +10,13 @@ __author__ = "Jonathan Harper"
 # IMPORTS #
 ###########
 
+import queue
 import sqlite3
+import threading
 
 from src.code import SumoConnection as sumo
-from src.code import RoutingFunctions as func
-from src.code import SimulationFunctions as sim
+from src.code import Vehicles as vehicleState
+from src.code.SimulationContext import getContext
 
 #############
 # CONSTANTS #
@@ -23,27 +25,158 @@ from src.code import SimulationFunctions as sim
 VEHICLE_OUTPUT_TABLE = "vehicle_output"
 SIMULATION_OUTPUT_TABLE = "simulation_output"
 
+# The journal mode of the database, write-ahead logging allowing each period's writes to be committed without
+# rewriting the database file
+JOURNAL_MODE = "WAL"
+# How often SQLite waits for the writes to reach the disk, NORMAL only waiting at checkpoints when in WAL mode (a
+# crash can lose the most recent periods but never corrupts the database)
+SYNCHRONOUS = "NORMAL"
+
+# The number of writes which may be waiting for the background writer, beyond which the simulation waits for the
+# writer to catch up (rather than holding ever more results in memory)
+WRITER_QUEUE_SIZE = 32
+# The most time (s) waited for the background writer to commit the writes still queued once it is told to stop
+WRITER_STOP_TIMEOUT = 60
+
+# Updates the values for the given vehicleID if it already exists, otherwise insert into the DB
+VEHICLE_UPSERT = ("INSERT OR REPLACE INTO {} (vehicleID, numberTimesRerouted, cumulativeExtraTime, "
+                  "totalTimeSpentInSystem) VALUES (?, ?, ?, ?)".format(VEHICLE_OUTPUT_TABLE))
+SIMULATION_UPSERT = ("INSERT OR REPLACE INTO {} (simIndexTimestep, fairnessIndex, standardDeviationQOE, "
+                     "meanCongestionLevel) VALUES (?, ?, ?, ?)".format(SIMULATION_OUTPUT_TABLE))
+
+
+def connect(location):
+    """
+    Opens a connection to the database
+
+    Args:
+        location (str): The location of the database
+    Returns:
+        sqlite3.Connection: The connection
+    """
+    conn = sqlite3.connect(location)
+    conn.execute("PRAGMA journal_mode={}".format(JOURNAL_MODE))
+    conn.execute("PRAGMA synchronous={}".format(SYNCHRONOUS))
+    return conn
+
+
+class DatabaseWriter(threading.Thread):
+    """
+    Writes the results of the simulation to the database in the background through its own connection, so that the
+    simulation doesn't wait for each write to be committed. Each write is (statement, rows), the rows being tuples so
+    that they can't change once queued. The writes waiting when the writer is ready are committed together.
+    """
+
+    def __init__(self, location):
+        """
+        Args:
+            location (str): The location of the database
+        """
+        super().__init__(name="DatabaseWriter", daemon=True)
+        self.location = location
+        # The writes waiting to be made, with None stopping the writer
+        self.writes = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        # The error raised when writing, raised again within the simulation when next flushed
+        self.error = None
+
+    def run(self):
+        conn = connect(self.location)
+
+        stopped = False
+        while not stopped:
+            writes = [self.writes.get()]
+            # Every write already waiting is committed alongside the first
+            while True:
+                try:
+                    writes.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Found before writing, so that the writer still stops when a write fails
+            stopped = None in writes
+
+            try:
+                for write in writes:
+                    if write is not None and self.error is None:
+                        conn.executemany(*write)
+                conn.commit()
+            except Exception as error:
+                conn.rollback()
+                self.error = error
+
+            for _ in writes:
+                self.writes.task_done()
+
+        conn.close()
+
+    def write(self, statement, rows):
+        """
+        Queues a write, waiting for space when WRITER_QUEUE_SIZE writes are already waiting
+
+        Args:
+            statement (str): The SQL statement
+            rows ((tuple)): The parameters of the statement for each row
+        """
+        self.writes.put((statement, rows))
+
+    def flush(self):
+        """
+        Waits until every queued write has been committed
+        """
+        self.writes.join()
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def stop(self):
+        """
+        Commits every queued write and stops the writer, raising the error raised when writing (if any)
+        """
+        self.writes.put(None)
+        self.join(WRITER_STOP_TIMEOUT)
+
+        if self.is_alive():
+            raise RuntimeError("The database writer didn't stop within {}s".format(WRITER_STOP_TIMEOUT))
+        self.flush()
+
 
 class Database:
     """
-    This is where the database and its corresponding tables are defined.
+    This is where the database and its corresponding tables are defined. Each database has its own connection, so
+    that simulations ran alongside each other don't share a connection.
     """
 
-    def __init__(self):
-        Database.conn = sqlite3.connect(sumo.DATABASE_LOCATION)
-        Database.cursor = Database.conn.cursor()
+    def __init__(self, backgroundWriter=False, location=None):
+        """
+        Args:
+            backgroundWriter (bool): True if the results should be written by a DatabaseWriter in the background,
+                otherwise they're written (and committed) as they're given
+            location (str): The location of the database, by default DATABASE_LOCATION (in SumoConnection)
+        """
+        if location is None:
+            location = sumo.DATABASE_LOCATION
+
+        self.conn = connect(location)
+        self.cursor = self.conn.cursor()
+        # The writer of the results, None when written as they're given
+        self.writer = None
+
+        # The row of each vehicle last written to the vehicle table by this database, in the form
+        # {vehicleID: (vehicleID, numberTimesRerouted, cumulativeExtraTime, totalTimeSpentInSystem)}
+        self.writtenVehicles = {}
 
         try:
             # Creates a net table called 'vehicle_output' storing the vehicleID in the first column as a primary key
-            Database.cursor.execute('CREATE TABLE {} (vehicleID INTEGER PRIMARY KEY)'.format(VEHICLE_OUTPUT_TABLE))
+            self.cursor.execute('CREATE TABLE {} (vehicleID INTEGER PRIMARY KEY)'.format(VEHICLE_OUTPUT_TABLE))
             # Adding in the column 'numberTimesRerouted'
-            Database.cursor.execute("ALTER TABLE {} ADD COLUMN 'numberTimesRerouted' INTEGER"
+            self.cursor.execute("ALTER TABLE {} ADD COLUMN 'numberTimesRerouted' INTEGER"
                                     .format(VEHICLE_OUTPUT_TABLE))
             # Adding in the column 'cumulativeExtraTime'
-            Database.cursor.execute("ALTER TABLE {} ADD COLUMN 'cumulativeExtraTime' INTEGER"
+            self.cursor.execute("ALTER TABLE {} ADD COLUMN 'cumulativeExtraTime' INTEGER"
                                     .format(VEHICLE_OUTPUT_TABLE))
             # Adding in the column 'totalTimeSpentInSystem'
-            Database.cursor.execute("ALTER TABLE {} ADD COLUMN 'totalTimeSpentInSystem' REAL"
+            self.cursor.execute("ALTER TABLE {} ADD COLUMN 'totalTimeSpentInSystem' REAL"
                                     .format(VEHICLE_OUTPUT_TABLE))
         except sqlite3.OperationalError:
             print("Table \'{}\' already created".format(VEHICLE_OUTPUT_TABLE))
@@ -51,42 +184,78 @@ class Database:
         try:
             # Creates a net table called 'simulation_output' storing the timestep, the simulation number, and the
             # corresponding information
-            Database.cursor.execute('CREATE TABLE {} (simIndexTimestep String PRIMARY KEY)'
+            self.cursor.execute('CREATE TABLE {} (simIndexTimestep String PRIMARY KEY)'
                                     .format(SIMULATION_OUTPUT_TABLE))
-            Database.cursor.execute("ALTER TABLE {} ADD COLUMN 'fairnessIndex' REAL"
+            self.cursor.execute("ALTER TABLE {} ADD COLUMN 'fairnessIndex' REAL"
                                     .format(SIMULATION_OUTPUT_TABLE))
-            Database.cursor.execute("ALTER TABLE {} ADD COLUMN 'standardDeviationQOE' REAL"
+            self.cursor.execute("ALTER TABLE {} ADD COLUMN 'standardDeviationQOE' REAL"
                                     .format(SIMULATION_OUTPUT_TABLE))
-            Database.cursor.execute("ALTER TABLE {} ADD COLUMN 'meanCongestionLevel' REAL"
+            self.cursor.execute("ALTER TABLE {} ADD COLUMN 'meanCongestionLevel' REAL"
                                     .format(SIMULATION_OUTPUT_TABLE))
         except sqlite3.OperationalError:
             print("Table \'{}\' already created".format(SIMULATION_OUTPUT_TABLE))
 
-    @staticmethod
-    def populateDBVehicleTable():
+        if backgroundWriter:
+            self.writer = DatabaseWriter(location)
+            self.writer.start()
+
+    def write(self, statement, rows):
         """
-        Populates the DB with information regarding the finished simulation
+        Writes rows to the database, through the background writer if there is one
+
+        Args:
+            statement (str): The SQL statement
+            rows ((tuple)): The parameters of the statement for each row
+        """
+        if self.writer is not None:
+            self.writer.write(statement, rows)
+        else:
+            self.cursor.executemany(statement, rows)
+            # Commits any changes made to the database
+            self.conn.commit()
+
+    def flush(self):
+        """
+        Waits until the rows given to the background writer have been committed, so that they may be read
+        """
+        if self.writer is not None:
+            self.writer.flush()
+
+    def stopWriter(self):
         """
-        for vehicle in func.vehicleReroutedAmount:
-            # # Updates the values for the given vehicleID if it already exists, otherwise insert into the DB
-            Database.cursor.execute(
-                "INSERT OR REPLACE INTO {table} (vehicleID, numberTimesRerouted, cumulativeExtraTime, "
-                "totalTimeSpentInSystem) "
-                "VALUES ({vehicleID}, COALESCE({reroutedAmount}, '{reroutedAmount}'), "
-                "COALESCE({extraTimeAddition}, '{extraTimeAddition}'), "
-                "COALESCE({totalTime}, '{totalTime}'))"
-                .format(table=VEHICLE_OUTPUT_TABLE,
-                        vehicleID=vehicle,
-                        rerouteAddition=func.vehicleReroutedAmount[vehicle],
-                        reroutedAmount=func.vehicleReroutedAmount[vehicle],
-                        extraTimeAddition=func.cumulativeExtraTime[vehicle],
-                        totalTime=sim.timeSpentInNetwork[vehicle]))
-
-        # Commits any changes made to the database
-        Database.conn.commit()
-
-    @staticmethod
-    def populateDBSimulationTable(i, fairnessIndex, sd, simulationIndex, meanCongestion):
+        Commits the rows given to the background writer and stops it, any later rows being written as they're given
+        """
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.stop()
+
+    def populateDBVehicleTable(self, context=None):
+        """
+        Populates the DB with the fairness metrics of the vehicles. Only the vehicles whose metrics have changed since
+        they were last written are written (rather than every vehicle ever seen), within a single statement.
+
+        Args:
+            context (SimulationContext): The simulation, by default the module variables
+        """
+        context = getContext(context)
+        writtenVehicles = self.writtenVehicles
+
+        # The metrics of every vehicle are gathered at once
+        vehicles = list(context.vehicleReroutedAmount)
+        metrics = vehicleState.gatherValues(vehicles, context.vehicleReroutedAmount, context.cumulativeExtraTime,
+                                            context.timeSpentInNetwork)
+
+        changedVehicles = []
+        for row in zip(vehicles, *(values.tolist() for values in metrics)):
+            vehicle = row[0]
+            if writtenVehicles.get(vehicle) != row:
+                changedVehicles.append(row)
+                writtenVehicles[vehicle] = row
+
+        if changedVehicles:
+            self.write(VEHICLE_UPSERT, tuple(changedVehicles))
+
+    def populateDBSimulationTable(self, i, fairnessIndex, sd, simulationIndex, meanCongestion):
         """
         Populates the DB with information regarding the finished simulation
 
@@ -99,40 +268,28 @@ class Database:
         """
         simIndex = str(simulationIndex + str(i))
 
-        Database.cursor.execute(
-            "INSERT OR REPLACE INTO {table} (simIndexTimestep, fairnessIndex, standardDeviationQOE, "
-            "meanCongestionLevel) "
-            "VALUES ('{index}', "
-            "COALESCE({fairness}, '{fairness}'), "
-            "COALESCE({standard}, '{standard}'), "
-            "COALESCE({congestion}, '{congestion}'))"
-                .format(
-                    table=SIMULATION_OUTPUT_TABLE,
-                    index=simIndex,
-                    fairness=fairnessIndex,
-                    standard=sd,
-                    congestion=meanCongestion))
-        # Commits any changes made to the database
-        Database.conn.commit()
-
-    @staticmethod
-    def closeDB():
-        """
-        Closes the database
-        """
-        # Closes the connection to the database
-        Database.conn.close()
-
-    @staticmethod
-    def getAllTables():
+        self.write(SIMULATION_UPSERT, ((simIndex, fairnessIndex, sd, meanCongestion),))
+
+    def closeDB(self):
+        """
+        Closes the database, once the background writer has committed all of its rows
+        """
+        try:
+            self.stopWriter()
+        finally:
+            # Closes the connection to the database
+            self.conn.close()
+
+    def getAllTables(self):
         """
         Gets the table names for all tables present in the database
 
         Return:
             [str]: The names of all of the tables
         """
+        self.flush()
         # Stores the table names held in tuples
-        tableNamesUnformatted = Database.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        tableNamesUnformatted = self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         # Stores all the table names
         tableNamesFormatted = []
         for table in tableNamesUnformatted:
@@ -150,8 +307,7 @@ class Database:
         for table in tableNames:
             self.clearTable(table)
 
-    @staticmethod
-    def getDBTableContents(tableName):
+    def getDBTableContents(self, tableName):
         """
         Puts the rows of a table into a list
         Args:
@@ -159,7 +315,8 @@ class Database:
         Returns:
             entries (str[]): List containing the table contents
         """
-        entries = Database.cursor.execute('SELECT * FROM {}'.format(tableName)).fetchall()
+        self.flush()
+        entries = self.cursor.execute('SELECT * FROM {}'.format(tableName)).fetchall()
         return entries
 
     def fairnessMetricsIntoDictionary(self):
@@ -179,13 +336,17 @@ class Database:
 
         return entryDict
 
-    @staticmethod
-    def clearTable(tableName):
+    def clearTable(self, tableName):
         """
         Clears a single table from the database
 
         Args:
             tableName (str): The table to clear
         """
-        Database.cursor.execute("DELETE FROM {}".format(tableName))
-        Database.conn.commit()
+        self.flush()
+        self.cursor.execute("DELETE FROM {}".format(tableName))
+        self.conn.commit()
+
+        # Every vehicle must be written again
+        if tableName == VEHICLE_OUTPUT_TABLE:
+            self.writtenVehicles = {}
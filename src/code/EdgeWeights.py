@@ -0,0 +1,244 @@
+###################################################################################################################
+# Stores the estimated travel times (edge weights) of every edge in the road network within NumPy arrays, indexed #
+# by edge, so that the weights of the entire road network can be updated at once rather than edge by edge.       #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import sys
+import numpy as np
+
+from collections.abc import Mapping, MutableMapping
+
+#############
+# CONSTANTS #
+#############
+
+# Estimated travel times are bounded to this many times their free-flow travel time
+MAX_FREE_FLOW_MULTIPLIER = 15
+# The travel time of an edge is only given to SUMO again once it differs from the travel time last given to SUMO by
+# more than this fraction (0 gives SUMO every change)
+ADAPTED_TRAVEL_TIME_TOLERANCE = 0.01
+
+
+class EdgeWeightStore:
+    """
+    Holds the estimated travel time of every edge (internal edges included) in a fixed order, with the position of
+    each edge given by edgeIndex.
+
+    edgeSpeedGlobal and adjustedEdgeSpeedGlobal give {edge: travelTime} access to the travel times, the latter being
+    the travel times as penalised during rerouting.
+    """
+
+    def __init__(self, freeFlowSpeed):
+        """
+        Args:
+            freeFlowSpeed ({str: float}): The free-flow travel time of each edge
+        """
+        # Interning the edge IDs speeds up the lookups made with the IDs given back by TraCI
+        self.edgeIDs = tuple(sys.intern(edge) for edge in freeFlowSpeed)
+        self.edgeIndex = {edge: index for index, edge in enumerate(self.edgeIDs)}
+
+        self.freeFlowTimes = np.fromiter(freeFlowSpeed.values(), dtype=float, count=len(self.edgeIDs))
+        self.maxTravelTimes = self.freeFlowTimes * MAX_FREE_FLOW_MULTIPLIER
+        self.travelTimes = self.freeFlowTimes.copy()
+        self.adjustedTravelTimes = self.freeFlowTimes.copy()
+        # The travel times last given to SUMO, NaN if never given
+        self.pushedTravelTimes = np.full(len(self.edgeIDs), np.nan)
+        # Incremented each time the travel times change, so that anything found with the travel times (e.g. routes) is
+        # known to be out of date
+        self.version = 0
+        # The travel times as a dictionary (see getSnapshot()) and the version they were taken at
+        self._snapshot = None
+        self._snapshotVersion = None
+
+        self.edgeSpeedGlobal = EdgeWeightView(self, "travelTimes")
+        self.adjustedEdgeSpeedGlobal = AdjustableEdgeWeightView(self, "adjustedTravelTimes")
+
+    def update(self, travelTimes):
+        """
+        Replaces the travel times of every edge, bounding them to MAX_FREE_FLOW_MULTIPLIER times their free-flow
+        travel time, and resets the adjusted travel times to match. The version is incremented if any travel time has
+        changed.
+
+        Args:
+            travelTimes (np.ndarray): The estimated travel time of each edge, in the same order as edgeIDs
+        """
+        boundedTravelTimes = np.minimum(travelTimes, self.maxTravelTimes)
+        if not np.array_equal(boundedTravelTimes, self.travelTimes):
+            self.travelTimes[:] = boundedTravelTimes
+            self.version += 1
+        self.adjustedTravelTimes[:] = self.travelTimes
+
+    def getSnapshot(self):
+        """
+        Gives the travel times as a dictionary, for the searches which look up the travel time of each edge reached
+        (looking up a dictionary being far quicker than looking up the array through edgeSpeedGlobal). The dictionary
+        is only made once for each version and is shared, so must not be altered.
+
+        Returns:
+            {str: float}: The travel time of each edge
+        """
+        if self._snapshotVersion != self.version:
+            self._snapshot = dict(zip(self.edgeIDs, self.travelTimes.tolist()))
+            self._snapshotVersion = self.version
+        return self._snapshot
+
+    def getChangedEdges(self):
+        """
+        Gives the edges whose travel time differs from the travel time last given to SUMO by more than
+        ADAPTED_TRAVEL_TIME_TOLERANCE (including edges never given to SUMO)
+
+        Returns:
+            np.ndarray: The positions of the changed edges within edgeIDs
+        """
+        difference = np.abs(self.travelTimes - self.pushedTravelTimes)
+        # Comparisons with NaN are False, so edges never given to SUMO are always seen as changed
+        unchanged = difference <= ADAPTED_TRAVEL_TIME_TOLERANCE * self.pushedTravelTimes
+
+        return np.flatnonzero(~unchanged)
+
+    def pushTravelTimes(self, adaptTraveltime):
+        """
+        Gives SUMO the travel times of only those edges which have changed since they were last given to SUMO
+
+        Args:
+            adaptTraveltime (function): Sets the travel time of an edge within SUMO, taking (edge, travelTime)
+        Returns:
+            int: The number of edges which weren't given to SUMO, as their travel times haven't changed
+        """
+        changedEdges = self.getChangedEdges()
+
+        for index, travelTime in zip(changedEdges.tolist(), self.travelTimes[changedEdges].tolist()):
+            adaptTraveltime(self.edgeIDs[index], travelTime)
+
+        self.pushedTravelTimes[changedEdges] = self.travelTimes[changedEdges]
+
+        return len(self.edgeIDs) - len(changedEdges)
+
+    def setPushedTravelTime(self, edge, travelTime):
+        """
+        Records a travel time given to SUMO for an edge outside of pushTravelTimes()
+
+        Args:
+            edge (str): The edge
+            travelTime (float): The travel time given to SUMO
+        """
+        self.pushedTravelTimes[self.edgeIndex[edge]] = travelTime
+
+
+class EdgeWeightView(Mapping):
+    """
+    A read-only {edge: travelTime} view over one of the travel time arrays of an EdgeWeightStore. A copy made through
+    deepcopy() is a dictionary holding the travel times at the time of copying.
+    """
+
+    def __init__(self, store, attribute):
+        """
+        Args:
+            store (EdgeWeightStore): The store holding the travel times
+            attribute (str): The name of the store's array holding the travel times
+        """
+        self._store = store
+        self._attribute = attribute
+
+    def __getitem__(self, edge):
+        return getattr(self._store, self._attribute)[self._store.edgeIndex[edge]].item()
+
+    def __contains__(self, edge):
+        return edge in self._store.edgeIndex
+
+    def __iter__(self):
+        return iter(self._store.edgeIDs)
+
+    def __len__(self):
+        return len(self._store.edgeIDs)
+
+    def getWeights(self, edges):
+        """
+        Args:
+            edges ((str)): The edges
+        Returns:
+            np.ndarray: The travel time of each edge, in the same order as edges
+        """
+        edgeIndex = self._store.edgeIndex
+        indices = np.fromiter((edgeIndex[edge] for edge in edges), dtype=np.int64, count=len(edges))
+        return getattr(self._store, self._attribute)[indices]
+
+    def getLowestFreeFlowRatio(self):
+        """
+        Returns:
+            float: The lowest ratio between the travel time of an edge and its free-flow travel time (edges without a
+            free-flow travel time being left out)
+        """
+        freeFlowTimes = self._store.freeFlowTimes
+        positive = freeFlowTimes > 0
+        return float(np.min(getattr(self._store, self._attribute)[positive] / freeFlowTimes[positive], initial=np.inf))
+
+    def __deepcopy__(self, memo):
+        return dict(zip(self._store.edgeIDs, getattr(self._store, self._attribute).tolist()))
+
+    def __repr__(self):
+        return repr(self.__deepcopy__(None))
+
+
+class AdjustableEdgeWeightView(EdgeWeightView, MutableMapping):
+    """
+    An {edge: travelTime} view over one of the travel time arrays of an EdgeWeightStore, where the travel time of an
+    edge may be changed, but edges can't be added or removed
+    """
+
+    def __setitem__(self, edge, travelTime):
+        getattr(self._store, self._attribute)[self._store.edgeIndex[edge]] = travelTime
+
+    def __delitem__(self, edge):
+        raise TypeError("Edges can't be removed from the edge weight store")
+
+
+class EdgeWeightOverlay(MutableMapping):
+    """
+    An {edge: travelTime} view over other edge weights, where the travel time of an edge may be changed (e.g.
+    penalised during rerouting) without altering the edge weights beneath. Only the changed travel times are held, so
+    the overlay is made without copying the edge weights.
+    """
+
+    def __init__(self, weights):
+        """
+        Args:
+            weights ({str: float}): The edge weights beneath the overlay
+        """
+        self._weights = weights
+        # The changed travel times, in the form {edge: travelTime}
+        self._changes = {}
+
+    def __getitem__(self, edge):
+        changes = self._changes
+        if edge in changes:
+            return changes[edge]
+        return self._weights[edge]
+
+    def __setitem__(self, edge, travelTime):
+        if edge not in self._weights:
+            raise KeyError(edge)
+        self._changes[edge] = travelTime
+
+    def __delitem__(self, edge):
+        # The edge is given the travel time beneath the overlay again
+        if edge not in self._weights:
+            raise KeyError(edge)
+        self._changes.pop(edge, None)
+
+    def __contains__(self, edge):
+        return edge in self._weights
+
+    def __iter__(self):
+        return iter(self._weights)
+
+    def __len__(self):
+        return len(self._weights)
@@ -0,0 +1,321 @@
+###################################################################################################################
+# Keeps the fairness index of the vehicles in the network up to date from one rerouting period to the next, in    #
+# place of calculating the QOE of every vehicle again each period (see SimulationFunctions.fairnessIndex()).      #
+#                                                                                                                 #
+# The QOE of a vehicle before normalisation is maxTime * (a * VRA / time + b * CET / time), where                 #
+# a = FAIRNESS_WEIGHTING / largestVRA and b = (1 - FAIRNESS_WEIGHTING) / largestCET. The normalised QOEs are an   #
+# affine function of the score a * VRA / time + b * CET / time, so the fairness index is given by the largest and #
+# smallest scores (the normalisation bounds) alongside the mean and standard deviation of the scores. The ratios  #
+# VRA / time and CET / time of each vehicle are kept, alongside running sums of the ratios, their squares and     #
+# their product, so that the standard deviation of the scores is given for any a and b. The sums are of the       #
+# ratios less their mean when the bounds were last found, so that little precision is lost in the subtraction.    #
+#                                                                                                                 #
+# Only the vehicles which have entered, left or had their metrics changed since the previous period are updated.  #
+# The largest metrics and the normalisation bounds are only found again (in a single pass over the arrays) when a #
+# vehicle which may have held them has changed or left, or when a and b have changed. When most of the vehicles   #
+# have entered, left or changed, the tracker is built again in a single pass in place of being updated.           #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import numpy as np
+
+from src.code.Vehicles import VehicleColumn
+
+#############
+# CONSTANTS #
+#############
+
+# The metrics used to calculate the QOE of each vehicle, in the order held
+QOE_METRICS = ('vehicleReroutedAmount', 'cumulativeExtraTime', 'timeSpentInNetwork')
+
+# The fraction of the vehicles which must have entered, left or changed for the tracker to be built again in a single
+# pass, in place of being updated
+REBUILD_FRACTION = 0.25
+
+
+def ratioMoments(ratios, shift):
+    """
+    Args:
+        ratios (np.ndarray): The ratios (VRA / time, CET / time) of vehicles, in the form [[vraRatio, cetRatio]]
+        shift (np.ndarray): The amount taken from the ratios, in the form [vraRatio, cetRatio]
+    Returns:
+        np.ndarray: The sums of the VRA ratios, CET ratios, their squares and their product (less the shift)
+    """
+    vraRatios = ratios[:, 0] - shift[0]
+    cetRatios = ratios[:, 1] - shift[1]
+    return np.array([vraRatios.sum(), cetRatios.sum(), vraRatios @ vraRatios, cetRatios @ cetRatios,
+                     vraRatios @ cetRatios])
+
+
+class FairnessTracker:
+    """
+    Tracks the fairness index of the vehicles in the network, whose metrics are held in a VehicleStore. The arrays are
+    indexed by the slots of the vehicles in the store.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store (VehicleStore): The store holding the metrics of the vehicles
+        """
+        self.store = store
+
+        # True for the vehicles currently tracked (those in the network at the previous update)
+        self.tracked = np.zeros(store.capacity, dtype=np.bool_)
+        self.size = 0
+        # The VRA, CET and time spent in the network of each vehicle
+        self.metrics = np.zeros((store.capacity, len(QOE_METRICS)))
+        # The VRA and CET of each vehicle divided by its time spent in the network (0 if no time has been spent)
+        self.ratios = np.zeros((store.capacity, 2))
+        # The score of each vehicle for the weights the bounds were found for
+        self.scores = np.zeros(store.capacity)
+
+        # The sums of the ratios of the tracked vehicles (see ratioMoments()), less the shift
+        self.moments = np.zeros(5)
+        self.shift = np.zeros(2)
+        # The largest VRA, CET and time spent in the network, None if they must be found again
+        self.largestMetrics = None
+        # The weights (a, b), the largest and smallest scores, the smallest score whose QOE is 0 (these vehicles being
+        # left out of the standard deviation), and the sums and number of the ratios left out. None if these must be
+        # found again
+        self.bounds = None
+
+    def canTrack(self, context):
+        """
+        Args:
+            context (SimulationContext): The simulation
+        Returns:
+            bool: True if the metrics of the simulation are held in the store of this tracker
+        """
+        return all(isinstance(getattr(context, metric), VehicleColumn) and getattr(context, metric).store is self.store
+                   for metric in QOE_METRICS)
+
+    def fairnessIndex(self, vehicles, fairnessWeighting):
+        """
+        Gives the fairness index of the vehicles, as given by SimulationFunctions.fairnessIndex()
+
+        Args:
+            vehicles ([str]): The vehicles in the network
+            fairnessWeighting (float): The weighting of VRA to CET (FAIRNESS_WEIGHTING)
+        Returns:
+            fairnessIndex (float): The fairness index, F
+            standardDeviation (float): The standard deviation of the QOEs
+        """
+        self.update(vehicles, fairnessWeighting)
+
+        weights, largestScore, smallestScore, _, excludedMoments, excludedCount = self.bounds
+        # No vehicle has spent time in the network, or every vehicle has the same QOE
+        if self.size == 0 or self.largestMetrics[2] == 0 or largestScore == 0 or largestScore == smallestScore:
+            return 1, 0
+
+        a, b = weights
+        sumVRA, sumCET, sumVRASquared, sumCETSquared, sumProduct = self.moments - excludedMoments
+        count = self.size - excludedCount
+
+        meanScore = (a * sumVRA + b * sumCET) / count
+        meanSquaredScore = (a * a * sumVRASquared + 2 * a * b * sumProduct + b * b * sumCETSquared) / count
+        scoreDeviation = np.sqrt(max(meanSquaredScore - meanScore * meanScore, 0))
+
+        # The QOEs range from 0 (the largest score) to 10 (the smallest score)
+        standardDeviation = 10 * scoreDeviation / (largestScore - smallestScore)
+
+        return 1 - ((2 * standardDeviation) / 10), standardDeviation
+
+    def update(self, vehicles, fairnessWeighting):
+        """
+        Updates the vehicles which have entered, left or changed since the previous update
+
+        Args:
+            vehicles ([str]): The vehicles in the network
+            fairnessWeighting (float): The weighting of VRA to CET (FAIRNESS_WEIGHTING)
+        """
+        store = self.store
+        if len(self.tracked) < store.capacity:
+            self._grow(store.capacity)
+
+        current = np.zeros(store.capacity, dtype=np.bool_)
+        current[store.getSlots(vehicles)] = True
+
+        removed = np.flatnonzero(self.tracked & ~current)
+        added = np.flatnonzero(current & ~self.tracked)
+        changed = store.takeChangedSlots()
+        changed = changed[self.tracked[changed] & current[changed]]
+
+        size = int(np.count_nonzero(current))
+        if len(removed) + len(changed) + len(added) > REBUILD_FRACTION * max(size, self.size):
+            self._rebuild(current, size, fairnessWeighting)
+            return
+
+        # The previous metrics, ratios and scores of the vehicles which have left, followed by those which have changed
+        oldSlots = np.concatenate((removed, changed))
+        oldMetrics = self.metrics[oldSlots]
+        oldRatios = self.ratios[oldSlots]
+        oldScores = self.scores[oldSlots]
+
+        # The vehicles which have changed, followed by those which have entered, whose metrics are found again
+        newSlots = np.concatenate((changed, added))
+        newMetrics, newRatios = self._gatherMetrics(newSlots)
+
+        self.tracked = current
+        self.size = size
+        self.metrics[removed] = 0
+        self.ratios[removed] = 0
+        self.metrics[newSlots] = newMetrics
+        self.ratios[newSlots] = newRatios
+        self.moments += ratioMoments(newRatios, self.shift) - ratioMoments(oldRatios, self.shift)
+
+        self._updateLargestMetrics(oldMetrics, newMetrics, len(removed))
+        self._updateBounds(oldScores, newSlots, newRatios, fairnessWeighting)
+
+    def _rebuild(self, current, size, fairnessWeighting):
+        """
+        Builds the tracker again from the metrics of every vehicle in the network
+
+        Args:
+            current (np.ndarray): True for the slots of the vehicles in the network
+            size (int): The number of vehicles in the network
+            fairnessWeighting (float): The weighting of VRA to CET (FAIRNESS_WEIGHTING)
+        """
+        slots = np.flatnonzero(current)
+        metrics, ratios = self._gatherMetrics(slots)
+
+        self.tracked = current
+        self.size = size
+        self.metrics[slots] = metrics
+        self.ratios[slots] = ratios
+
+        self.largestMetrics = np.maximum(metrics.max(axis=0, initial=0), 0)
+        self._findBounds(slots, ratios, self._weights(fairnessWeighting))
+
+    def _gatherMetrics(self, slots):
+        """
+        Args:
+            slots (np.ndarray): The slots of the vehicles, each of which must have a value set for each metric
+        Returns:
+            metrics (np.ndarray): The VRA, CET and time spent in the network of each vehicle
+            ratios (np.ndarray): The VRA and CET of each vehicle divided by its time spent in the network
+        """
+        store = self.store
+        metrics = np.empty((len(slots), len(QOE_METRICS)))
+        for column, metric in enumerate(QOE_METRICS):
+            present = store.present[metric][slots]
+            if not present.all():
+                raise KeyError(store.vehicleIDs[slots[np.argmin(present)]])
+            metrics[:, column] = store.values[metric][slots]
+
+        ratios = np.zeros((len(slots), 2))
+        np.divide(metrics[:, :2], metrics[:, 2:], out=ratios, where=metrics[:, 2:] != 0)
+        return metrics, ratios
+
+    def _grow(self, capacity):
+        """
+        Gives room for the number of vehicles the store has room for
+
+        Args:
+            capacity (int): The number of vehicles the store has room for
+        """
+        extraCapacity = capacity - len(self.tracked)
+        self.tracked = np.concatenate((self.tracked, np.zeros(extraCapacity, dtype=np.bool_)))
+        self.metrics = np.concatenate((self.metrics, np.zeros((extraCapacity, len(QOE_METRICS)))))
+        self.ratios = np.concatenate((self.ratios, np.zeros((extraCapacity, 2))))
+        self.scores = np.concatenate((self.scores, np.zeros(extraCapacity)))
+
+    def _updateLargestMetrics(self, oldMetrics, newMetrics, removedCount):
+        """
+        Updates the largest VRA, CET and time spent in the network, finding them again if a vehicle which may have held
+        one has left or had it lowered
+
+        Args:
+            oldMetrics (np.ndarray): The previous metrics of the vehicles which have left, followed by those which have
+                changed
+            newMetrics (np.ndarray): The metrics of the vehicles which have changed, followed by those which have
+                entered
+            removedCount (int): The number of vehicles which have left
+        """
+        if self.largestMetrics is not None:
+            changedCount = len(oldMetrics) - removedCount
+            lowered = np.vstack((oldMetrics[:removedCount],
+                                 np.where(newMetrics[:changedCount] < oldMetrics[removedCount:],
+                                          oldMetrics[removedCount:], -np.inf)))
+            if (lowered >= self.largestMetrics).any():
+                self.largestMetrics = None
+
+        if self.largestMetrics is None:
+            self.largestMetrics = np.maximum(self.metrics[self.tracked].max(axis=0, initial=0), 0)
+        elif len(newMetrics):
+            self.largestMetrics = np.maximum(self.largestMetrics, newMetrics.max(axis=0))
+
+    def _updateBounds(self, oldScores, newSlots, newRatios, fairnessWeighting):
+        """
+        Updates the scores of the vehicles which have changed or entered, finding the bounds again if the weights have
+        changed or a vehicle which may have given a bound has changed or left
+
+        Args:
+            oldScores (np.ndarray): The previous scores of the vehicles which have left or changed
+            newSlots (np.ndarray): The vehicles which have changed or entered
+            newRatios (np.ndarray): The ratios of the vehicles which have changed or entered
+            fairnessWeighting (float): The weighting of VRA to CET (FAIRNESS_WEIGHTING)
+        """
+        weights = self._weights(fairnessWeighting)
+        newScores = newRatios @ weights
+        if self.bounds is not None:
+            boundWeights, largestScore, smallestScore, excludedScore, _, _ = self.bounds
+            if not np.array_equal(weights, boundWeights) or (oldScores >= excludedScore).any() or \
+                    (oldScores <= smallestScore).any() or (newScores >= min(excludedScore, largestScore)).any() or \
+                    (newScores < smallestScore).any():
+                self.bounds = None
+
+        if self.bounds is not None:
+            self.scores[newSlots] = newScores
+            return
+
+        trackedSlots = np.flatnonzero(self.tracked)
+        self._findBounds(trackedSlots, self.ratios[trackedSlots], weights)
+
+    def _weights(self, fairnessWeighting):
+        """
+        Args:
+            fairnessWeighting (float): The weighting of VRA to CET (FAIRNESS_WEIGHTING)
+        Returns:
+            np.ndarray: The weights (a, b) of the ratios in the score of each vehicle
+        """
+        largestVRA, largestCET, _ = self.largestMetrics
+        return np.array([fairnessWeighting / largestVRA if largestVRA != 0 else 0,
+                         (1 - fairnessWeighting) / largestCET if largestCET != 0 else 0])
+
+    def _findBounds(self, slots, ratios, weights):
+        """
+        Finds the scores, the bounds and the sums of the ratios of every tracked vehicle again in a single pass, so that
+        no error accumulates in the sums
+
+        Args:
+            slots (np.ndarray): The slots of the tracked vehicles
+            ratios (np.ndarray): The ratios of the tracked vehicles
+            weights (np.ndarray): The weights (a, b) of the ratios
+        """
+        scores = ratios @ weights
+        self.scores[slots] = scores
+
+        largestScore = max(scores.max(initial=0), 0)
+        smallestScore = scores.min() if self.size else 0
+        if largestScore == smallestScore:
+            self.bounds = (weights, largestScore, smallestScore, np.inf, np.zeros(5), 0)
+            return
+
+        # The QOEs of 0 (those of the largest scores) are left out of the standard deviation of the QOEs, only the
+        # scores near the largest score being normalised to find them
+        excluded = scores >= largestScore - 1e-6 * (largestScore - smallestScore)
+        excluded[excluded] = np.isclose(10 - ((scores[excluded] - smallestScore) / (largestScore - smallestScore) * 10),
+                                        0)
+        excludedScore = scores[excluded].min(initial=np.inf)
+        self.shift = ratios[~excluded].mean(axis=0)
+        self.moments = ratioMoments(ratios, self.shift)
+        self.bounds = (weights, largestScore, smallestScore, excludedScore, ratioMoments(ratios[excluded], self.shift),
+                       int(excluded.sum()))
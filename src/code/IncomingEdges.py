@@ -0,0 +1,100 @@
+###################################################################################################################
+# Finds the edges upstream of an edge (the edges from which vehicles may travel onto the edge within a number of  #
+# edges), used to find the vehicles which may travel into a congested edge.                                       #
+#                                                                                                                 #
+# The incoming edges of the road network are held in compressed sparse row (CSR) form, and are searched a whole   #
+# frontier of edges at a time. The upstream edges of an edge are only found when first needed (when the edge      #
+# first becomes congested) and are then remembered.                                                               #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+from collections.abc import Mapping
+
+
+class IncomingEdgeIndex(Mapping):
+    """
+    Gives {edge: upstreamEdges} access to the edges up to MAX_EDGE_RECURSIONS_RANGE (in RoutingFunctions) incoming
+    edges away from each edge, in place of a dictionary holding the upstream edges of every edge.
+
+    The incoming edges of the edge at position i (of edgeIDs) are given by incomingEdges[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, directedGraphEdges):
+        """
+        Args:
+            directedGraphEdges ({str: {str}}): The road network in the form {edge: {outgoingEdges}}
+        """
+        self.edgeIDs = tuple(directedGraphEdges)
+        self.edgeIndex = {edge: index for index, edge in enumerate(self.edgeIDs)}
+
+        incoming = [[] for _ in self.edgeIDs]
+        for edge, outgoingEdges in directedGraphEdges.items():
+            for outgoingEdge in outgoingEdges:
+                if outgoingEdge in self.edgeIndex:
+                    incoming[self.edgeIndex[outgoingEdge]].append(self.edgeIndex[edge])
+
+        self.offsets = [0]
+        self.incomingEdges = []
+        for incomingEdges in incoming:
+            self.incomingEdges.extend(sorted(incomingEdges))
+            self.offsets.append(len(self.incomingEdges))
+
+        # The upstream edges already found, in the form {(edge, searchRange): upstreamEdges}
+        self._upstreamEdges = {}
+
+    def getUpstreamEdges(self, edge, searchRange):
+        """
+        Gives the edges from which the edge can be reached within searchRange edges (the edge itself included if it
+        can be returned to within searchRange edges). These are remembered, so are only found once for each edge.
+
+        Args:
+            edge (str): The edge
+            searchRange (int): The maximum number of incoming edges away from the edge to search
+        Returns:
+            frozenset: The upstream edges
+        """
+        key = (edge, searchRange)
+        if key not in self._upstreamEdges:
+            offsets = self.offsets
+            incomingEdges = self.incomingEdges
+            reached = set()
+            frontier = [self.edgeIndex[edge]]
+
+            # Each loop finds the edges a single incoming edge further away from the edge than the frontier
+            for _ in range(searchRange):
+                nextFrontier = []
+                for frontierEdge in frontier:
+                    for incomingEdge in incomingEdges[offsets[frontierEdge]:offsets[frontierEdge + 1]]:
+                        if incomingEdge not in reached:
+                            reached.add(incomingEdge)
+                            nextFrontier.append(incomingEdge)
+
+                if not nextFrontier:
+                    break
+                frontier = nextFrontier
+
+            self._upstreamEdges[key] = frozenset(self.edgeIDs[index] for index in reached)
+
+        return self._upstreamEdges[key]
+
+    def __getitem__(self, edge):
+        # Imported here as RoutingFunctions imports this module (through InitialMapHelperFunctions), and the range is
+        # read on each access as it may be changed once the index is built
+        from src.code import RoutingFunctions as func
+        return self.getUpstreamEdges(edge, func.MAX_EDGE_RECURSIONS_RANGE)
+
+    def __contains__(self, edge):
+        return edge in self.edgeIndex
+
+    def __iter__(self):
+        return iter(self.edgeIDs)
+
+    def __len__(self):
+        return len(self.edgeIDs)
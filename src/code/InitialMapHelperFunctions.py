@@ -24,12 +24,16 @@ if not sumo.COMPUTER:
     os.environ["SUMO_HOME"] = "/Users/jonathan/Documents/comp3200/sumo"
 
 import time
-import traci
+from src.code.SumoBackend import traci
 
-import src.code.RoutingFunctions
-from src.code import RoutingFunctions as func
-from src.code import Database as db
+from src.code import PathFinding as pathFinding
+from src.code import ContractionHierarchy as hierarchy
+from src.code import Landmarks as landmarks
+from src.code import NetworkCache as cache
 from src.code import SimulationFunctions as sim
+from src.code import RoutingFunctions as func
+from src.code.IncomingEdges import IncomingEdgeIndex
+from src.code.SimulationContext import getContext
 
 #############
 # CONSTANTS #
@@ -61,94 +65,195 @@ directedGraphEdges = {}
 singleOutgoingEdges = set()
 # These are the lanes which share an edge which has at least 2 outgoing edges from it
 reroutingLanes = set()
-# Stores the edge and the corresponding incoming edges up to MAX_EDGE_RECURSION_RANGE away
+# Stores the edge and the corresponding incoming edges up to MAX_EDGE_RECURSION_RANGE away, an IncomingEdgeIndex once
+# the map is initialised
 multiIncomingEdges = {}
 
 # This stores the free-flow speeds of all of the edges, {edge: freeFlowSpeed}
 freeFlowSpeed = {}
 
+# The special edges within junctions (which have ':' prepended to them), which aren't part of the road network
+internalEdges = []
+
 database_pointer = None
 
 
-def endSim(i, manual=True, database=False, closeDB=True):
+def endSim(i, manual=True, database=False, closeDB=True, context=None):
     """
-    Ends the simulation, prints the time taken, and updates the database with information about the simulation
+    Ends the simulation, prints the time taken, and updates the database with information about the simulation (waiting
+    for the results being written in the background to be committed).
+
+    The simulation's run returns once the simulation has ended, rather than the programme being exited.
 
     Args:
         i (int): The timestep of the simulation
         manual (bool): Specifies if the simulation has been ended manually or at the point of simulation finish
         database (bool): True if results of the simulation should be output into the database
+        context (SimulationContext): The simulation, by default the module variables
     """
-    sumo.timerEnd = time.clock()
+    context = getContext(context)
+    context.timerEnd = time.perf_counter()
 
     if database:
-        database = database_pointer
-        database.populateDBVehicleTable()
+        database = context.database
+        database.populateDBVehicleTable(context)
         if closeDB:
-            db.Database.closeDB()
-
-    if sim.timeTaken:
-        print('Mean time taken for rerouting: {}'.format(sum(sim.timeTaken) / len(sim.timeTaken)))
-
-    if not sumo.AUTOMATED_TESTING:
-        if manual:
-            sys.exit("\nSystem has been ended manually at timestep {}, time taken {}".format(i, sumo.timerEnd -
-                                                                                             sumo.timerStart))
+            # Closing the database first commits the results still being written in the background
+            database.closeDB()
         else:
-            sys.exit("\nSimulation time has elapsed with {} timesteps, time taken {}".format(i, sumo.timerEnd -
-                                                                                         sumo.timerStart))
+            database.stopWriter()
+    elif context.database is not None:
+        # The results still being written in the background are committed before the simulation ends
+        context.database.stopWriter()
+
+    if context.timeTaken:
+        print('Mean time taken for rerouting: {}'.format(sum(context.timeTaken) / len(context.timeTaken)))
+    if context.skippedTravelTimeWrites:
+        print('Mean travel time writes skipped: {}'.format(
+            sum(context.skippedTravelTimeWrites) / len(context.skippedTravelTimeWrites)))
+    if context.routeCache.hits or context.routeCache.misses:
+        print('Route cache hits: {} of {} ({:.1%})'.format(context.routeCache.hits,
+                                                           context.routeCache.hits + context.routeCache.misses,
+                                                           context.routeCache.hitRate()))
+    if context.penaltyPathChecks:
+        print('Penalty method paths matching TraCI: {} of {}'.format(
+            sum(matched for _, matched in context.penaltyPathChecks), len(context.penaltyPathChecks)))
+
+    if manual:
+        message = "\nSystem has been ended manually at timestep {}, time taken {}".format(i, context.timerEnd -
+                                                                                         context.timerStart)
+    else:
+        message = "\nSimulation time has elapsed with {} timesteps, time taken {}".format(i, context.timerEnd -
+                                                                                         context.timerStart)
+
+    print(message)
 
 
-def endSimWithError(error):
+def endSimWithError(error, context=None):
     """
-    Ends the simulation and prints an error message
+    Ends the simulation with an error message. The error is raised rather than the programme being exited, so that the
+    simulations ran after this one (e.g. the rest of a BatchRunner job chain) aren't ended with it.
 
     Args:
         error (str): The error message
+        context (SimulationContext): The simulation, by default the module variables
+
+    Raises:
+        RuntimeError: Always, with the error message
     """
-    sumo.timerEnd = time.clock()
-    sys.exit(error)
+    getContext(context).timerEnd = time.perf_counter()
+    raise RuntimeError(error)
 
 
-def initialisation(database):
+def initialisation(database, context=None):
     """
-    This initialises the simulation with settings which are relevant to all scenarios
+    This initialises the simulation with settings which are relevant to all scenarios. The map is only put into memory
+    if the context doesn't already hold it (from a previous simulation of the same scenario), and is loaded from the
+    cache when NETWORK_CACHE is enabled and a cache exists for the scenario.
 
     :param database: The database pointer
+    :param context: The simulation to initialise, by default the module variables
     """
-    global database_pointer
-    database_pointer = database
-
-    # Puts the map into memory so that access to SUMO through TraCI is not necessary for building other map
-    # initialisation variables
-    loadMap()
-    createDirectedRoadNetwork()
-    collectEdgesWithSingleOutgoing()
-    collectEdgesWithMultiOutgoing()
-    generateRecursiveIncomingEdges()
+    context = getContext(context)
+    context.database = database
+
+    netFile = sumo.NET_FILES[sumo.SCENARIO]
+    cacheKey = None
+    saveNetwork = False
+    if not context.networkLoaded:
+        if sumo.NETWORK_CACHE:
+            cacheKey = cache.getCacheKey(netFile)
+
+        if cacheKey is None or not cache.loadNetwork(netFile, cacheKey, context):
+            # Puts the map into memory so that access to SUMO through TraCI is not necessary for building other map
+            # initialisation variables
+            loadMap(context)
+            createDirectedRoadNetwork(context)
+            collectEdgesWithSingleOutgoing(context)
+            collectEdgesWithMultiOutgoing(context)
+            generateRecursiveIncomingEdges(context)
+            saveNetwork = True
+
+        context.networkLoaded = True
+
+    # The road network searched by the routes found in-process is only built once a simulation needs it, and is then
+    # stored in the cache alongside the rest of the road network
+    if buildRoutingNetwork(context):
+        saveNetwork = True
+
+    if saveNetwork and sumo.NETWORK_CACHE:
+        cache.saveNetwork(netFile, cacheKey or cache.getCacheKey(netFile), context)
+
+    # The congestion levels of the road segments are retrieved in bulk during each rerouting period
+    if sumo.SUBSCRIPTIONS:
+        sim.initialiseRoadCongestionSubscriptions(context)
 
     # Fairness metrics being loaded into respective variables for use during the simulation
-    loadFairnessMetrics()
+    loadFairnessMetrics(context)
 
     # Start the clock (for total simulation runtime)
-    sumo.timerStart = time.clock()
+    context.timerStart = time.perf_counter()
 
 
-def loadMap():
+def buildRoutingNetwork(context=None):
+    """
+    Builds the parts of the road network searched by the routes found in-process (the routing graph, the contraction
+    hierarchy when routes are found through it, and the landmarks when the shortest paths are directed by them) which
+    the simulation needs but the road network doesn't yet hold. None are built for simulations which only find routes
+    through TraCI (see RoutingFunctions.usesNativeRouting()).
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        bool: True if any part of the road network was built
+    """
+    context = getContext(context)
+
+    if not func.usesNativeRouting(context):
+        return False
+
+    built = False
+    if not context.successors:
+        pathFinding.buildRoutingGraph(context)
+        built = True
+    if func.CONTRACTION_HIERARCHY and context.contractionHierarchy is None:
+        hierarchy.buildContractionHierarchy(context)
+        built = True
+    # The landmarks only direct the shortest paths of DSP found without the contraction hierarchy (the k-shortest
+    # paths are found through a search backwards from the destination)
+    if func.LANDMARKS and not func.CONTRACTION_HIERARCHY and func.NATIVE_DSP and context.algorithm in (1, 3) and \
+            context.landmarks is None:
+        landmarks.buildLandmarks(context)
+        built = True
+
+    return built
+
+
+def loadMap(context=None):
     """
     This loads the map into a dictionary (of edges) which contains a list of lanes for each edge. This has been
     implemented for efficiency purposes as many calls to SUMO through TraCI causes major slowdown.
 
     edgesNetwork is in the form {edge: [lanes]}: The edge with its corresponding lanes
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
     """
+    context = getContext(context)
+    traci = context.traci
+    edgesNetwork = context.edgesNetwork
+    freeFlowSpeed = context.freeFlowSpeed
+
     # Populating all non-special edges
     for edgeID in traci.edge.getIDList():
         # Special edges, i.e. connector or internal edges, have ':' prepended to them, don't consider these in rerouting
         if edgeID[:1] != ":":
             edgesNetwork[edgeID] = []
-            edgeLengths[edgeID] = sumo.net.getEdge(edgeID).getLength()
+            context.edgeLengths[edgeID] = sumo.net.getEdge(edgeID).getLength()
             # Finding edges on the fringe of the network
-            populateFringeEdges(edgeID)
+            populateFringeEdges(edgeID, context)
+        else:
+            context.internalEdges.append(edgeID)
         # This puts the free-flow travel speed of the network into memory
         freeFlowSpeed[edgeID] = traci.edge.getTraveltime(edgeID)
 
@@ -156,27 +261,32 @@ def loadMap():
     for lane in traci.lane.getIDList():
         # Remove any special lanes
         if lane[:1] != ":":
-            laneLengths[lane] = traci.lane.getLength(lane)
+            context.laneLengths[lane] = traci.lane.getLength(lane)
             edge = traci.lane.getEdgeID(lane)
-            lanesNetwork[lane] = edge
+            context.lanesNetwork[lane] = edge
             edgesNetwork[edge].append(lane)
 
 
-def createDirectedRoadNetwork():
+def createDirectedRoadNetwork(context=None):
     """
     This stores the road network into a directed graph in terms of both lanes (directedGraphLanes) and edges
     (directedGraphEdges) for easy access
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
     """
+    context = getContext(context)
+
     # Lane directed graph
-    for lane in lanesNetwork.keys():
-        directedGraphLanes[lane] = getOutgoingLanes(lane)
+    for lane in context.lanesNetwork.keys():
+        context.directedGraphLanes[lane] = getOutgoingLanes(lane)
 
     # Edge directed Graph
-    for edge in edgesNetwork.keys():
-        directedGraphEdges[edge] = getOutgoingEdges(edge)
+    for edge in context.edgesNetwork.keys():
+        context.directedGraphEdges[edge] = getOutgoingEdges(edge)
 
 
-def collectEdgesWithSingleOutgoing():
+def collectEdgesWithSingleOutgoing(context=None):
     """
     Generates a list of all of the edges with at most 1 outgoing edge.
 
@@ -185,16 +295,22 @@ def collectEdgesWithSingleOutgoing():
 
     This function only considers lanes which do not belong to a fringe edge and only accounts for lanes larger than
     MIN_EDGE_LENGTH
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
     """
-    for edge in edgesNetwork.keys():
-        if len(directedGraphEdges[edge]) == 1 and edge not in fringeEdges and edgeLengths[edge] >= MIN_EDGE_LENGTH:
-            singleOutgoingEdges.add(edge)
+    context = getContext(context)
+
+    for edge in context.edgesNetwork.keys():
+        if len(context.directedGraphEdges[edge]) == 1 and edge not in context.fringeEdges and \
+                context.edgeLengths[edge] >= MIN_EDGE_LENGTH:
+            context.singleOutgoingEdges.add(edge)
 
     if sumo.PRINT:
-        print("\nThese are the single outgoing edges: {}".format(singleOutgoingEdges))
+        print("\nThese are the single outgoing edges: {}".format(context.singleOutgoingEdges))
 
 
-def collectEdgesWithMultiOutgoing():
+def collectEdgesWithMultiOutgoing(context=None):
     """
     Generates a list of all of the edges with at least 2 outgoing edges.
 
@@ -204,115 +320,81 @@ def collectEdgesWithMultiOutgoing():
 
     This function only considers edges which do not belong to a fringe edge and only accounts for edges larger than
     MIN_EDGE_LENGTH
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
     """
-    for edge in edgesNetwork.keys():
-        if len(directedGraphEdges[edge]) >= 2 and edge not in fringeEdges and edgeLengths[edge] >= MIN_EDGE_LENGTH:
-            for lane in edgesNetwork[edge]:
-                reroutingLanes.add(lane)
+    context = getContext(context)
 
+    for edge in context.edgesNetwork.keys():
+        if len(context.directedGraphEdges[edge]) >= 2 and edge not in context.fringeEdges and \
+                context.edgeLengths[edge] >= MIN_EDGE_LENGTH:
+            for lane in context.edgesNetwork[edge]:
+                context.reroutingLanes.add(lane)
 
-def loadFairnessMetrics():
+
+def loadFairnessMetrics(context=None):
     """
     Collects the fairness metrics (for each vehicle) from the database and deposits them into the relevant variables
     for use during simulation
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
     """
-    database = database_pointer
+    context = getContext(context)
+    database = context.database
     fairnessMetrics = database.fairnessMetricsIntoDictionary()
 
     for key in fairnessMetrics:
         # Keys must be as strings due to the nature in which they're inserted during runtime (updating during runtime
         # with the vehicle numbers)
-        func.vehicleReroutedAmount[str(key)] = fairnessMetrics[key][0]
-        func.cumulativeExtraTime[str(key)] = fairnessMetrics[key][1]
-        sim.timeSpentInNetwork[str(key)] = fairnessMetrics[key][2]
-        sim.initialTimeSpentInNetwork[str(key)] = fairnessMetrics[key][2]
+        context.vehicleReroutedAmount[str(key)] = fairnessMetrics[key][0]
+        context.cumulativeExtraTime[str(key)] = fairnessMetrics[key][1]
+        context.timeSpentInNetwork[str(key)] = fairnessMetrics[key][2]
+        context.initialTimeSpentInNetwork[str(key)] = fairnessMetrics[key][2]
+        # Already held in the database, so only written again once changed
+        database.writtenVehicles[str(key)] = (str(key),) + tuple(fairnessMetrics[key][:3])
 
 
-def populateFringeEdges(edge):
+def populateFringeEdges(edge, context=None):
     """
     Populates the fringeEdges variable with the edges which exist on the fringe of the network
+
+    Args:
+        edge (str): The edge which may be on the fringe of the network
+        context (SimulationContext): The simulation, by default the module variables
     """
     if sumo.net.getEdge(edge).is_fringe():
-        fringeEdges.add(edge)
+        getContext(context).fringeEdges.add(edge)
 
 
-def generateRecursiveIncomingEdges():
+def generateRecursiveIncomingEdges(context=None):
     """
-    This generates all of the incoming edges up to MAX_EDGE_RECURSION_RANGE away from each edges and stores it in a
-    dictionary as edge: set(recursive incoming edge list).
-
-    This is calculated before runtime for easy access to the incoming edges of a particular edge during real time
-    application
-    """
-    for edge in directedGraphEdges.keys():
-        multiIncomingEdges[edge] = set(getMultiIncomingEdges(edge))
+    This generates the index of the incoming edges of every edge, through which the incoming edges up to
+    MAX_EDGE_RECURSION_RANGE away from an edge are accessed as multiIncomingEdges[edge].
 
-
-def recursiveIncomingEdges(edgeID, firstTime=False, edgeList=[], edgesToSearch=["placeholder"],
-                           edgeOrderList={}, finished=False):
-    """
-    Recurses down the incoming edges of the edge defined to return a list of all of the incoming edges from x edges
-    away
+    The incoming edges up to MAX_EDGE_RECURSION_RANGE away are only found for an edge the first time they are needed
+    (when the edge first becomes congested) and are then remembered, rather than being found for every edge before
+    runtime
 
     Args:
-        edgeID (str): The edge in which to find the incoming edges
-        firstTime (bool): If this is the first time running the module
-        edgeList (str[]): The list holding all of the incoming edges from the original node up to
-            MAX_EDGE_RECURSION_RANGE
-            In the format {edgeID: order}
-        edgesToSearch (str[]): The list specifying the edges which are to be searched for incoming edges
-        edgeOrderList : TO FILL
-        finished (bool): Specifies if the function has finished (all edges searched)
-    Returns:
-        str[]: The edges incoming to the initial edge up to MAX_EDGE_RECURSION_RANGE
+        context (SimulationContext): The simulation, by default the module variables
     """
-    if (edgesToSearch or edgeOrderList[edgeID] != src.code.RoutingFunctions.MAX_EDGE_RECURSIONS_RANGE) and not finished:
-        if firstTime:
-            edgeOrderList = {}
-            edgeList = []
-            edgesToSearch = ["placeholder"]
-            edgeOrderList[edgeID] = 0
-            # Remove the placeholder value from the edgesToSearch stack
-            edgesToSearch.remove("placeholder")
-
-        # Gets the immediate incoming edges for edgeID
-        edges = getIncomingEdges(edgeID)
-        for edge in edges:
-            edgeList.append(edge)
-            # The new edge has range of edgeOrderList[edgeID] + 1 away from the original edge
-            edgeOrderList[edge] = edgeOrderList[edgeID] + 1
-            # If the range of the edge is below the maximum range then continue searching down that edge
-            if edgeOrderList[edge] < src.code.RoutingFunctions.MAX_EDGE_RECURSIONS_RANGE:
-                edgesToSearch.append(edge)
-
-        # There are still more edges to search
-        if edgesToSearch:
-            # Pop from the stack the edge to search
-            edgeToTest = edgesToSearch.pop()
-            finished = False
-        # If there are no more edges to search
-        else:
-            finished = True
-            # Prevent an error as there are no more edges to test
-            edgeToTest = edgeID
-        # Recursively call with the new edge
-        return recursiveIncomingEdges(edgeToTest, finished=finished, edgeList=edgeList,
-                                      edgesToSearch=edgesToSearch, edgeOrderList=edgeOrderList)
-    else:
-        return edgeList
+    context = getContext(context)
+    context.multiIncomingEdges = IncomingEdgeIndex(context.directedGraphEdges)
 
 
-def getMultiIncomingEdges(edgeID):
+def getMultiIncomingEdges(edgeID, context=None):
     """
-    User friendly approach to getting the number of incoming edges from an edge (the recursiveIncomingEdge()
-    function)
+    User friendly approach to getting the incoming edges up to MAX_EDGE_RECURSION_RANGE away from an edge
 
     Args:
         edgeID (str): The initial edge
+        context (SimulationContext): The simulation, by default the module variables
     Returns:
         str[]: The edges incoming to the initial edge up to MAX_EDGE_RECURSION_RANGE
     """
-    return recursiveIncomingEdges(edgeID, firstTime=True)
+    return list(getContext(context).multiIncomingEdges[edgeID])
 
 
 def getOutgoingEdges(edgeID):
@@ -0,0 +1,243 @@
+###################################################################################################################
+# Lower bounds on the cost of travelling between any two edges of the routing graph (see PathFinding), found      #
+# through landmarks (ALT), which direct in-process searches towards their target rather than exploring the road   #
+# network in every direction.                                                                                     #
+#                                                                                                                 #
+# The lowest free-flow travel time from every edge to each landmark, and from each landmark to every edge, is     #
+# found once and stored alongside the road network (see NetworkCache). By the triangle inequality, the cost from  #
+# an edge to a target is then at least the difference between their costs to (or from) any landmark. The bounds   #
+# hold for any edge weights no lower than the free-flow travel times, and are scaled down for edge weights which  #
+# fall below them.                                                                                                #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import heapq
+import numpy as np
+
+from collections.abc import Mapping
+
+from src.code.EdgeWeights import EdgeWeightView
+from src.code.SimulationContext import getContext
+
+#############
+# CONSTANTS #
+#############
+
+# The number of landmarks chosen, more landmarks giving tighter bounds at the cost of more time spent on each bound
+LANDMARK_COUNT = 8
+
+#############
+# VARIABLES #
+#############
+
+# Stores the landmark distances of the routing graph (see buildLandmarks()), None if not built
+landmarks = None
+
+
+def buildLandmarks(context=None):
+    """
+    Chooses the landmarks of the routing graph (which must already be built, see PathFinding.buildRoutingGraph()) and
+    finds the free-flow travel times to and from each of them
+
+    Args:
+        context (SimulationContext): The simulation in which to store the landmarks, by default the module variables
+    """
+    context = getContext(context)
+    context.landmarks = LandmarkDistances(context.successors, context.freeFlowSpeed)
+
+
+def _findDistances(start, graph, weights, forwards):
+    """
+    Finds the lowest cost between an edge and every other edge, where entering an edge costs its weight
+
+    Args:
+        start (int): The edge
+        graph ([[int]]): The edges following each edge when searching forwards, or preceding it when searching
+            backwards
+        weights ([float]): The weight of each edge
+        forwards (bool): True for the costs from the edge, False for the costs to the edge
+    Returns:
+        np.ndarray: The lowest cost from (or to) each edge, infinite for edges which can't be reached
+    """
+    costs = [float("inf")] * len(graph)
+    costs[start] = 0.0
+    queue = [(0.0, start)]
+
+    while queue:
+        cost, edge = heapq.heappop(queue)
+        if cost > costs[edge]:
+            continue
+
+        for neighbour in graph[edge]:
+            newCost = cost + (weights[neighbour] if forwards else weights[edge])
+            if newCost < costs[neighbour]:
+                costs[neighbour] = newCost
+                heapq.heappush(queue, (newCost, neighbour))
+
+    return np.array(costs)
+
+
+def _getSpread(fromCosts, toCosts):
+    """
+    Args:
+        fromCosts (np.ndarray): The lowest cost from an edge to every edge
+        toCosts (np.ndarray): The lowest cost from every edge to the edge
+    Returns:
+        np.ndarray: The distance of every edge from the edge, in either direction (only counting the directions in
+        which the edges are connected)
+    """
+    return np.where(np.isfinite(fromCosts), fromCosts, 0) + np.where(np.isfinite(toCosts), toCosts, 0)
+
+
+class LandmarkDistances:
+    """
+    The free-flow travel time from every edge to each landmark and from each landmark to every edge. Landmarks are
+    chosen to be far apart, each being the edge furthest from the landmarks already chosen.
+    """
+
+    def __init__(self, graph, freeFlowTimes, landmarkCount=LANDMARK_COUNT):
+        """
+        Args:
+            graph ({str: (str)}): The graph in the form {edge: (outgoingEdges)}
+            freeFlowTimes ({str: float}): The free-flow travel time of each edge
+            landmarkCount (int): The number of landmarks to choose
+        """
+        self.edges = tuple(sorted(set(graph).union(*graph.values())))
+        self.edgeIndex = {edge: index for index, edge in enumerate(self.edges)}
+        self.freeFlowTimes = np.array([freeFlowTimes.get(edge, 0.0) for edge in self.edges])
+
+        successors = [[] for _ in self.edges]
+        predecessors = [[] for _ in self.edges]
+        for edge, outgoingEdges in graph.items():
+            for outgoingEdge in outgoingEdges:
+                successors[self.edgeIndex[edge]].append(self.edgeIndex[outgoingEdge])
+                predecessors[self.edgeIndex[outgoingEdge]].append(self.edgeIndex[edge])
+        weights = self.freeFlowTimes.tolist()
+
+        self.landmarks = []
+        fromLandmarks = []
+        toLandmarks = []
+        # The distance of each edge from the landmarks already chosen (at first, from the first edge), in either
+        # direction, the furthest edge being chosen next
+        spread = _getSpread(_findDistances(0, successors, weights, True),
+                            _findDistances(0, predecessors, weights, False)) if self.edges else np.zeros(0)
+
+        while len(self.landmarks) < min(landmarkCount, len(self.edges)):
+            spread[self.landmarks] = -np.inf
+            landmark = int(np.argmax(spread))
+
+            self.landmarks.append(landmark)
+            fromLandmarks.append(_findDistances(landmark, successors, weights, True))
+            toLandmarks.append(_findDistances(landmark, predecessors, weights, False))
+            landmarkSpread = _getSpread(fromLandmarks[-1], toLandmarks[-1])
+            spread = landmarkSpread if len(self.landmarks) == 1 else np.minimum(spread, landmarkSpread)
+
+        # The costs of each edge to and from every landmark, in the form [[cost]] (by edge, then by landmark), as the
+        # bounds are found edge by edge
+        self.fromLandmarks = np.array(fromLandmarks).reshape(len(self.landmarks), len(self.edges)).T.tolist()
+        self.toLandmarks = np.array(toLandmarks).reshape(len(self.landmarks), len(self.edges)).T.tolist()
+
+    def getLowerBoundScale(self, weights):
+        """
+        Gives the fraction of the free-flow bounds which hold for the edge weights, the lowest ratio between the
+        weight of an edge and its free-flow travel time (at most 1)
+
+        Args:
+            weights ({str: float}): The cost (estimated travel time) of each edge
+        Returns:
+            float: The scale
+        """
+        if isinstance(weights, EdgeWeightView):
+            return min(1.0, weights.getLowestFreeFlowRatio())
+
+        scale = 1.0
+        for edge, freeFlowTime in zip(self.edges, self.freeFlowTimes.tolist()):
+            if freeFlowTime > 0:
+                scale = min(scale, weights[edge] / freeFlowTime)
+        return scale
+
+    def getHeuristic(self, target, weights):
+        """
+        Args:
+            target (str): The edge in which routes end
+            weights ({str: float}): The cost (estimated travel time) of each edge
+        Returns:
+            LandmarkHeuristic: The lower bounds on the remaining cost from each edge to the target over the weights
+        """
+        return LandmarkHeuristic(self, target, self.getLowerBoundScale(weights))
+
+
+class LandmarkHeuristic(Mapping):
+    """
+    A read-only {edge: lowerBound} view of the lower bounds on the remaining cost from each edge to a target
+    (excluding the cost of the edge itself), leaving out the edges known to be unable to reach the target. Bounds are
+    found when first needed, so it may be given as the remaining cost of an A* search (see PathFinding.shortestPath()).
+    """
+
+    def __init__(self, landmarkDistances, target, scale=1.0):
+        """
+        Args:
+            landmarkDistances (LandmarkDistances): The landmark distances
+            target (str): The edge in which routes end
+            scale (float): The fraction of the free-flow bounds which hold for the edge weights
+        """
+        self._landmarkDistances = landmarkDistances
+        self._scale = scale
+        self._bounds = {}
+
+        targetIndex = landmarkDistances.edgeIndex.get(target)
+        self._fromTarget = landmarkDistances.toLandmarks[targetIndex] if targetIndex is not None else []
+        self._toTarget = landmarkDistances.fromLandmarks[targetIndex] if targetIndex is not None else []
+
+    def _getBound(self, edge):
+        """
+        Args:
+            edge (str): The edge
+        Returns:
+            float: The lower bound on the remaining cost from the edge to the target, infinite if the edge is known to
+            be unable to reach the target
+        """
+        bound = self._bounds.get(edge)
+        if bound is not None:
+            return bound
+
+        index = self._landmarkDistances.edgeIndex.get(edge)
+        bound = 0.0
+        if index is not None:
+            for fromEdge, toEdge, fromTarget, toTarget in zip(self._landmarkDistances.toLandmarks[index],
+                                                              self._landmarkDistances.fromLandmarks[index],
+                                                              self._fromTarget, self._toTarget):
+                # Travelling from the edge to the landmark costs no more than travelling through the target, and
+                # travelling from the landmark to the target costs no more than travelling through the edge (where
+                # either is infinite, the edge is unable to reach the target)
+                if fromEdge - fromTarget > bound:
+                    bound = fromEdge - fromTarget
+                if toTarget - toEdge > bound:
+                    bound = toTarget - toEdge
+            if bound != float("inf"):
+                bound *= self._scale
+
+        self._bounds[edge] = bound
+        return bound
+
+    def __getitem__(self, edge):
+        bound = self._getBound(edge)
+        if bound == float("inf"):
+            raise KeyError(edge)
+        return bound
+
+    def __contains__(self, edge):
+        return self._getBound(edge) != float("inf")
+
+    def __iter__(self):
+        return (edge for edge in self._landmarkDistances.edges if edge in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -0,0 +1,282 @@
+###################################################################################################################
+# Reads a SUMO network (.net.xml) into memory, in place of sumolib.net.readNet(). Only the parts of the network   #
+# used by the project are read (normal edges, their lanes, the connections between them, lengths, speeds,        #
+# permissions and the junction coordinates), the shapes, traffic lights and internal edges being skipped.         #
+#                                                                                                                 #
+# The net file is streamed through expat, only the start of each element being handled, so neither a document    #
+# tree nor the geometry is ever built. The same interface as sumolib (e.g. net.getEdge(edgeID).getOutgoing()) is  #
+# given for the parts which are read.                                                                             #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+from xml.parsers import expat
+
+from sumolib.net.lane import get_allowed
+
+#############
+# CONSTANTS #
+#############
+
+# The directions of connections which turn back onto the opposite direction of the road (turnarounds)
+TURNAROUND_DIRECTIONS = ('t', 'T')
+
+
+class Node:
+    """
+    A junction of the network
+    """
+
+    __slots__ = ('_id', '_coord')
+
+    def __init__(self, nodeID, coord):
+        self._id = nodeID
+        self._coord = coord
+
+    def getID(self):
+        return self._id
+
+    def getCoord(self):
+        return self._coord
+
+
+class Connection:
+    """
+    A connection from a lane of one edge to a lane of another
+    """
+
+    __slots__ = ('_from', '_to', '_fromLane', '_toLane', '_direction')
+
+    def __init__(self, fromEdge, toEdge, fromLane, toLane, direction):
+        self._from = fromEdge
+        self._to = toEdge
+        self._fromLane = fromLane
+        self._toLane = toLane
+        self._direction = direction
+
+    def getFrom(self):
+        return self._from
+
+    def getTo(self):
+        return self._to
+
+    def getFromLane(self):
+        return self._fromLane
+
+    def getToLane(self):
+        return self._toLane
+
+    def getDirection(self):
+        return self._direction
+
+
+class Lane:
+    """
+    A lane of an edge
+    """
+
+    __slots__ = ('_id', '_edge', '_speed', '_length', '_allowed', '_outgoing')
+
+    def __init__(self, laneID, edge, speed, length, allowed):
+        self._id = laneID
+        self._edge = edge
+        self._speed = speed
+        self._length = length
+        self._allowed = allowed
+        self._outgoing = []
+
+    def getID(self):
+        return self._id
+
+    def getEdge(self):
+        return self._edge
+
+    def getSpeed(self):
+        return self._speed
+
+    def getLength(self):
+        return self._length
+
+    def getPermissions(self):
+        return self._allowed
+
+    def allows(self, vClass):
+        return vClass in self._allowed
+
+    def getOutgoing(self):
+        """
+        Returns:
+            [Connection]: The connections from this lane
+        """
+        return self._outgoing
+
+
+class Edge:
+    """
+    A normal (non-internal) edge of the network
+    """
+
+    __slots__ = ('_id', '_fromNode', '_toNode', '_lanes', '_incoming', '_outgoing')
+
+    def __init__(self, edgeID, fromNode, toNode):
+        self._id = edgeID
+        # The IDs of the nodes until the junctions have been read, as the junctions follow the edges in the net file
+        self._fromNode = fromNode
+        self._toNode = toNode
+        self._lanes = []
+        self._incoming = {}
+        self._outgoing = {}
+
+    def getID(self):
+        return self._id
+
+    def getFromNode(self):
+        return self._fromNode
+
+    def getToNode(self):
+        return self._toNode
+
+    def getLanes(self):
+        return self._lanes
+
+    def getLane(self, index):
+        return self._lanes[index]
+
+    def getLength(self):
+        return self._lanes[0].getLength()
+
+    def getSpeed(self):
+        return self._lanes[0].getSpeed()
+
+    def getFunction(self):
+        return ''
+
+    def allows(self, vClass):
+        """
+        Returns:
+            bool: True if a lane of this edge allows the vehicle class
+        """
+        return any(lane.allows(vClass) for lane in self._lanes)
+
+    def getIncoming(self):
+        """
+        Returns:
+            {Edge: [Connection]}: The edges incoming to this edge and the connections from each
+        """
+        return self._incoming
+
+    def getOutgoing(self):
+        """
+        Returns:
+            {Edge: [Connection]}: The edges outgoing from this edge and the connections to each
+        """
+        return self._outgoing
+
+    def is_fringe(self):
+        """
+        Returns:
+            bool: True if this edge has no incoming or no outgoing connections (turnarounds aside), i.e. vehicles can
+                only enter or leave the network through it
+        """
+        return any(all(connection.getDirection() in TURNAROUND_DIRECTIONS
+                       for connections in edgeConnections.values() for connection in connections)
+                   for edgeConnections in (self._incoming, self._outgoing))
+
+
+class Net:
+    """
+    The road network
+    """
+
+    def __init__(self):
+        self._edges = []
+        self._edgeIDs = {}
+        self._laneIDs = {}
+        self._nodeIDs = {}
+
+    def getEdges(self, withInternal=True):
+        return self._edges
+
+    def getEdge(self, edgeID):
+        return self._edgeIDs[edgeID]
+
+    def hasEdge(self, edgeID):
+        return edgeID in self._edgeIDs
+
+    def getLane(self, laneID):
+        return self._laneIDs[laneID]
+
+    def getNodes(self):
+        return list(self._nodeIDs.values())
+
+    def getNode(self, nodeID):
+        return self._nodeIDs[nodeID]
+
+
+def readNet(netFile):
+    """
+    Reads the network from the net file
+
+    Args:
+        netFile (str): The location of the net file
+    Returns:
+        Net: The network
+    """
+    net = Net()
+    edges = net._edgeIDs
+    # The edge whose lanes are being read (None for special edges), as the lanes are given within their edge
+    currentEdge = None
+
+    def startElement(tag, attributes):
+        nonlocal currentEdge
+
+        if tag == 'edge':
+            # Internal, crossing, walking area and connector edges all have a function, normal edges don't
+            if 'function' in attributes:
+                currentEdge = None
+            else:
+                currentEdge = Edge(attributes['id'], attributes.get('from'), attributes.get('to'))
+                net._edges.append(currentEdge)
+                edges[currentEdge._id] = currentEdge
+
+        elif tag == 'lane':
+            if currentEdge is not None:
+                lane = Lane(attributes['id'], currentEdge, float(attributes['speed']), float(attributes['length']),
+                            get_allowed(attributes.get('allow'), attributes.get('disallow')))
+                currentEdge._lanes.append(lane)
+                net._laneIDs[lane._id] = lane
+
+        elif tag == 'junction':
+            nodeID = attributes['id']
+            if nodeID[0] != ':':
+                net._nodeIDs[nodeID] = Node(nodeID, (float(attributes['x']), float(attributes['y'])))
+
+        elif tag == 'connection':
+            fromEdge = edges.get(attributes['from'])
+            toEdge = edges.get(attributes['to'])
+            # Connections from or to special edges aren't used
+            if fromEdge is not None and toEdge is not None:
+                fromLane = fromEdge._lanes[int(attributes['fromLane'])]
+                connection = Connection(fromEdge, toEdge, fromLane, toEdge._lanes[int(attributes['toLane'])],
+                                        attributes['dir'])
+                fromEdge._outgoing.setdefault(toEdge, []).append(connection)
+                toEdge._incoming.setdefault(fromEdge, []).append(connection)
+                fromLane._outgoing.append(connection)
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = startElement
+    with open(netFile, 'rb') as netXML:
+        parser.ParseFile(netXML)
+
+    # The nodes of each edge are only known once the junctions have been read
+    for edge in net._edges:
+        edge._fromNode = net._nodeIDs.get(edge._fromNode)
+        edge._toNode = net._nodeIDs.get(edge._toNode)
+
+    return net
@@ -0,0 +1,125 @@
+###################################################################################################################
+# Stores the road network, as put into memory at the start of the simulation (see InitialMapHelperFunctions), in  #
+# a cache on disk so that later simulations of the same scenario can load it rather than building it again.       #
+#                                                                                                                 #
+# A cache is only used for the exact net file and settings (MIN_EDGE_LENGTH, VEHICLE_CLASS and LANDMARK_COUNT) it #
+# was built with, a change to any of these creating a new cache. The contraction hierarchy is contracted in a     #
+# fixed order, so has no settings of its own.                                                                     #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from src.code import SumoConnection as sumo
+from src.code import InitialMapHelperFunctions as initialFunc
+from src.code import PathFinding as pathFinding
+from src.code import Landmarks as landmarks
+from src.code.SimulationContext import getContext
+
+#############
+# CONSTANTS #
+#############
+
+# Incremented whenever the contents of the cache change, so that caches built by older versions aren't used
+CACHE_VERSION = 5
+
+# The road network tables held within the cache
+CACHED_TABLES = ('edgesNetwork', 'lanesNetwork', 'fringeEdges', 'laneLengths', 'edgeLengths', 'directedGraphLanes',
+                 'directedGraphEdges', 'singleOutgoingEdges', 'reroutingLanes', 'multiIncomingEdges', 'freeFlowSpeed',
+                 'internalEdges', 'successors', 'predecessors', 'contractionHierarchy', 'landmarks')
+
+# The size of each block read when hashing the net file
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def getCacheKey(netFile):
+    """
+    Gives the key identifying the road network built from the net file with the current settings
+
+    Args:
+        netFile (str): The location of the net file
+    Returns:
+        str: The key
+    """
+    netHash = hashlib.sha1()
+    with open(netFile, 'rb') as net:
+        for block in iter(lambda: net.read(HASH_BLOCK_SIZE), b''):
+            netHash.update(block)
+
+    return "{}_v{}_length{}_{}_landmarks{}".format(netHash.hexdigest(), CACHE_VERSION, initialFunc.MIN_EDGE_LENGTH,
+                                                   pathFinding.VEHICLE_CLASS, landmarks.LANDMARK_COUNT)
+
+
+def getCacheLocation(netFile, key):
+    """
+    Args:
+        netFile (str): The location of the net file
+        key (str): The key identifying the road network, as given by getCacheKey()
+    Returns:
+        str: The location of the cache
+    """
+    netName = os.path.basename(netFile).split('.')[0]
+    return os.path.join(sumo.NETWORK_CACHE_DIR, "{}_{}.pickle".format(netName, key))
+
+
+def loadNetwork(netFile, key, context=None):
+    """
+    Loads the road network from the cache, if a cache exists for the net file with the current settings
+
+    Args:
+        netFile (str): The location of the net file
+        key (str): The key identifying the road network, as given by getCacheKey()
+        context (SimulationContext): The simulation in which to load the road network, by default the module variables
+    Returns:
+        bool: True if the road network was loaded, False if it must be built
+    """
+    context = getContext(context)
+
+    try:
+        with open(getCacheLocation(netFile, key), 'rb') as cache:
+            cachedKey, tables = pickle.load(cache)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return False
+
+    if cachedKey != key:
+        return False
+
+    for table in CACHED_TABLES:
+        setattr(context, table, tables[table])
+
+    return True
+
+
+def saveNetwork(netFile, key, context=None):
+    """
+    Stores the road network in the cache, so that it may be loaded by later simulations of the net file
+
+    Args:
+        netFile (str): The location of the net file
+        key (str): The key identifying the road network, as given by getCacheKey()
+        context (SimulationContext): The simulation holding the road network, by default the module variables
+    """
+    context = getContext(context)
+    tables = {table: getattr(context, table) for table in CACHED_TABLES}
+
+    os.makedirs(sumo.NETWORK_CACHE_DIR, exist_ok=True)
+
+    # Written to a temporary file first, so that simulations ran alongside each other never load a partial cache
+    descriptor, temporaryLocation = tempfile.mkstemp(dir=sumo.NETWORK_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as cache:
+            pickle.dump((key, tables), cache, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryLocation, getCacheLocation(netFile, key))
+    except OSError:
+        os.remove(temporaryLocation)
+        print("Unable to store the road network in the cache at {}".format(sumo.NETWORK_CACHE_DIR))
@@ -0,0 +1,777 @@
+###################################################################################################################
+# In-process path finding over the road network, allowing routes to be calculated without making calls to SUMO    #
+# through TraCI. The road network is treated as a graph of edges, where an edge leads to each of the edges which  #
+# it is connected to, and the cost of a route is the sum of the estimated travel times of all of its edges.       #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import heapq
+import time
+
+from itertools import islice
+
+from src.code import SumoConnection as sumo
+from src.code.EdgeWeights import EdgeWeightOverlay
+from src.code.SimulationContext import getContext
+
+#############
+# CONSTANTS #
+#############
+
+# The vehicle class of the vehicles in the simulation (defined in vehicles.xml), only the road network usable by this
+# vehicle class is considered for routing
+VEHICLE_CLASS = "private"
+# The number of edges settled between each check of the time spent against a search budget (see SearchBudget)
+BUDGET_TIME_CHECK_INTERVAL = 128
+
+#############
+# VARIABLES #
+#############
+
+# Stores the routing graph in the form {edge: (outgoingEdges)}, only containing edges and connections usable by
+# VEHICLE_CLASS
+successors = {}
+# Stores the routing graph in reverse, in the form {edge: (incomingEdges)}
+predecessors = {}
+
+
+def buildRoutingGraph(context=None):
+    """
+    Builds the routing graph from the road network loaded through sumolib. Special (internal) edges are not included,
+    as vehicle routes only consist of normal edges.
+
+    Args:
+        context (SimulationContext): The simulation in which to store the routing graph, by default the module variables
+    """
+    context = getContext(context)
+    successors = {}
+
+    for edge in sumo.net.getEdges():
+        if not edge.allows(VEHICLE_CLASS):
+            continue
+
+        outgoingEdges = []
+        for outgoingEdge, connections in edge.getOutgoing().items():
+            # A connection must exist between lanes which the vehicle class is allowed to use
+            if any(connection.getFromLane().allows(VEHICLE_CLASS) and connection.getToLane().allows(VEHICLE_CLASS)
+                   for connection in connections):
+                outgoingEdges.append(outgoingEdge.getID())
+
+        # Sorted so that ties between routes of equal cost are always broken in the same way
+        successors[edge.getID()] = tuple(sorted(outgoingEdges))
+
+    context.successors = successors
+    context.predecessors = reverseGraph(successors)
+
+
+def reverseGraph(graph):
+    """
+    Reverses the direction of every connection in the graph
+
+    Args:
+        graph ({str: (str)}): The graph in the form {edge: (outgoingEdges)}
+    Returns:
+        {str: (str)}: The graph in the form {edge: (incomingEdges)}
+    """
+    reversedGraph = {edge: [] for edge in graph}
+    for edge, outgoingEdges in graph.items():
+        for outgoingEdge in outgoingEdges:
+            reversedGraph.setdefault(outgoingEdge, []).append(edge)
+
+    return {edge: tuple(sorted(incomingEdges)) for edge, incomingEdges in reversedGraph.items()}
+
+
+def getRouteCost(route, weights):
+    """
+    Calculates the cost of a route
+
+    Args:
+        route (str[]): The edges of the route
+        weights ({str: float}): The cost (estimated travel time) of each edge
+    Returns:
+        float: The total cost of the route
+    """
+    return sum(weights[edge] for edge in route)
+
+
+def shortestPath(source, target, weights, bannedEdges=None, bannedTurns=None, costLimit=None, graph=None,
+                 remainingCost=None, budget=None):
+    """
+    Finds the lowest cost route from the source edge to the target edge using Dijkstra's algorithm. The cost of the
+    route includes the cost of the source edge itself.
+
+    If the remaining cost from each edge to the target is given (see reverseShortestPathTree()), it is used as the
+    heuristic of an A* search instead, only exploring edges which lead towards the target.
+
+    Args:
+        source (str): The edge in which the route begins
+        target (str): The edge in which the route ends
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        bannedEdges (str{}): Edges which the route may not pass through
+        bannedTurns ({(str, str)}): Pairs of consecutive edges (fromEdge, toEdge) which the route may not take
+        costLimit (float): Routes costing more than this are not searched for
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}, by default the routing graph
+        remainingCost ({str: float}): The lowest cost from each edge to the target, excluding the cost of the edge
+            itself, with edges unable to reach the target left out
+        budget (SearchBudget): The budget from which each edge settled is spent, the search giving up once it runs out
+    Returns:
+        (float, str[]): The cost of the route and the route itself, (None, None) if no route exists (or the budget ran
+        out before one was found)
+    """
+    if graph is None:
+        graph = successors
+    if bannedEdges is None:
+        bannedEdges = ()
+    if bannedTurns is None:
+        bannedTurns = ()
+    if costLimit is None:
+        costLimit = float("inf")
+
+    if source in bannedEdges:
+        return None, None
+
+    if remainingCost is None:
+        # Dijkstra's algorithm, every edge is equally likely to lead to the target
+        remainingCost = _NoRemainingCost()
+    elif source not in remainingCost:
+        return None, None
+
+    sourceCost = weights[source]
+    # The lowest known cost of reaching each edge (inclusive of the cost of the edge itself)
+    costs = {source: sourceCost}
+    # The previous edge on the lowest cost route to each edge
+    previous = {source: None}
+    # Edges which have been fully explored
+    settled = set()
+    queue = [(sourceCost + remainingCost[source], sourceCost, source)]
+
+    while queue:
+        estimate, cost, edge = heapq.heappop(queue)
+
+        if edge in settled:
+            continue
+        if estimate > costLimit:
+            break
+
+        if edge == target:
+            # Working backwards from the target to build up the route
+            route = []
+            while edge is not None:
+                route.append(edge)
+                edge = previous[edge]
+            route.reverse()
+            return cost, route
+
+        settled.add(edge)
+        if budget is not None and not budget.spend():
+            return None, None
+
+        for outgoingEdge in graph.get(edge, ()):
+            if outgoingEdge in settled or outgoingEdge in bannedEdges or (edge, outgoingEdge) in bannedTurns \
+                    or outgoingEdge not in remainingCost:
+                continue
+
+            newCost = cost + weights[outgoingEdge]
+            if newCost < costs.get(outgoingEdge, float("inf")):
+                costs[outgoingEdge] = newCost
+                previous[outgoingEdge] = edge
+                heapq.heappush(queue, (newCost + remainingCost[outgoingEdge], newCost, outgoingEdge))
+
+    return None, None
+
+
+class SearchBudget:
+    """
+    The work (the number of edges settled) and time which may be spent searching for routes, shared by every search
+    made with it, so that the time taken to find a set of routes is bounded however many searches they need
+    """
+
+    def __init__(self, maxWork=None, maxTime=None):
+        """
+        Args:
+            maxWork (int): The most edges which may be settled, None for no limit
+            maxTime (float): The most time (s) which may be spent from now, None for no limit
+        """
+        self.remainingWork = maxWork if maxWork is not None else float("inf")
+        self.deadline = time.perf_counter() + maxTime if maxTime is not None else None
+        # True once the budget has run out
+        self.exhausted = False
+        self._untilTimeCheck = BUDGET_TIME_CHECK_INTERVAL
+
+    def spend(self):
+        """
+        Spends the work of settling a single edge
+
+        Returns:
+            bool: True if the budget has yet to run out
+        """
+        self.remainingWork -= 1
+        if self.remainingWork < 0:
+            self.exhausted = True
+        elif self.deadline is not None:
+            # The time is only checked every so often, as it costs far more to find than the work
+            self._untilTimeCheck -= 1
+            if self._untilTimeCheck == 0:
+                self._untilTimeCheck = BUDGET_TIME_CHECK_INTERVAL
+                if time.perf_counter() > self.deadline:
+                    self.exhausted = True
+
+        return not self.exhausted
+
+
+class _NoRemainingCost:
+    """
+    Stands in for the remaining cost of each edge when no heuristic is used, treating every edge as reachable
+    """
+
+    def __contains__(self, edge):
+        return True
+
+    def __getitem__(self, edge):
+        return 0
+
+
+def reverseShortestPathTree(target, weights, costLimit=None, graph=None):
+    """
+    Finds the lowest cost from every edge to the target edge, searching backwards from the target (a single search
+    serves any number of source edges).
+
+    Args:
+        target (str): The edge in which routes end
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        costLimit (float): Edges further than this from the target are not searched
+        graph ({str: (str)}): The reversed graph to search, in the form {edge: (incomingEdges)}, by default the
+            reversed routing graph
+    Returns:
+        remainingCost ({str: float}): The lowest cost from each edge to the target, excluding the cost of the edge
+            itself (only containing edges which can reach the target)
+        nextEdge ({str: str}): The edge after each edge on its lowest cost route to the target
+    """
+    if graph is None:
+        graph = predecessors
+    if costLimit is None:
+        costLimit = float("inf")
+
+    remainingCost = {}
+    nextEdge = {target: None}
+    # The lowest known cost from each edge, inclusive of the cost of the edge itself
+    costs = {target: weights[target]}
+    queue = [(weights[target], target)]
+
+    while queue:
+        cost, edge = heapq.heappop(queue)
+
+        if edge in remainingCost:
+            continue
+        if cost > costLimit:
+            break
+
+        remainingCost[edge] = cost - weights[edge]
+
+        for incomingEdge in graph.get(edge, ()):
+            if incomingEdge in remainingCost:
+                continue
+
+            newCost = cost + weights[incomingEdge]
+            if newCost < costs.get(incomingEdge, float("inf")):
+                costs[incomingEdge] = newCost
+                nextEdge[incomingEdge] = edge
+                heapq.heappush(queue, (newCost, incomingEdge))
+
+    return remainingCost, nextEdge
+
+
+def shortestPathTree(source, weights, costLimit=None, graph=None):
+    """
+    Finds the lowest cost from the source edge to every edge, searching forwards from the source (the forward
+    counterpart of reverseShortestPathTree()).
+
+    Args:
+        source (str): The edge in which routes begin
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        costLimit (float): Edges further than this from the source are not searched
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}, by default the routing graph
+    Returns:
+        costs ({str: float}): The lowest cost from the source to each edge, inclusive of the cost of the source and the
+            edge itself (only containing edges which can be reached)
+        previousEdge ({str: str}): The edge before each edge on its lowest cost route from the source
+    """
+    if graph is None:
+        graph = successors
+    if costLimit is None:
+        costLimit = float("inf")
+
+    costs = {}
+    previousEdge = {source: None}
+    # The lowest known cost of reaching each edge
+    knownCosts = {source: weights[source]}
+    queue = [(weights[source], source)]
+
+    while queue:
+        cost, edge = heapq.heappop(queue)
+
+        if edge in costs:
+            continue
+        if cost > costLimit:
+            break
+
+        costs[edge] = cost
+
+        for outgoingEdge in graph.get(edge, ()):
+            if outgoingEdge in costs:
+                continue
+
+            newCost = cost + weights[outgoingEdge]
+            if newCost < knownCosts.get(outgoingEdge, float("inf")):
+                knownCosts[outgoingEdge] = newCost
+                previousEdge[outgoingEdge] = edge
+                heapq.heappush(queue, (newCost, outgoingEdge))
+
+    return costs, previousEdge
+
+
+def getRouteFromTree(source, remainingCost, nextEdge, weights):
+    """
+    Extracts the lowest cost route from the source edge out of a reverse shortest path tree
+
+    Args:
+        source (str): The edge in which the route begins
+        remainingCost ({str: float}): The remaining costs given by reverseShortestPathTree()
+        nextEdge ({str: str}): The next edges given by reverseShortestPathTree()
+        weights ({str: float}): The cost (estimated travel time) of each edge
+    Returns:
+        (float, str[]): The cost of the route and the route itself, (None, None) if no route exists
+    """
+    if source not in remainingCost:
+        return None, None
+
+    route = []
+    edge = source
+    while edge is not None:
+        route.append(edge)
+        edge = nextEdge[edge]
+
+    return weights[source] + remainingCost[source], route
+
+
+def kShortestPaths(source, target, k, weights, maxAllowedTime=None, graph=None, reversedGraph=None, tree=None,
+                   budget=None):
+    """
+    Finds up to k of the lowest cost loopless routes from the source edge to the target edge using Yen's algorithm
+    (see generateShortestPaths()).
+
+    Args:
+        source (str): The edge in which the routes begin
+        target (str): The edge in which the routes end
+        k (int): The maximum number of routes to be found
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        maxAllowedTime (float): Routes are only found if their cost doesn't exceed the cost of the best route *
+            maxAllowedTime
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}, by default the routing graph
+        reversedGraph ({str: (str)}): The graph in reverse, in the form {edge: (incomingEdges)}, worked out from graph
+            if not given
+        tree (({str: float}, {str: str})): The reverse shortest path tree of the target over the same weights, as given
+            by reverseShortestPathTree(), searched for if not given (so that one search may serve many sources)
+        budget (SearchBudget): The budget of the searches made for the routes after the best route, the routes found
+            so far being given once it runs out
+    Returns:
+        [(float, str[])]: The routes found, as (cost, route) pairs, with the lowest cost route first
+    """
+    return list(islice(generateShortestPaths(source, target, weights, maxAllowedTime, graph, reversedGraph, tree,
+                                             budget), k))
+
+
+def generateShortestPaths(source, target, weights, maxAllowedTime=None, graph=None, reversedGraph=None, tree=None,
+                          budget=None):
+    """
+    Yields the lowest cost loopless routes from the source edge to the target edge in order of cost using Yen's
+    algorithm, each route only being searched for once the previous route has been taken.
+
+    Each subsequent route is found by deviating from the routes already found at each of their edges (the 'spur'
+    edge), where the deviation may not follow the same edges as the route up to the spur edge or turn onto the same
+    edges from the spur edge as routes already found.
+
+    Routes stop being yielded once the next route would cost more than the best route * maxAllowedTime, or once the
+    budget runs out (the routes already yielded being the best routes).
+
+    Args:
+        source (str): The edge in which the routes begin
+        target (str): The edge in which the routes end
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        maxAllowedTime (float): Routes are only found if their cost doesn't exceed the cost of the best route *
+            maxAllowedTime
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}, by default the routing graph
+        reversedGraph ({str: (str)}): The graph in reverse, in the form {edge: (incomingEdges)}, worked out from graph
+            if not given
+        tree (({str: float}, {str: str})): The reverse shortest path tree of the target over the same weights, as given
+            by reverseShortestPathTree(), searched for if not given
+        budget (SearchBudget): The budget of the searches made for the routes after the best route
+    Yields:
+        (float, str[]): Each route found, as a (cost, route) pair
+    """
+    # A single search backwards from the target gives both the best route and a heuristic for each later search
+    if graph is None:
+        graph = successors
+        reversedGraph = predecessors
+    elif reversedGraph is None:
+        reversedGraph = reverseGraph(graph)
+
+    if tree is None:
+        tree = reverseShortestPathTree(target, weights, graph=reversedGraph)
+    remainingCost, nextEdge = tree
+
+    bestCost, bestRoute = getRouteFromTree(source, remainingCost, nextEdge, weights)
+    if bestRoute is None:
+        return
+
+    costLimit = float("inf")
+    if maxAllowedTime is not None:
+        costLimit = bestCost * maxAllowedTime
+
+    routes = [(bestCost, bestRoute)]
+    yield bestCost, list(bestRoute)
+    # The routes which have been found, or are waiting to be considered, so that none are considered twice
+    routesSeen = {tuple(bestRoute)}
+    # Candidate routes waiting to be considered, in the form (cost, route)
+    candidates = []
+
+    while True:
+        _, lastRoute = routes[-1]
+        # The cost of the route up to (but not including) the spur edge
+        rootCost = 0
+
+        for i in range(len(lastRoute) - 1):
+            spurEdge = lastRoute[i]
+            rootRoute = lastRoute[:i + 1]
+
+            # The turns from the spur edge which have been taken by routes sharing the same root route
+            bannedTurns = {(spurEdge, route[i + 1]) for _, route in routes
+                           if len(route) > i + 1 and route[:i + 1] == rootRoute}
+            # The root route may not be revisited (keeping the routes loopless)
+            bannedEdges = set(lastRoute[:i])
+
+            spurCost, spurRoute = shortestPath(spurEdge, target, weights, bannedEdges, bannedTurns,
+                                               costLimit - rootCost, graph, remainingCost, budget)
+
+            # Candidates may still be missing, so the next route can't be known to be the best
+            if budget is not None and budget.exhausted:
+                return
+
+            if spurRoute is not None:
+                newRoute = lastRoute[:i] + spurRoute
+                if tuple(newRoute) not in routesSeen:
+                    routesSeen.add(tuple(newRoute))
+                    heapq.heappush(candidates, (rootCost + spurCost, newRoute))
+
+            rootCost += weights[spurEdge]
+
+        if not candidates:
+            return
+
+        cost, route = heapq.heappop(candidates)
+        if cost > costLimit:
+            return
+        routes.append((cost, route))
+        yield cost, list(route)
+
+
+def penalisedPaths(source, target, k, weights, penalisation, maxAllowedTime=None, timeout=1, graph=None,
+                   reversedGraph=None, tree=None, budget=None):
+    """
+    Finds up to k routes from the source edge to the target edge using the penalty method: after the best route, each
+    subsequent route is the best route once the costs of the edges of the previous route have been multiplied by
+    penalisation. Routes already found are not found again, the search stopping once a route costs more than the best
+    route * maxAllowedTime, the same routes have been found timeout times in a row or the budget runs out.
+
+    The penalised costs are held in an overlay over the weights, so the weights themselves are left unaltered.
+
+    Args:
+        source (str): The edge in which the routes begin
+        target (str): The edge in which the routes end
+        k (int): The maximum number of routes to be found
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        penalisation (float): The multiplier applied to the cost of each edge of the previous route
+        maxAllowedTime (float): Routes are only found if their cost doesn't exceed the cost of the best route *
+            maxAllowedTime
+        timeout (int): The number of times in a row routes already found may be found again before stopping
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}, by default the routing graph
+        reversedGraph ({str: (str)}): The graph in reverse, in the form {edge: (incomingEdges)}, worked out from graph
+            if not given
+        tree (({str: float}, {str: str})): The reverse shortest path tree of the target over the same weights, as given
+            by reverseShortestPathTree(), searched for if not given
+        budget (SearchBudget): The budget of the searches made for the routes after the best route
+    Returns:
+        [(float, str[])]: The routes found, as (cost, route) pairs (their cost being over the unpenalised weights), in
+        the order in which they were found
+    """
+    if graph is None:
+        graph = successors
+        reversedGraph = predecessors
+    elif reversedGraph is None:
+        reversedGraph = reverseGraph(graph)
+
+    if tree is None:
+        tree = reverseShortestPathTree(target, weights, graph=reversedGraph)
+    remainingCost, nextEdge = tree
+
+    bestCost, bestRoute = getRouteFromTree(source, remainingCost, nextEdge, weights)
+    if bestRoute is None:
+        return []
+
+    costLimit = float("inf")
+    if maxAllowedTime is not None:
+        costLimit = bestCost * maxAllowedTime
+
+    routes = [(bestCost, bestRoute)]
+    routesFound = {tuple(bestRoute)}
+    penalisedWeights = EdgeWeightOverlay(weights)
+    # Penalising only ever raises the costs, so the remaining costs over the weights remain a heuristic for the search
+    heuristic = remainingCost if penalisation >= 1 else None
+    lastRoute = bestRoute
+    # The number of times in a row a route already found has been found again
+    repeats = 0
+
+    while len(routes) < k:
+        for edge in lastRoute:
+            penalisedWeights[edge] *= penalisation
+
+        _, lastRoute = shortestPath(source, target, penalisedWeights, graph=graph, remainingCost=heuristic,
+                                    budget=budget)
+        if lastRoute is None:
+            break
+
+        if tuple(lastRoute) in routesFound:
+            repeats += 1
+            if repeats == timeout:
+                break
+            continue
+        repeats = 0
+
+        cost = getRouteCost(lastRoute, weights)
+        if cost > costLimit:
+            break
+        routesFound.add(tuple(lastRoute))
+        routes.append((cost, lastRoute))
+
+    return routes
+
+
+def viaPaths(source, target, k, weights, maxAllowedTime=None, maxOverlap=None, localOptimality=None, graph=None,
+             reversedGraph=None, tree=None, budget=None):
+    """
+    Finds up to k alternative routes from the source edge to the target edge through via edges, from a single search
+    forwards from the source and a single search backwards from the target. The alternative through an edge is the
+    lowest cost route to the edge followed by the lowest cost route from it.
+
+    Runs of edges along which both searches take the same route (plateaus) all give the same alternative, so each
+    plateau is only considered once, through its middle edge. Plateaus are considered in order of 2 * the cost of
+    their alternative - the cost of the plateau itself, favouring cheap alternatives whose long plateaus make them
+    unlikely to take needless detours.
+
+    An alternative is only taken if it doesn't revisit any edge, doesn't share more than maxOverlap of the cost of any
+    route already taken, and is locally optimal: the part of it costing up to localOptimality * the cost of the best
+    route either side of the via edge must itself be a lowest cost route (so it doesn't take needless detours). The
+    searches checking this are spent from the budget, no more alternatives being considered once it runs out.
+
+    Args:
+        source (str): The edge in which the routes begin
+        target (str): The edge in which the routes end
+        k (int): The maximum number of routes to be found
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        maxAllowedTime (float): Routes are only found if their cost doesn't exceed the cost of the best route *
+            maxAllowedTime
+        maxOverlap (float): The most of the cost of each route already taken which an alternative may share with it,
+            None for no limit
+        localOptimality (float): The cost either side of the via edge in which an alternative must be a lowest cost
+            route, as a fraction of the cost of the best route, None for no check
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}, by default the routing graph
+        reversedGraph ({str: (str)}): The graph in reverse, in the form {edge: (incomingEdges)}, worked out from graph
+            if not given
+        tree (({str: float}, {str: str})): The reverse shortest path tree of the target over the same weights, as given
+            by reverseShortestPathTree(), searched for if not given
+        budget (SearchBudget): The budget of the searches checking that alternatives are locally optimal
+    Returns:
+        [(float, str[])]: The routes found, as (cost, route) pairs, in order of cost
+    """
+    if graph is None:
+        graph = successors
+        reversedGraph = predecessors
+    elif reversedGraph is None:
+        reversedGraph = reverseGraph(graph)
+
+    if tree is None:
+        tree = reverseShortestPathTree(target, weights, graph=reversedGraph)
+    remainingCost, nextEdge = tree
+
+    bestCost, bestRoute = getRouteFromTree(source, remainingCost, nextEdge, weights)
+    if bestRoute is None:
+        return []
+
+    costLimit = float("inf")
+    if maxAllowedTime is not None:
+        costLimit = bestCost * maxAllowedTime
+
+    routes = [(bestCost, bestRoute)]
+    if k <= 1:
+        return routes
+
+    costs, previousEdge = shortestPathTree(source, weights, costLimit, graph)
+
+    # The cost of the alternative through each edge, only holding the edges whose alternative is within the cost limit
+    viaCosts = {}
+    for edge, cost in costs.items():
+        if edge in remainingCost:
+            viaCost = cost + remainingCost[edge]
+            if viaCost <= costLimit:
+                viaCosts[edge] = viaCost
+
+    # The plateaus, in the form [(score, viaCost, plateau)], found by following the edges from the first edge of each
+    # plateau for as long as both searches take the same route
+    plateaus = []
+    for edge, viaCost in viaCosts.items():
+        previous = previousEdge[edge]
+        if previous in viaCosts and nextEdge[previous] == edge:
+            continue
+
+        plateau = [edge]
+        plateauCost = weights[edge]
+        following = nextEdge[edge]
+        while following in viaCosts and previousEdge[following] == plateau[-1]:
+            plateau.append(following)
+            plateauCost += weights[following]
+            following = nextEdge[following]
+
+        # Cheaper alternatives are favoured, although a longer plateau (an alternative less likely to take needless
+        # detours) makes up for a higher cost
+        plateaus.append((2 * viaCost - plateauCost, viaCost, plateau))
+    plateaus.sort(key=lambda scoredPlateau: scoredPlateau[:2])
+
+    routesSeen = {tuple(bestRoute)}
+
+    for _, viaCost, plateau in plateaus:
+        if len(routes) == k or (budget is not None and budget.exhausted):
+            break
+
+        # The lowest cost route to the middle of the plateau, followed by the lowest cost route from it
+        viaEdge = plateau[len(plateau) // 2]
+        route = []
+        edge = viaEdge
+        while edge is not None:
+            route.append(edge)
+            edge = previousEdge[edge]
+        route.reverse()
+        edge = nextEdge[viaEdge]
+        while edge is not None:
+            route.append(edge)
+            edge = nextEdge[edge]
+
+        if tuple(route) in routesSeen or len(set(route)) < len(route):
+            continue
+        routesSeen.add(tuple(route))
+
+        if maxOverlap is not None and any(_getSharedCost(route, takenRoute, weights) > maxOverlap * takenCost
+                                          for takenCost, takenRoute in routes):
+            continue
+        if localOptimality is not None and not _isLocallyOptimal(route, route.index(viaEdge), weights,
+                                                                 localOptimality * bestCost, graph, costs,
+                                                                 remainingCost, budget):
+            continue
+
+        routes.append((viaCost, route))
+
+    # The alternatives are taken by their score rather than their cost
+    routes[1:] = sorted(routes[1:], key=lambda costRoute: costRoute[0])
+    return routes
+
+
+def _getSharedCost(route, otherRoute, weights):
+    """
+    Args:
+        route (str[]): The edges of the route
+        otherRoute (str[]): The edges of the other route
+        weights ({str: float}): The cost (estimated travel time) of each edge
+    Returns:
+        float: The total cost of the edges of the route which are also edges of the other route
+    """
+    otherEdges = set(otherRoute)
+    return sum(weights[edge] for edge in route if edge in otherEdges)
+
+
+def _isLocallyOptimal(route, viaIndex, weights, span, graph, costs, remainingCost, budget=None):
+    """
+    Checks that the part of the route around the via edge, costing up to span either side of it, is a lowest cost route
+
+    Args:
+        route (str[]): The edges of the route
+        viaIndex (int): The position of the via edge within the route
+        weights ({str: float}): The cost (estimated travel time) of each edge
+        span (float): The cost either side of the via edge to check
+        graph ({str: (str)}): The graph to search, in the form {edge: (outgoingEdges)}
+        costs ({str: float}): The lowest cost from the source of the route to each edge, given by shortestPathTree()
+        remainingCost ({str: float}): The lowest cost from each edge to the target of the route, given by
+            reverseShortestPathTree()
+        budget (SearchBudget): The budget from which the search between the ends of the part is spent
+    Returns:
+        bool: True if no route between the ends of the part costs less than the part itself (False if the budget ran
+        out before this was known)
+    """
+    start = viaIndex
+    cost = 0
+    while start > 0 and cost < span:
+        start -= 1
+        cost += weights[route[start]]
+
+    end = viaIndex
+    cost = 0
+    while end < len(route) - 1 and cost < span:
+        end += 1
+        cost += weights[route[end]]
+
+    startEdge = route[start]
+    endEdge = route[end]
+    partCost = getRouteCost(route[start:end + 1], weights)
+    tolerance = 1e-9 * partCost
+
+    # The lowest cost between the ends of the part is at least the difference between their costs from the source (or
+    # to the target), so the part is known to be lowest cost without searching when it costs no more than that
+    lowerBound = weights[startEdge] + max(costs[endEdge] - costs[startEdge],
+                                          remainingCost[startEdge] - remainingCost[endEdge])
+    if partCost <= lowerBound + tolerance:
+        return True
+
+    lowestCost, _ = shortestPath(startEdge, endEdge, weights, costLimit=partCost + tolerance, graph=graph,
+                                 remainingCost=_RemainingCostVia(remainingCost, endEdge), budget=budget)
+
+    return lowestCost is not None and lowestCost >= partCost - tolerance
+
+
+class _RemainingCostVia:
+    """
+    Stands in for the remaining cost of each edge to an edge (the via target) on the lowest cost route from it to
+    another target, given the remaining costs to the other target: by the triangle inequality, the remaining cost of an
+    edge to the via target is at least the difference between their remaining costs to the other target
+    """
+
+    def __init__(self, remainingCost, viaTarget):
+        """
+        Args:
+            remainingCost ({str: float}): The lowest cost from each edge to the other target, excluding the cost of the
+                edge itself
+            viaTarget (str): The edge being searched for, which must be able to reach the other target
+        """
+        self._remainingCost = remainingCost
+        self._offset = remainingCost[viaTarget]
+
+    def __contains__(self, edge):
+        # Edges unable to reach the other target are unable to reach the via target
+        return edge in self._remainingCost
+
+    def __getitem__(self, edge):
+        return self._remainingCost[edge] - self._offset
@@ -0,0 +1,198 @@
+###################################################################################################################
+# Exports the results of each simulation (the simulation_output and vehicle_output tables of its database, and    #
+# the trip information output by SUMO) as columnar files, so that the results of whole batches of simulations     #
+# can be analysed without reading the databases row by row.                                                       #
+#                                                                                                                 #
+# Each simulation is exported to its own directory (named after its SIMULATION_REFERENCE) in EXPORT_DIR, holding  #
+# a directory for each table with a NumPy .npy file for each column. The tables are read and written in chunks of #
+# CHUNK_ROWS rows, and the columns are memory-mapped when loaded, so only the parts used are ever read.           #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import array
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+
+from xml.parsers import expat
+
+from src.code import SumoConnection as sumo
+from src.code import Database as db
+
+#############
+# CONSTANTS #
+#############
+
+# The number of rows read from the database and written to the columns at a time
+CHUNK_ROWS = 1 << 16
+
+# The name and type of each column exported from the simulation_output and vehicle_output tables
+SIMULATION_COLUMNS = (('timestep', np.int64), ('fairnessIndex', np.float64), ('standardDeviationQOE', np.float64),
+                      ('meanCongestionLevel', np.float64))
+VEHICLE_COLUMNS = (('vehicleID', np.int64), ('numberTimesRerouted', np.int64), ('cumulativeExtraTime', np.float64),
+                   ('totalTimeSpentInSystem', np.float64))
+# The numeric attributes of each <tripinfo> kept, the vehicle IDs being kept alongside these in the 'id' column
+TRIP_INFO_COLUMNS = ('depart', 'arrival', 'duration', 'routeLength', 'waitingTime', 'timeLoss', 'rerouteNo')
+
+# The name of the directory of each table within the directory of a simulation
+SIMULATION_TABLE = "simulation_output"
+VEHICLE_TABLE = "vehicle_output"
+TRIP_INFO_TABLE = "tripinfo"
+
+
+def exportQuery(cursor, query, parameters, columns, directory):
+    """
+    Writes the rows given by a query as a column file for each column, in chunks of CHUNK_ROWS rows
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor of the database
+        query (str): The query giving the rows, returning the columns in order
+        parameters (tuple): The parameters of the query
+        columns (((str, dtype))): The name and type of each column
+        directory (str): The directory in which to write the columns
+    """
+    os.makedirs(directory)
+
+    rowCount = cursor.execute("SELECT COUNT(*) FROM ({})".format(query), parameters).fetchone()[0]
+    columnFiles = [np.lib.format.open_memmap(os.path.join(directory, column + '.npy'), mode='w+', dtype=dtype,
+                                             shape=(rowCount,))
+                   for column, dtype in columns]
+
+    cursor.execute(query, parameters)
+    start = 0
+    while start < rowCount:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+
+        for columnFile, values in zip(columnFiles, zip(*rows)):
+            columnFile[start:start + len(rows)] = values
+        start += len(rows)
+
+    for columnFile in columnFiles:
+        columnFile.flush()
+
+
+def exportTripInfo(tripInfoLocation, directory):
+    """
+    Writes the trip information output by SUMO (--tripinfo-output) as a column file for each of TRIP_INFO_COLUMNS and
+    the vehicle IDs, the file being streamed rather than read into memory
+
+    Args:
+        tripInfoLocation (str): The location of the trip information
+        directory (str): The directory in which to write the columns
+    """
+    os.makedirs(directory)
+
+    vehicleIDs = []
+    columns = {column: array.array('d') for column in TRIP_INFO_COLUMNS}
+
+    def startElement(tag, attributes):
+        if tag == 'tripinfo':
+            vehicleIDs.append(attributes['id'])
+            for column, values in columns.items():
+                values.append(float(attributes.get(column, 'nan')))
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = startElement
+    with open(tripInfoLocation, 'rb') as tripInfo:
+        parser.ParseFile(tripInfo)
+
+    np.save(os.path.join(directory, 'id.npy'), np.array(vehicleIDs, dtype=np.str_))
+    for column, values in columns.items():
+        np.save(os.path.join(directory, column + '.npy'), np.frombuffer(values, dtype=np.float64))
+
+
+def exportRun(databaseLocation, simulationReference, tripInfoLocation=None, exportDirectory=None):
+    """
+    Exports the results of a single simulation. The database may hold the results of previous simulations (of the same
+    scenario and algorithm), in which case only the simulation_output rows of this simulation are exported, alongside
+    the vehicle_output table as it stands at the end of this simulation.
+
+    Args:
+        databaseLocation (str): The location of the database of the simulation
+        simulationReference (str): The SIMULATION_REFERENCE of the simulation
+        tripInfoLocation (str): The location of the trip information output by SUMO, None if not output
+        exportDirectory (str): The directory in which to export the simulation, by default EXPORT_DIR
+    Returns:
+        str: The directory holding the exported simulation
+    """
+    if exportDirectory is None:
+        exportDirectory = sumo.EXPORT_DIR
+
+    runDirectory = os.path.join(exportDirectory, simulationReference.rstrip('_'))
+    # Exported to a temporary directory first, so that a partially exported simulation is never loaded
+    temporaryDirectory = runDirectory + '.tmp'
+    shutil.rmtree(temporaryDirectory, ignore_errors=True)
+
+    conn = sqlite3.connect(databaseLocation)
+    try:
+        cursor = conn.cursor()
+        # The rows of this simulation are those whose simIndexTimestep starts with its reference
+        exportQuery(cursor,
+                    "SELECT CAST(substr(simIndexTimestep, ?) AS INTEGER), fairnessIndex, standardDeviationQOE, "
+                    "meanCongestionLevel FROM {} WHERE substr(simIndexTimestep, 1, ?) = ? ORDER BY 1"
+                    .format(db.SIMULATION_OUTPUT_TABLE),
+                    (len(simulationReference) + 1, len(simulationReference), simulationReference),
+                    SIMULATION_COLUMNS, os.path.join(temporaryDirectory, SIMULATION_TABLE))
+        exportQuery(cursor,
+                    "SELECT vehicleID, numberTimesRerouted, cumulativeExtraTime, totalTimeSpentInSystem FROM {} "
+                    "ORDER BY vehicleID".format(db.VEHICLE_OUTPUT_TABLE),
+                    (), VEHICLE_COLUMNS, os.path.join(temporaryDirectory, VEHICLE_TABLE))
+    finally:
+        conn.close()
+
+    if tripInfoLocation is not None and os.path.exists(tripInfoLocation):
+        exportTripInfo(tripInfoLocation, os.path.join(temporaryDirectory, TRIP_INFO_TABLE))
+
+    shutil.rmtree(runDirectory, ignore_errors=True)
+    os.replace(temporaryDirectory, runDirectory)
+
+    return runDirectory
+
+
+def loadRun(runDirectory):
+    """
+    Loads the results of a single exported simulation, with every column memory-mapped
+
+    Args:
+        runDirectory (str): The directory holding the exported simulation, as given by exportRun()
+    Returns:
+        {str: {str: np.ndarray}}: The columns of each table, in the form {table: {column: values}}
+    """
+    tables = {}
+    for table in os.listdir(runDirectory):
+        tableDirectory = os.path.join(runDirectory, table)
+        tables[table] = {column[:-len('.npy')]: np.load(os.path.join(tableDirectory, column), mmap_mode='r')
+                         for column in os.listdir(tableDirectory) if column.endswith('.npy')}
+
+    return tables
+
+
+def loadBatch(exportDirectory=None, prefix=''):
+    """
+    Loads the results of every exported simulation whose reference starts with the prefix
+
+    Args:
+        exportDirectory (str): The directory holding the exported simulations, by default EXPORT_DIR
+        prefix (str): The start of the references of the simulations to load, e.g. 'southampton_2_hours_kPaths'
+    Returns:
+        {str: {str: {str: np.ndarray}}}: The columns of each simulation, in the form {reference: {table: {column:
+            values}}}
+    """
+    if exportDirectory is None:
+        exportDirectory = sumo.EXPORT_DIR
+
+    return {reference: loadRun(os.path.join(exportDirectory, reference))
+            for reference in sorted(os.listdir(exportDirectory))
+            if reference.startswith(prefix) and not reference.endswith('.tmp')
+            and os.path.isdir(os.path.join(exportDirectory, reference))}
@@ -0,0 +1,97 @@
+###################################################################################################################
+# Remembers the routes found between an edge and a destination for the current edge weights, so that vehicles on   #
+# the same edge heading to the same destination during a rerouting period don't each search for the same routes.  #
+#                                                                                                                 #
+# Routes are remembered against the version of the edge weights they were found with (see                         #
+# EdgeWeights.EdgeWeightStore.version), which only changes when the weights themselves change, so routes found in  #
+# an earlier rerouting period are still used if the weights are the same. The cache holds at most ROUTE_CACHE_SIZE #
+# entries, the least recently used being removed first.                                                          #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+from collections import OrderedDict
+
+#############
+# CONSTANTS #
+#############
+
+# The maximum number of (edge, destination) pairs whose routes are remembered
+ROUTE_CACHE_SIZE = 4096
+
+
+class RouteCache:
+    """
+    The routes found between pairs of edges, in the form {(source, target, version, *options): routes}, ordered from
+    least to most recently used
+    """
+
+    def __init__(self, maxSize=ROUTE_CACHE_SIZE):
+        """
+        Args:
+            maxSize (int): The maximum number of entries held
+        """
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        # The version of the edge weights of the entries held (entries of any other version can't be used)
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, version):
+        """
+        Args:
+            key (tuple): The source and target edges, alongside any options the routes were found with
+            version (int): The version of the edge weights
+        Returns:
+            The routes held for the key, None if they haven't been found for this version of the edge weights
+        """
+        if version != self.version:
+            # The weights have changed, so none of the entries held can be used again
+            self.entries.clear()
+            self.version = version
+
+        routes = self.entries.get(key)
+        if routes is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return routes
+
+    def put(self, key, version, routes):
+        """
+        Remembers the routes found for the key, removing the least recently used entry if the cache is full
+
+        Args:
+            key (tuple): The source and target edges, alongside any options the routes were found with
+            version (int): The version of the edge weights the routes were found with
+            routes: The routes
+        """
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+        self.entries[key] = routes
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def hitRate(self):
+        """
+        Returns:
+            float: The fraction of lookups which were found in the cache, 0 if no lookups have been made
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
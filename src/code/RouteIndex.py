@@ -0,0 +1,101 @@
+###################################################################################################################
+# Indexes the routes of the vehicles in the network by edge, so that the vehicles whose route passes through a    #
+# congested edge (and the position of the edge within each route) are found without searching through each       #
+# vehicle's route.                                                                                                #
+#                                                                                                                 #
+# The route of a vehicle is added to the index when first needed, and is then kept up to date as the vehicle is   #
+# rerouted (see RoutingFunctions.rerouteSelectedVehicles() and kPaths()) until the vehicle leaves the network.    #
+# Routes are held as SUMO gives them, including the edges which the vehicle has already passed.                  #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+
+class RouteIndex:
+    """
+    The routes of the vehicles, in the form {vehicleID: (edges)}, alongside the vehicles whose route passes through each
+    edge and the position of the edge within each of their routes, in the form {edge: {vehicleID: position}}
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.edgePositions = {}
+
+    def __contains__(self, vehicle):
+        return vehicle in self.routes
+
+    def __len__(self):
+        return len(self.routes)
+
+    def getRoute(self, vehicle):
+        """
+        Args:
+            vehicle (str): The vehicle ID
+        Returns:
+            (str): The route of the vehicle, None if the vehicle isn't in the index
+        """
+        return self.routes.get(vehicle)
+
+    def getPosition(self, edge, vehicle):
+        """
+        Args:
+            edge (str): The edge
+            vehicle (str): The vehicle ID
+        Returns:
+            int: The (first) position of the edge within the route of the vehicle (as given by route.index(edge)), None
+            if the route doesn't pass through the edge
+        """
+        positions = self.edgePositions.get(edge)
+        return positions.get(vehicle) if positions is not None else None
+
+    def getVehicles(self, edge):
+        """
+        Args:
+            edge (str): The edge
+        Returns:
+            {str: int}: The vehicles whose route passes through the edge, in the form {vehicleID: position}
+        """
+        return self.edgePositions.get(edge, {})
+
+    def setRoute(self, vehicle, route):
+        """
+        Adds the route of a vehicle to the index, in place of any route previously held for the vehicle
+
+        Args:
+            vehicle (str): The vehicle ID
+            route ((str)): The edges of the route
+        """
+        route = tuple(route)
+        if self.routes.get(vehicle) == route:
+            return
+
+        self.removeVehicle(vehicle)
+        self.routes[vehicle] = route
+
+        edgePositions = self.edgePositions
+        # Positions are added from the end of the route, so that an edge visited more than once keeps its first position
+        for position in range(len(route) - 1, -1, -1):
+            positions = edgePositions.get(route[position])
+            if positions is None:
+                positions = edgePositions[route[position]] = {}
+            positions[vehicle] = position
+
+    def removeVehicle(self, vehicle):
+        """
+        Removes the route of a vehicle from the index (if held), e.g. once the vehicle has left the network
+
+        Args:
+            vehicle (str): The vehicle ID
+        """
+        route = self.routes.pop(vehicle, None)
+        if route is None:
+            return
+
+        edgePositions = self.edgePositions
+        for edge in set(route):
+            positions = edgePositions[edge]
+            del positions[vehicle]
+            if not positions:
+                del edgePositions[edge]
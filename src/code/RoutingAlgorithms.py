@@ -19,12 +19,13 @@ if not sumo.COMPUTER:
     sys.path.insert(1, '/Users/jonathan/Documents/comp3200/sumo/tools')
     os.environ["SUMO_HOME"] = "/Users/jonathan/Documents/comp3200/sumo"
 
-import traci
-from copy import deepcopy
+import numpy as np
 
 from src.code import RoutingFunctions as func
 from src.code import InitialMapHelperFunctions as initialFunc
 from src.code import SimulationFunctions as sim
+from src.code import Vehicles as vehicleState
+from src.code.SimulationContext import getContext
 
 
 class ReroutingAlgorithms:
@@ -34,30 +35,43 @@ class ReroutingAlgorithms:
 
     DSP: Dynamic Shortest Path. Vehicles which face congestion simply go through the shortest path available to them.
     k-Paths: k-Shortest Pats. Vehicles who face congestion choose up to k of the shortest paths available to them.
+    Via-Paths: As k-Paths, but choosing between up to k via-node alternative routes, which overlap less and are found
+    from just two searches.
     Fairness: Vehicles are rerouted based on how fairly they have been treated during the simulation and each subsequent
     simulation.
     """
 
+    def __init__(self, context=None):
+        """
+        Args:
+            context (SimulationContext): The simulation in which vehicles are rerouted, by default the module variables
+        """
+        self.context = getContext(context)
+
     def selectReroutingAlgorithm(self, road):
         """
-        Selects rerouting algorithm to be performed based on the ALGORITHM selected in SumoConnection.
+        Selects rerouting algorithm to be performed based on the algorithm of the simulation (ALGORITHM selected in
+        SumoConnection unless the simulation has its own).
 
         :param road: The road segment which is being considered.
         """
         # DSP
-        if sumo.ALGORITHM == 1:
-            func.rerouteSelectedVehicles(road, kPathsBool=False, fairness=False)
+        if self.context.algorithm == 1:
+            func.rerouteSelectedVehicles(road, kPathsBool=False, fairness=False, context=self.context)
         # k-Paths
-        elif sumo.ALGORITHM == 2:
-            func.rerouteSelectedVehicles(road, kPathsBool=True, fairness=False)
+        elif self.context.algorithm == 2:
+            func.rerouteSelectedVehicles(road, kPathsBool=True, fairness=False, context=self.context)
         # DSP with Fairness
-        elif sumo.ALGORITHM == 3:
-            func.rerouteSelectedVehicles(road, kPathsBool=False, fairness=True)
+        elif self.context.algorithm == 3:
+            func.rerouteSelectedVehicles(road, kPathsBool=False, fairness=True, context=self.context)
         # k-Paths with Fairness
-        elif sumo.ALGORITHM == 4:
-            func.rerouteSelectedVehicles(road, kPathsBool=True, fairness=True)
+        elif self.context.algorithm == 4:
+            func.rerouteSelectedVehicles(road, kPathsBool=True, fairness=True, context=self.context)
+        # Via-Paths
+        elif self.context.algorithm == 5:
+            func.rerouteSelectedVehicles(road, kPathsBool=True, fairness=False, context=self.context, viaPaths=True)
 
-    def determineReroutingBasedOnCongestion(self, road, roadBool, congestionBool, congestionLevel):
+    def determineReroutingBasedOnCongestion(self, road, roadBool, congestionBool, congestionLevel, congestion=None):
         """
         This takes the current road and, based on the congestion levels of the road, checks whether or not the vehicles
         on that road should be eligible for rerouting.
@@ -66,20 +80,23 @@ class ReroutingAlgorithms:
         :param roadBool: True if lane, False if edge.
         :param congestionBool: True if road congested
         :param congestionLevel: This holds the {edge: congestion} for the road network
+        :param congestion: The congestion level of the road if already known (otherwise retrieved through TraCI)
         """
         congBool = congestionBool
+        context = self.context
 
-        if roadBool:
-            congestion = sim.returnCongestionLevelLane(road)
-        else:
-            congestion = sim.returnCongestionLevelEdge(road)
+        if congestion is None:
+            if roadBool:
+                congestion = sim.returnCongestionLevelLane(road, context)
+            else:
+                congestion = sim.returnCongestionLevelEdge(road, context)
 
-        sim.roadCongestion[road] = congestion
+        context.roadCongestion[road] = congestion
 
         if congestion >= func.CONGESTION_THRESHOLD:
             if not congBool:
                 # Getting the edge weights of the entire scenario for the current time step
-                sim.getGlobalEdgeWeights()
+                sim.getGlobalEdgeWeights(context)
                 congBool = True
 
             if sumo.PRINT_ROAD_REROUTED:
@@ -91,15 +108,46 @@ class ReroutingAlgorithms:
             # Only snaps to congestion given that the GUI is enabled and the SNAP_TO_CONGESTION option is also enabled
             if sumo.SNAP_TO_CONGESTION and sumo.SUMO_GUI:
                 if roadBool:
-                    edge = initialFunc.lanesNetwork[road]
-                    sim.getEdge2DCoordinates(edge)
+                    edge = context.lanesNetwork[road]
+                    sim.getEdge2DCoordinates(edge, context)
                 else:
-                    sim.getEdge2DCoordinates(road)
+                    sim.getEdge2DCoordinates(road, context)
 
             self.selectReroutingAlgorithm(road)
 
         return congBool
 
+    def determineReroutingBasedOnCongestionSnapshot(self, congestionBool):
+        """
+        Checks every subscribed road segment for congestion at once, using the occupancy retrieved through the TraCI
+        subscriptions. Only the road segments at or above the CONGESTION_THRESHOLD are then considered individually.
+
+        :param congestionBool: True if road congested
+        :return: True if any congestion has been detected
+        """
+        context = self.context
+        laneOccupancy, edgeOccupancy = sim.getRoadCongestionSnapshot(context)
+
+        # The congestion of every road segment is still recorded for the mean road network congestion
+        context.roadCongestion.update(zip(context.subscribedLanes, laneOccupancy.tolist()))
+        context.roadCongestion.update(zip(context.subscribedEdges, edgeOccupancy.tolist()))
+
+        # Processing the lanes existing on edges with multiple outgoing edges
+        for index in np.flatnonzero(laneOccupancy >= func.CONGESTION_THRESHOLD):
+            congestionBool = self.determineReroutingBasedOnCongestion(context.subscribedLanes[index], True,
+                                                                      congestionBool, context.roadCongestion,
+                                                                      laneOccupancy[index])
+
+        if congestionBool: print()
+
+        # Processing those edges which only have a single outgoing edge (all lanes lead to the same position)
+        for index in np.flatnonzero(edgeOccupancy >= func.CONGESTION_THRESHOLD):
+            congestionBool = self.determineReroutingBasedOnCongestion(context.subscribedEdges[index], False,
+                                                                      congestionBool, context.roadCongestion,
+                                                                      edgeOccupancy[index])
+
+        return congestionBool
+
     def main(self, i, database):
         """
         The main programme run during the loop which progresses the simulation at every timestep
@@ -108,66 +156,77 @@ class ReroutingAlgorithms:
             i (int): The current timestep of the simulation
             database (Database): This is the database in which the information is stored
         """
-        traci.simulationStep()
+        context = self.context
+
+        context.traci.simulationStep()
         # Checks for vehicle departure and arrival into the simulation
-        sim.vehiclesDepartedAndArrived(i)
+        sim.vehiclesDepartedAndArrived(i, context)
+
+        # The congestion levels for the next REROUTING_PERIOD are retrieved alongside the next timestep
+        if sumo.SUBSCRIPTIONS and (i + 1) % func.REROUTING_PERIOD == 0:
+            sim.subscribeRoadCongestion(context)
 
         # Every REROUTING_PERIOD
         if i % func.REROUTING_PERIOD == 0 and i >= 1:
             if sumo.PRINT_REROUTE_PERIOD:
                 print("\n***** REROUTING PERIOD {} ********\n".format(i / func.REROUTING_PERIOD))
 
+            # The vehicles are retrieved at most once during the rerouting period
+            context.vehicleSnapshot = sim.createVehicleSnapshot(context)
+
             # Increment each vehicle who has since been rerouted
-            for vehicle in func.periodSinceLastRerouted.keys():
-                func.periodSinceLastRerouted[vehicle] += 1
+            vehicleState.incrementAll(context.periodSinceLastRerouted, 1)
 
             # If the vehicle has been immune to rerouting for REROUTING_PERIOD_CONSIDERATION then remove from list
-            for vehicle in deepcopy(func.periodSinceLastRerouted):
-                if func.periodSinceLastRerouted[vehicle] >= func.REROUTING_PERIOD_CONSIDERATION:
-                    del func.periodSinceLastRerouted[vehicle]
+            vehicleState.deleteAtLeast(context.periodSinceLastRerouted, func.REROUTING_PERIOD_CONSIDERATION)
 
             # This is the updating of the time spent in the system for each vehicle
-            sim.updateVehicleTotalEstimatedTimeSpentInSystem(func.REROUTING_PERIOD)
+            sim.updateVehicleTotalEstimatedTimeSpentInSystem(func.REROUTING_PERIOD, context)
 
             """ Selecting and rerouting vehicles at points of congestion """
 
             # Resets the congestion level for each road segment
-            sim.roadCongestion = {}
+            context.roadCongestion = {}
             # Resets the set of vehicles which have undergone rerouting for the previous rerouting period
-            func.reroutedVehicles = set()
+            context.reroutedVehicles = set()
             # True when any congestion is detected
             congestionBool = False
 
             startTime = datetime.datetime.now()
 
-            # Processing the lanes existing on edges with multiple outgoing edges
-            for lane in initialFunc.reroutingLanes:
-                congestionBool = self.determineReroutingBasedOnCongestion(lane, True, congestionBool,
-                                                                          sim.roadCongestion)
+            if sumo.SUBSCRIPTIONS:
+                # Congestion levels of all road segments retrieved at once
+                congestionBool = self.determineReroutingBasedOnCongestionSnapshot(congestionBool)
+            else:
+                # Processing the lanes existing on edges with multiple outgoing edges
+                for lane in context.reroutingLanes:
+                    congestionBool = self.determineReroutingBasedOnCongestion(lane, True, congestionBool,
+                                                                              context.roadCongestion)
 
-            if congestionBool: print()
+                if congestionBool: print()
 
-            # Processing those edges which only have a single outgoing edge (all lanes lead to the same position)
-            for edge in initialFunc.singleOutgoingEdges:
-                congestionBool = self.determineReroutingBasedOnCongestion(edge, False, congestionBool,
-                                                                          sim.roadCongestion)
+                # Processing those edges which only have a single outgoing edge (all lanes lead to the same position)
+                for edge in context.singleOutgoingEdges:
+                    congestionBool = self.determineReroutingBasedOnCongestion(edge, False, congestionBool,
+                                                                              context.roadCongestion)
 
             # Only work out time taken if rerouting has taken place
             if congestionBool:
                 endTime = datetime.datetime.now()
-                sim.getTimeTaken(startTime, endTime)
+                sim.getTimeTaken(startTime, endTime, context)
 
             # Working out fairness index + standard deviation of QOE values
-            fairnessIndex, standardDeviation = sim.fairnessIndex()
+            fairnessIndex, standardDeviation = sim.fairnessIndex(context)
 
             # Update the database with the up-to-date values
-            database.populateDBSimulationTable(i, fairnessIndex, standardDeviation, sumo.SIMULATION_REFERENCE,
-                                               sim.calculateAverageRoadCongestion())
-            database.populateDBVehicleTable()
+            database.populateDBSimulationTable(i, fairnessIndex, standardDeviation, context.simulationReference,
+                                               sim.calculateAverageRoadCongestion(context))
+            database.populateDBVehicleTable(context)
 
             # Reset
-            sim.vehiclesInNetwork = []
+            context.vehiclesInNetwork = []
+            context.vehicleSnapshot = None
 
         # After 3 hours have elapsed
         if i == sumo.END_TIME:
-            initialFunc.endSim(i)
+            initialFunc.endSim(i, context=context)
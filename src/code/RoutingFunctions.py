@@ -22,12 +22,17 @@ if not sumo.COMPUTER:
     os.environ["SUMO_HOME"] = "/Users/jonathan/Documents/comp3200/sumo"
 
 import random
-import traci
+import zlib
 from copy import deepcopy
+import traci.constants as tc
 
 from src.code import InitialMapHelperFunctions as initialFunc
+from src.code import PathFinding as pathFinding
 from src.code import SimulationFunctions as sim
-from src.code.SimulationFunctions import selectVehiclesBasedOnFairness
+from src.code import Vehicles as vehicleState
+from src.code.RouteCache import RouteCache
+from src.code.RouteIndex import RouteIndex
+from src.code.SimulationContext import getContext
 
 ##########################
 # USER-DEFINED CONSTANTS #
@@ -39,6 +44,13 @@ PENALISATION = 2
 KPATH_MAX_ALLOWED_TIME = 1.4
 # The maximum amount of retries for kPaths until it's decided to take the current routes in the possible route list
 KPATH_TIMEOUT = 15
+# The most edges which may be settled while searching in-process for the paths of a vehicle after its best path (the
+# paths found so far being taken once reached), bounding the time taken for each vehicle (edges are settled at around
+# 250,000 per second), None for no limit
+KPATH_WORK_BUDGET = 50000
+# The most time (s) which may be spent searching in-process for the paths of a vehicle after its best path, None for
+# no limit (the paths found then depend on the speed of the machine, so this is off by default)
+KPATH_TIME_BUDGET = None
 # This is the percentage of vehicles in the top percentile range which will be considered for rerouting based on their
 # fairness (vehicle chosen if their QOE >= PERCENTILE * max QOE of vehicle's considered)
 PERCENTILE = 0.6
@@ -53,8 +65,47 @@ CONGESTION_THRESHOLD = 0.5
 MAX_EDGE_RECURSIONS_RANGE = 3
 # Specifies the number of up to k-alternative routes
 K_MAX = 3
+# The most of the travel time of each route already taken which a via-node alternative route may share with it (see
+# PathFinding.viaPaths()), None for no limit
+VIA_PATH_MAX_OVERLAP = 0.8
+# The travel time either side of the via edge of a via-node alternative route in which it must be a shortest path, as
+# a fraction of the travel time of the best route (so alternatives don't take needless detours), None for no check
+VIA_PATH_LOCAL_OPTIMALITY = 0.25
 # This is the number of rerouting periods before a vehicle can be considered for rerouting again
 REROUTING_PERIOD_CONSIDERATION = 2
+# If the k-shortest paths should be found in-process (using Yen's algorithm over the road network held in memory)
+# rather than through repeated TraCI rerouting with penalised travel times. Off by default, as the paths found differ
+# from those of the experiments: vehicles are routed by SUMO over the smoothed travel times of their rerouting device,
+# which the penalised travel times don't alter, so TraCI gives a single path where the in-process search gives up to
+# K_MAX (see PENALTY_KPATHS_CHECK for the paths found when SUMO is given the same travel times). So kPathsTraci(),
+# with its TraCI call to set the travel time of each edge of each penalised path, remains the k-shortest paths of
+# algorithms 2 and 4, and the road network searched in-process is neither built nor customised for them unless this is
+# set (see usesNativeRouting())
+NATIVE_KPATHS = False
+# If the k-shortest paths found in-process should be found through the same penalty method as kPathsTraci() (each path
+# being the best path once the travel times of the previous path are penalised by PENALISATION) rather than through
+# Yen's algorithm
+PENALTY_KPATHS = False
+# If the paths found in-process through the penalty method should also be found through TraCI (with SUMO routing over
+# the global edge weights, see findPenalisedPathsGlobalTraci()), recording whether they match in penaltyPathChecks (this
+# brings back every TraCI call made by kPathsTraci(), and more, so is only for checking that the two are equivalent)
+PENALTY_KPATHS_CHECK = False
+# The fraction of vehicles whose paths are checked (see PENALTY_KPATHS_CHECK), chosen by their ID so that the same
+# vehicles are checked in every run, as each check gives the vehicle a travel time for every edge through TraCI
+PENALTY_KPATHS_CHECK_SAMPLE = 0.1
+# If vehicles rerouted through DSP should be given the shortest path found in-process (over the global edge weights)
+# rather than being rerouted by SUMO through TraCI
+NATIVE_DSP = False
+# If routes found in-process should be found through the contraction hierarchy of the road network (customised with the
+# global edge weights once they change, see getCustomisedHierarchy()) rather than by searching the road network itself.
+# The hierarchy is only built for simulations which find routes in-process (see usesNativeRouting())
+CONTRACTION_HIERARCHY = True
+# If shortest paths found in-process without the contraction hierarchy should be searched for towards their destination
+# using the lower bounds given by landmarks (see Landmarks), rather than through a search backwards from the
+# destination across the whole road network (the k-shortest paths always use the latter, as its exact remaining costs
+# direct each of their searches better than the lower bounds). The landmarks are only built for the simulations which
+# search for shortest paths in this way
+LANDMARKS = True
 
 ########################
 # SIMULATION VARIABLES #
@@ -66,19 +117,27 @@ edgeSpeedGlobal = {}
 adjustedEdgeSpeedGlobal = {}
 
 # This is the number of times a vehicle has been rerouted in the form {vehicleID: vehicleReroutedAmount)
-vehicleReroutedAmount = {}
+vehicleReroutedAmount = vehicleState.vehicleStore.vehicleReroutedAmount
 # This is the cumulative extra (estimated) time in which the vehicle has experienced due to the rerouting. Represented
 # in the form {vehicleID: cumulativeExtraTimeSpent (s)}
-cumulativeExtraTime = {}
+cumulativeExtraTime = vehicleState.vehicleStore.cumulativeExtraTime
 
 # This stores the vehicles rerouted during the 'rerouting period' in which the vehicles are rerouted
 reroutedVehicles = set()
 
 # This holds the vehicle alongside how many rerouting periods they have gone without being rerouted
-periodSinceLastRerouted = {}
+periodSinceLastRerouted = vehicleState.vehicleStore.periodSinceLastRerouted
 
+# The routes of the vehicles in the network, indexed by the edges they pass through
+routeIndex = RouteIndex()
+# The k shortest paths already found between edges for the current edge weights
+routeCache = RouteCache()
+# Whether the paths found in-process through the penalty method matched those found through TraCI, for each vehicle
+# checked (see PENALTY_KPATHS_CHECK), in the form [(vehicleID, matched)]
+penaltyPathChecks = []
 
-def selectVehiclesForRerouting(roadSegmentID, fairness=False):
+
+def selectVehiclesForRerouting(roadSegmentID, fairness=False, context=None):
     """
     This selects the vehicles which are eligible to be rerouted, eligibility in determined by a number of factors.
     Natively, eligibility is determined if the vehicle's route shall stray into the congested area, if so rerouting
@@ -90,12 +149,14 @@ def selectVehiclesForRerouting(roadSegmentID, fairness=False):
     Args:
         roadSegmentID (str): The ID of a segment of road, either an entire edge or an individual lane
         fairness (bool): True if fairness should be considered for the vehicles
+        context (SimulationContext): The simulation in which the vehicles exist, by default the module variables
 
     Returns:
         reroutingConsiderationList (set()): This is the list of all of the vehicles to be considered for rerouting
         vehicleEdge ({str: str}): the vehicle ID with the corresponding edge ID
         vehicleOldRoute ({str: str[]}): The vehicle and it's corresponding route (before rerouting)
     """
+    context = getContext(context)
 
     # True if the road segment is a lane
     laneBool = False
@@ -103,16 +164,17 @@ def selectVehiclesForRerouting(roadSegmentID, fairness=False):
     outgoingLanes = []
 
     # Automatically work out if the road segment ID belongs to a lane or an edge
-    if roadSegmentID in initialFunc.lanesNetwork:
+    if roadSegmentID in context.lanesNetwork:
         laneBool = True
         # The edge in which the lane belongs
-        edgeID = initialFunc.lanesNetwork[roadSegmentID]
+        edgeID = context.lanesNetwork[roadSegmentID]
         """ Effectively, we are testing if the vehicles need to occupy this specific lane to continue their journey, 
         or if another lane on the edge could instead be used/is necessary """
-        outgoingLanes = initialFunc.directedGraphLanes[roadSegmentID]
-    elif roadSegmentID not in initialFunc.edgesNetwork:
+        outgoingLanes = context.directedGraphLanes[roadSegmentID]
+    elif roadSegmentID not in context.edgesNetwork:
         # The road segment ID doesn't exist as either an edge or a lane
-        initialFunc.endSimWithError("Road segment ID \'{}\' doesn't exist in the road network.".format(roadSegmentID))
+        initialFunc.endSimWithError("Road segment ID \'{}\' doesn't exist in the road network.".format(roadSegmentID),
+                                    context)
     else:
         # The road segment is an edge, so set the local variable
         edgeID = roadSegmentID
@@ -127,10 +189,13 @@ def selectVehiclesForRerouting(roadSegmentID, fairness=False):
     vehicleEdge = {}
     # vehicle: oldRoute
     vehicleOldRoute = {}
+    # The vehicles on each edge and the route and stopped state of each vehicle, shared between the road segments
+    # considered in the same rerouting period
+    vehicleSnapshot = sim.getVehicleSnapshot(context)
 
     # Going through the incoming edges and identifying vehicles on them
-    for edge in initialFunc.multiIncomingEdges[edgeID]:
-        vehiclesOnEdge = traci.edge.getLastStepVehicleIDs(edge)
+    for edge in context.multiIncomingEdges[edgeID]:
+        vehiclesOnEdge = vehicleSnapshot.getEdgeVehicles(edge)
         # Appending the list of vehicles from edge onto vehiclesList
         vehiclesList.extend(vehiclesOnEdge)
 
@@ -144,32 +209,36 @@ def selectVehiclesForRerouting(roadSegmentID, fairness=False):
     # Removing vehicles from the list of vehicles for consideration of rerouting if they have already been rerouted
     # in this rerouting period
     for vehicle in vehiclesList:
-        if vehicle in reroutedVehicles:
+        if vehicle in context.reroutedVehicles:
             vehiclesList.remove(vehicle)
         # Removing any vehicle which is currently in the 'stopped' state (this is not the same as 'waiting', e.g.
         # waiting at a traffic light)
-        elif traci.vehicle.isStopped(vehicle):
+        elif vehicleSnapshot.isStopped(vehicle):
             vehiclesList.remove(vehicle)
         # Removing vehicle if they have been rerouted too many times recently
-        elif vehicle in periodSinceLastRerouted:
+        elif vehicle in context.periodSinceLastRerouted:
             vehiclesList.remove(vehicle)
 
     """ Only selecting those vehicles which actually pass through the congested road segment (treated differently 
     depending on if the congestion is only affecting the lane or the entire edge) """
+    routeIndex = context.routeIndex
     for vehicle in vehiclesList:
-        oldRoute = traci.vehicle.getRoute(vehicle)
+        oldRoute = routeIndex.getRoute(vehicle)
+        if oldRoute is None:
+            oldRoute = vehicleSnapshot.getRoute(vehicle)
+            routeIndex.setRoute(vehicle, oldRoute)
         vehicleOldRoute[vehicle] = oldRoute
-        # If the edgeID exists in the vehicles current route
-        if edgeID in oldRoute:
+        # The position of the edgeID in the vehicle's current route, None if it doesn't exist in the route
+        congestionIndex = routeIndex.getPosition(edgeID, vehicle)
+        if congestionIndex is not None:
             if laneBool:
                 # Finding the next edge and corresponding lane of the vehicle to see if it's current route shall be
                 # affected by the congestion existent on the lane
-                congestionIndex = oldRoute.index(edgeID)
                 # If the vehicle is on the last edge of it's destination, do not reroute
                 try:
                     nextEdge = oldRoute[congestionIndex + 1]
 
-                    lanesInNextEdge = initialFunc.edgesNetwork[nextEdge]
+                    lanesInNextEdge = context.edgesNetwork[nextEdge]
 
                     """ Testing if lanes present in the edge after the congested edge (of the vehicle's route) are any of 
                     the outgoing lanes from the congested lane, otherwise do not reroute the vehicle as this congestion will
@@ -183,12 +252,12 @@ def selectVehiclesForRerouting(roadSegmentID, fairness=False):
                 reroutingConsiderationList.append(vehicle)
 
     if fairness:
-        reroutingConsiderationList, _, _, _ = sim.selectVehiclesBasedOnFairness(reroutingConsiderationList)
+        reroutingConsiderationList, _, _, _ = sim.selectVehiclesBasedOnFairness(reroutingConsiderationList, context)
 
     return reroutingConsiderationList, vehicleEdge, vehicleOldRoute, []
 
 
-def rerouteSelectedVehicles(roadSegmentID, kPathsBool=False, fairness=False):
+def rerouteSelectedVehicles(roadSegmentID, kPathsBool=False, fairness=False, context=None, viaPaths=False):
     """
     Selects the vehicles to be rerouted from roadSegmentID (the edge OR lane which is currently congested) and reroutes
     them based on current estimated travel times
@@ -197,50 +266,453 @@ def rerouteSelectedVehicles(roadSegmentID, kPathsBool=False, fairness=False):
         roadSegmentID (str): The ID of a segment of road, either an entire edge or an individual lane
         kPathsBool (bool): True if kPaths is being performed
         fairness (bool): True if fairness should be considered for the vehicles
+        context (SimulationContext): The simulation in which the vehicles exist, by default the module variables
+        viaPaths (bool): True if kPaths should choose between via-node alternative routes (which are only found
+            in-process) rather than the k shortest paths
 
     Returns:
         str[]: The list of vehicles which have been rerouted
     """
+    context = getContext(context)
 
     vehiclesToReroute, vehicleEdge, vehicleOldRoute, bestRouteVehicles = selectVehiclesForRerouting(roadSegmentID,
-                                                                                                    fairness)
+                                                                                                    fairness, context)
 
     # Set of vehicles in which rerouting has actually occurred (after rerouting has been ran the route has changed from
     # the old route held in vehicleOldRoute).
     vehiclesUndergoneRerouting = set()
 
-    for vehicle in vehiclesToReroute:
+    # Vehicles rerouted in-process are rerouted together, sharing a single search for each destination
+    newPaths = None
+    if (kPathsBool and (NATIVE_KPATHS or viaPaths)) or (not kPathsBool and NATIVE_DSP):
+        newPaths = rerouteVehiclesBatched(vehiclesToReroute, vehicleEdge, vehicleOldRoute, kPathsBool, context,
+                                          viaPaths)
+
+    for index, vehicle in enumerate(vehiclesToReroute):
         # Rerouting either through kPaths or through DSP
-        if kPathsBool:
-            kPaths(vehicle, vehicleEdge[vehicle])
+        if newPaths is not None:
+            # The new route is already known, so doesn't need to be retrieved through TraCI
+            newPath = newPaths[index]
         else:
-            # Reroute vehicles based on current travel times (Dynamic Shortest Path)
-            traci.vehicle.rerouteTraveltime(vehicle, currentTravelTimes=True)
+            if kPathsBool:
+                kPaths(vehicle, vehicleEdge[vehicle], context)
+            else:
+                # Reroute vehicles based on current travel times (Dynamic Shortest Path)
+                context.traci.vehicle.rerouteTraveltime(vehicle, currentTravelTimes=True)
 
-        newPath = traci.vehicle.getRoute(vehicle)
+            newPath = context.traci.vehicle.getRoute(vehicle)
+        sim.getVehicleSnapshot(context).updateRoute(vehicle, newPath)
+        context.routeIndex.setRoute(vehicle, newPath)
         # If the route has been changed
         if vehicleOldRoute[vehicle] != newPath:
             vehiclesUndergoneRerouting.add(vehicle)
             # Vehicle shouldn't be rerouted again in the same rerouting period
-            reroutedVehicles.add(vehicle)
+            context.reroutedVehicles.add(vehicle)
             # Incrementing vehicle reroute number
-            vehicleReroutedAmount[vehicle] += 1
-            periodSinceLastRerouted[vehicle] = 0
+            context.vehicleReroutedAmount[vehicle] += 1
+            context.periodSinceLastRerouted[vehicle] = 0
 
     return vehiclesUndergoneRerouting
 
 
-def kPaths(veh, currentEdge):
+def rerouteVehiclesBatched(vehicles, vehicleEdge, vehicleOldRoute, kPathsBool=False, context=None, viaPaths=False):
+    """
+    Reroutes the vehicles in-process, either onto one of their k shortest paths (see kPathsNative()) or onto their
+    shortest path (see dspNative()). The vehicles are grouped by destination, with a single reverse shortest path tree
+    being found for each destination (when first needed, as the paths may already be held in the route cache) and
+    shared by every vehicle heading to it (shortest paths are instead found one by one through the contraction
+    hierarchy, where possible).
+
+    Args:
+        vehicles (str[]): The vehicles to reroute, in the order in which they are rerouted
+        vehicleEdge ({str: str}): The edge in which each vehicle is currently situated
+        vehicleOldRoute ({str: (str)}): The route of each vehicle before rerouting
+        kPathsBool (bool): True if kPaths is being performed
+        context (SimulationContext): The simulation in which the vehicles exist, by default the module variables
+        viaPaths (bool): True if kPaths should choose between via-node alternative routes
+    Returns:
+        [(str)]: The route of each vehicle after rerouting, in the same order as vehicles
+    """
+    context = getContext(context)
+
+    # The reverse shortest path tree of each destination, in the form {destination: (remainingCost, nextEdge)}
+    trees = {}
+    newPaths = []
+
+    for vehicle in vehicles:
+        if kPathsBool:
+            _, newPath = kPathsNative(vehicle, vehicleEdge[vehicle], vehicleOldRoute[vehicle], context, trees,
+                                      viaPaths)
+        else:
+            newPath = dspNative(vehicle, vehicleEdge[vehicle], vehicleOldRoute[vehicle], context, trees)
+        newPaths.append(newPath)
+
+    return newPaths
+
+
+def getCustomisedHierarchy(context=None):
+    """
+    Gives the contraction hierarchy of the road network customised with the current global edge weights
+    (edgeSpeedGlobal), if routes should be found through it. The hierarchy is only customised again the first time it's
+    needed after the global edge weights change, so simulations which don't find routes in-process never customise it
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        ContractionHierarchy.CustomisedHierarchy: The customised hierarchy, None if routes should be found by searching
+        the road network itself (including when the global edge weights aren't those of the edge weight store)
+    """
+    context = getContext(context)
+    edgeWeightStore = context.edgeWeightStore
+
+    if not CONTRACTION_HIERARCHY or context.contractionHierarchy is None or edgeWeightStore is None or \
+            context.edgeSpeedGlobal is not edgeWeightStore.edgeSpeedGlobal:
+        return None
+
+    if context.customisedHierarchy is None or context.customisedHierarchy.version != edgeWeightStore.version:
+        context.customisedHierarchy = context.contractionHierarchy.customise(edgeWeightStore.edgeSpeedGlobal,
+                                                                             edgeWeightStore.version)
+
+    return context.customisedHierarchy
+
+
+def usesNativeRouting(context=None):
+    """
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        bool: True if the simulation finds routes in-process (over the road network held in memory, see NATIVE_DSP and
+        NATIVE_KPATHS), rather than only through TraCI
+    """
+    algorithm = getContext(context).algorithm
+
+    return algorithm == 5 or (NATIVE_DSP and algorithm in (1, 3)) or (NATIVE_KPATHS and algorithm in (2, 4))
+
+
+def getSearchWeights(context=None):
+    """
+    Gives the current global edge weights (edgeSpeedGlobal) in the form searched through in-process, a dictionary
+    taken once for each version of the weights held in the edge weight store (see EdgeWeightStore.getSnapshot())
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        {str: float}: The edge weights, which must not be altered
+    """
+    context = getContext(context)
+    edgeWeightStore = context.edgeWeightStore
+
+    # Only the weights held in the edge weight store have a version (e.g. not weights set as a dictionary)
+    if edgeWeightStore is None or context.edgeSpeedGlobal is not edgeWeightStore.edgeSpeedGlobal:
+        return context.edgeSpeedGlobal
+
+    return edgeWeightStore.getSnapshot()
+
+
+def getLandmarkHeuristic(destination, context=None):
+    """
+    Gives the lower bounds on the remaining cost from each edge to the destination over the current global edge weights
+    (edgeSpeedGlobal), if routes should be searched for through them rather than through the contraction hierarchy or
+    a reverse shortest path tree
+
+    Args:
+        destination (str): The edge in which routes end
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        Landmarks.LandmarkHeuristic: The lower bounds, None if routes shouldn't be searched for through them
+    """
+    context = getContext(context)
+
+    if not LANDMARKS or context.landmarks is None or getCustomisedHierarchy(context) is not None:
+        return None
+
+    return context.landmarks.getHeuristic(destination, context.edgeSpeedGlobal)
+
+
+def getDestinationTree(destination, context=None, trees=None):
+    """
+    Gives the reverse shortest path tree of the destination over the current global edge weights (edgeSpeedGlobal),
+    found through the contraction hierarchy where possible (see getCustomisedHierarchy())
+
+    Args:
+        destination (str): The edge in which routes end
+        context (SimulationContext): The simulation, by default the module variables
+        trees ({str: ({str: float}, {str: str})}): The trees already found over the current edge weights, in the form
+            {destination: (remainingCost, nextEdge)}, the tree being added if not already held
+    Returns:
+        ({str: float}, {str: str}): The tree, as given by PathFinding.reverseShortestPathTree()
+    """
+    context = getContext(context)
+
+    tree = trees.get(destination) if trees is not None else None
+    if tree is None:
+        customisedHierarchy = getCustomisedHierarchy(context)
+        if customisedHierarchy is not None:
+            tree = customisedHierarchy.reverseShortestPathTree(destination)
+        else:
+            tree = pathFinding.reverseShortestPathTree(destination, getSearchWeights(context),
+                                                       graph=context.predecessors)
+        if trees is not None:
+            trees[destination] = tree
+
+    return tree
+
+
+def dspNative(veh, currentEdge, route=None, context=None, trees=None):
+    """
+    Reroutes the vehicle onto its shortest path, found in-process over the current global edge weights
+    (edgeSpeedGlobal), so the only TraCI call made is to set the vehicle's new route. The path is found through the
+    contraction hierarchy where possible (see getCustomisedHierarchy()), otherwise by a search directed by landmarks
+    (see getLandmarkHeuristic()) or from the reverse shortest path tree of the vehicle's destination.
+
+    Args:
+        veh (str): The vehicle which needs rerouting
+        currentEdge (str): The edge in which the vehicle is currently situated
+        route (str[]): The vehicle's current route (retrieved through TraCI if not given)
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
+        trees ({str: ({str: float}, {str: str})}): The reverse shortest path trees already found (see
+            getDestinationTree())
+    Returns:
+        (str): The vehicle's route after rerouting (including the edges already passed, as would be retrieved through
+        TraCI), the current route if no route could be found
+    """
+    context = getContext(context)
+
+    if route is None:
+        route = context.traci.vehicle.getRoute(veh)
+
+    customisedHierarchy = getCustomisedHierarchy(context)
+    heuristic = getLandmarkHeuristic(route[-1], context)
+    if customisedHierarchy is not None:
+        _, bestRoute = customisedHierarchy.shortestPath(currentEdge, route[-1])
+    elif heuristic is not None:
+        _, bestRoute = pathFinding.shortestPath(currentEdge, route[-1], getSearchWeights(context),
+                                                graph=context.successors, remainingCost=heuristic)
+    else:
+        remainingCost, nextEdge = getDestinationTree(route[-1], context, trees)
+        _, bestRoute = pathFinding.getRouteFromTree(currentEdge, remainingCost, nextEdge, getSearchWeights(context))
+
+    # No route exists from the current edge, so the vehicle remains on its current route
+    if bestRoute is None:
+        return tuple(route)
+
+    context.traci.vehicle.setRoute(veh, bestRoute)
+
+    # SUMO keeps the edges which the vehicle has already passed at the start of its route
+    newRoute = tuple(route[:route.index(currentEdge)]) + tuple(bestRoute)
+    context.routeIndex.setRoute(veh, newRoute)
+
+    return newRoute
+
+
+def kPaths(veh, currentEdge, context=None):
+    """
+    Determines k shortest paths for the vehicle and randomly assigns one, either in-process or through TraCI depending
+    on NATIVE_KPATHS
+
+    Args:
+        veh (str): The vehicle which needs rerouting
+        currentEdge (str): The edge in which the vehicle is currently situated
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
+    Returns:
+        routeList ([[str]]): The list of routes in which the vehicle could possibly be chosen to take (in the form
+        [[route1], [route2]... [routeK_MAX]])
+    """
+    if NATIVE_KPATHS:
+        routeList, _ = kPathsNative(veh, currentEdge, context=context)
+        return routeList
+
+    return kPathsTraci(veh, currentEdge, context)
+
+
+def kPathsNative(veh, currentEdge, route=None, context=None, trees=None, viaPaths=False):
+    """
+    Determines k shortest paths (or via-node alternative routes) for the vehicle and randomly assigns one. The paths
+    are found in-process using Yen's algorithm or the penalty method (see PENALTY_KPATHS) over the current global edge
+    weights (edgeSpeedGlobal), so the only TraCI call made is to set the vehicle's new route.
+
+    Args:
+        veh (str): The vehicle which needs rerouting
+        currentEdge (str): The edge in which the vehicle is currently situated
+        route (str[]): The vehicle's current route (retrieved through TraCI if not given)
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
+        trees ({str: ({str: float}, {str: str})}): The reverse shortest path trees already found (see
+            getDestinationTree())
+        viaPaths (bool): True if the vehicle should be assigned one of its via-node alternative routes rather than one
+            of its k shortest paths
+    Returns:
+        routeList ([[str]]): The list of routes in which the vehicle could possibly be chosen to take (in the form
+        [[route1], [route2]... [routeK_MAX]])
+        newRoute ((str)): The vehicle's route after rerouting (including the edges already passed, as would be
+        retrieved through TraCI), the current route if no routes could be found
+    """
+    context = getContext(context)
+
+    if route is None:
+        route = context.traci.vehicle.getRoute(veh)
+
+    # Each route is in the form (time, route), with the best route first
+    routes = findKShortestPaths(currentEdge, route[-1], context, trees, viaPaths)
+
+    # No route exists from the current edge, so the vehicle remains on its current route
+    if not routes:
+        return [], tuple(route)
+
+    if PENALTY_KPATHS and PENALTY_KPATHS_CHECK and not viaPaths and \
+            zlib.crc32(veh.encode()) % 1000 < PENALTY_KPATHS_CHECK_SAMPLE * 1000:
+        traciRoutes, _ = findPenalisedPathsGlobalTraci(veh, currentEdge, context)
+        context.penaltyPathChecks.append((veh, [tuple(path) for _, path in traciRoutes] ==
+                                          [tuple(path) for _, path in routes]))
+
+    # Selecting a random route
+    routeChoice = routes[random.randint(0, len(routes) - 1)]
+
+    # Setting the additional (estimated) extra time in which the vehicle has taken due to reroutings
+    extraTime = routeChoice[0] - routes[0][0]
+    context.cumulativeExtraTime[veh] += abs(extraTime)
+
+    context.traci.vehicle.setRoute(veh, routeChoice[1])
+
+    # These are the routes which were available to be selected
+    routeList = [x[1] for x in routes]
+
+    # SUMO keeps the edges which the vehicle has already passed at the start of its route
+    newRoute = tuple(route[:route.index(currentEdge)]) + tuple(routeChoice[1])
+    context.routeIndex.setRoute(veh, newRoute)
+
+    return routeList, newRoute
+
+
+def findKShortestPaths(currentEdge, destination, context=None, trees=None, viaPaths=False):
     """
-    Determines k shortest paths for the vehicle and randomly assigns one
+    Finds up to K_MAX of the shortest paths from the current edge to the destination over the current global edge
+    weights (edgeSpeedGlobal), through Yen's algorithm or the penalty method (see searchKShortestPaths()). The paths
+    are remembered in the route cache for as long as the edge weights are unchanged, so vehicles on the same edge
+    heading to the same destination only search for them once.
+
+    Args:
+        currentEdge (str): The edge in which the paths begin
+        destination (str): The edge in which the paths end
+        context (SimulationContext): The simulation, by default the module variables
+        trees ({str: ({str: float}, {str: str})}): The reverse shortest path trees already found (see
+            getDestinationTree())
+        viaPaths (bool): True for the via-node alternative routes rather than the k shortest paths
+    Returns:
+        [(float, str[])]: The paths found, as (time, route) pairs, with the best path first
+    """
+    context = getContext(context)
+    edgeWeightStore = context.edgeWeightStore
+
+    # Only the weights held in the edge weight store have a version (e.g. not weights set as a dictionary)
+    if edgeWeightStore is None or context.edgeSpeedGlobal is not edgeWeightStore.edgeSpeedGlobal:
+        return searchKShortestPaths(currentEdge, destination, context, trees, viaPaths)
+
+    key = (currentEdge, destination, K_MAX, KPATH_MAX_ALLOWED_TIME, PENALTY_KPATHS, PENALISATION, KPATH_TIMEOUT,
+           KPATH_WORK_BUDGET, KPATH_TIME_BUDGET, viaPaths, VIA_PATH_MAX_OVERLAP, VIA_PATH_LOCAL_OPTIMALITY)
+    routes = context.routeCache.get(key, edgeWeightStore.version)
+    if routes is None:
+        routes = tuple((time, tuple(route)) for time, route in
+                       searchKShortestPaths(currentEdge, destination, context, trees, viaPaths))
+        context.routeCache.put(key, edgeWeightStore.version, routes)
+
+    # Copies are given so that the routes held in the cache can't be altered
+    return [(time, list(route)) for time, route in routes]
+
+
+def searchKShortestPaths(currentEdge, destination, context=None, trees=None, viaPaths=False):
+    """
+    Searches for up to K_MAX of the shortest paths from the current edge to the destination over the current global
+    edge weights (edgeSpeedGlobal), through the penalty method if PENALTY_KPATHS (matching the paths found through
+    TraCI by findPenalisedPathsTraci()), otherwise through Yen's algorithm. The searches after the best path share a
+    budget of KPATH_WORK_BUDGET and KPATH_TIME_BUDGET, the paths found so far being given once it runs out.
+
+    If viaPaths, via-node alternative routes are given instead (see PathFinding.viaPaths()), found from the reverse
+    shortest path tree of the destination and a single search forwards from the current edge.
+
+    Args:
+        currentEdge (str): The edge in which the paths begin
+        destination (str): The edge in which the paths end
+        context (SimulationContext): The simulation, by default the module variables
+        trees ({str: ({str: float}, {str: str})}): The reverse shortest path trees already found (see
+            getDestinationTree())
+        viaPaths (bool): True for the via-node alternative routes rather than the k shortest paths
+    Returns:
+        [(float, str[])]: The paths found, as (time, route) pairs, with the best path first
+    """
+    context = getContext(context)
+    tree = getDestinationTree(destination, context, trees)
+    budget = pathFinding.SearchBudget(KPATH_WORK_BUDGET, KPATH_TIME_BUDGET)
+    weights = getSearchWeights(context)
+
+    if viaPaths:
+        return pathFinding.viaPaths(currentEdge, destination, K_MAX, weights, KPATH_MAX_ALLOWED_TIME,
+                                    VIA_PATH_MAX_OVERLAP, VIA_PATH_LOCAL_OPTIMALITY, context.successors,
+                                    context.predecessors, tree, budget)
+
+    if PENALTY_KPATHS:
+        return pathFinding.penalisedPaths(currentEdge, destination, K_MAX, weights, PENALISATION,
+                                          KPATH_MAX_ALLOWED_TIME, KPATH_TIMEOUT, context.successors,
+                                          context.predecessors, tree, budget)
+
+    return pathFinding.kShortestPaths(currentEdge, destination, K_MAX, weights, KPATH_MAX_ALLOWED_TIME,
+                                      context.successors, context.predecessors, tree, budget)
+
+
+def kPathsTraci(veh, currentEdge, context=None):
+    """
+    Determines k shortest paths for the vehicle and randomly assigns one, finding the paths through TraCI by
+    repeatedly rerouting the vehicle with the travel times of the previous path penalised
 
     Args:
         veh (str): The vehicle which needs rerouting
         currentEdge (str): The edge in which the vehicle is currently situated
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
     Returns:
         routeList ([[str]]): The list of routes in which the vehicle could possibly be chosen to take (in the form
         [[route1], [route2]... [routeK_MAX]])
     """
+    context = getContext(context)
+
+    routes, passedEdges = findPenalisedPathsTraci(veh, currentEdge, context)
+
+    # Selecting a random route
+    ranNum = random.randint(1, len(routes))
+
+    routeChoice = routes[ranNum - 1]
+
+    # Setting the additional (estimated) extra time in which the vehicle has taken due to reroutings
+    routeChoiceTimeTaken = routeChoice[0]
+    bestChoiceTimeTaken = routes[0][0]
+    extraTime = routeChoiceTimeTaken - bestChoiceTimeTaken
+    context.cumulativeExtraTime[veh] += abs(extraTime)
+
+    context.traci.vehicle.setRoute(veh, routeChoice[1])
+    # SUMO keeps the edges which the vehicle has already passed at the start of its route
+    context.routeIndex.setRoute(veh, passedEdges + tuple(routeChoice[1]))
+
+    # These are the routes which were available to be selected
+    routeList = [x[1] for x in routes]
+
+    return routeList
+
+
+def findPenalisedPathsTraci(veh, currentEdge, context=None):
+    """
+    Finds up to K_MAX paths for the vehicle through TraCI by repeatedly rerouting the vehicle with the travel times of
+    the previous path penalised, resetting the vehicle's travel times once found (the vehicle is left on the last path
+    found)
+
+    Args:
+        veh (str): The vehicle which needs rerouting
+        currentEdge (str): The edge in which the vehicle is currently situated
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
+    Returns:
+        [(float, (str))]: The paths found, as (time, route) pairs, with the best path first
+        (str): The edges of the vehicle's route which have already been passed (before the current edge)
+    """
+    context = getContext(context)
+    traci = context.traci
+
     # A set of all of the edges, used to reset the vehicle's internal estimated edge store
     edgesSet = set()
     k = 1
@@ -259,7 +731,7 @@ def kPaths(veh, currentEdge):
     edgesSet.update(currentRoute)
 
     # Recording down the current best route and time
-    bestTime = sim.getGlobalRoutePathTime(currentRoute)
+    bestTime = sim.getGlobalRoutePathTime(currentRoute, context=context)
     routes = {}
     routes['{}_best'.format(k)] = (bestTime, currentRoute,)
 
@@ -267,16 +739,16 @@ def kPaths(veh, currentEdge):
     # penalisation applied) -- this is done on and reset on a vehicle-per-vehicle basis
     adjustedEdgeVehicle = {}
     for edge in currentRoute:
-        adjustedEdgeVehicle[edge] = edgeSpeedGlobal[edge]
+        adjustedEdgeVehicle[edge] = context.edgeSpeedGlobal[edge]
 
     # Creating up to k-1 additional routes
     while k < K_MAX:
-        penalisePathTimeVehicle(veh, currentRoute, adjustedEdgeVehicle)
+        penalisePathTimeVehicle(veh, currentRoute, adjustedEdgeVehicle, context)
 
         traci.vehicle.rerouteTraveltime(veh, currentTravelTimes=False)
         newRoute = traci.vehicle.getRoute(veh)
         currentRoute = newRoute[currentEdgeIndex:]
-        newRouteTime = sim.getGlobalRoutePathTime(currentRoute)
+        newRouteTime = sim.getGlobalRoutePathTime(currentRoute, context=context)
 
         # These are the routes which have already been selected
         currentEligibleRoutes = [x[1] for x in routes.values()]
@@ -375,7 +847,7 @@ def kPaths(veh, currentEdge):
                 k += 1
                 for edge in currentRoute:
                     if edge not in adjustedEdgeVehicle:
-                        adjustedEdgeVehicle[edge] = edgeSpeedGlobal[edge]
+                        adjustedEdgeVehicle[edge] = context.edgeSpeedGlobal[edge]
                 edgesSet.update(currentRoute)
                 routes['{}_best'.format(k)] = (newRouteTime, currentRoute,)
             else:
@@ -386,46 +858,72 @@ def kPaths(veh, currentEdge):
             if timeOut == KPATH_TIMEOUT:
                 break
 
-    # Selecting a random route
-    ranNum = random.randint(1, len(routes))
-
-    routeChoice = routes['{}_best'.format(ranNum)]
+    resetVehicleAdaptedTravelTime(veh, edgesSet, context)
 
-    # Setting the additional (estimated) extra time in which the vehicle has taken due to reroutings
-    routeChoiceTimeTaken = routeChoice[0]
-    bestChoiceTimeTaken = routes['1_best'][0]
-    extraTime = routeChoiceTimeTaken - bestChoiceTimeTaken
-    cumulativeExtraTime[veh] += abs(extraTime)
-
-    traci.vehicle.setRoute(veh, routeChoice[1])
-
-    resetVehicleAdaptedTravelTime(veh, edgesSet)
-
-    # These are the routes which were available to be selected
-    routeList = [x[1] for x in routes.values()]
+    return list(routes.values()), tuple(bestRoute[:currentEdgeIndex])
 
-    return routeList
 
+def findPenalisedPathsGlobalTraci(veh, currentEdge, context=None):
+    """
+    Finds up to K_MAX paths for the vehicle through TraCI as findPenalisedPathsTraci() does, but with SUMO routing the
+    vehicle over the same travel times as the paths found in-process. Vehicles are otherwise routed over the smoothed
+    travel times of their rerouting device (see ROUTING_MODE_AGGREGATED), which the penalised travel times given to
+    the vehicle don't alter. Used to check that the paths found in-process match (see PENALTY_KPATHS_CHECK).
 
-def resetVehicleAdaptedTravelTime(vehicle, edges):
+    Args:
+        veh (str): The vehicle which needs rerouting
+        currentEdge (str): The edge in which the vehicle is currently situated
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
+    Returns:
+        [(float, (str))]: The paths found, as (time, route) pairs, with the best path first
+        (str): The edges of the vehicle's route which have already been passed (before the current edge)
+    """
+    context = getContext(context)
+    vehicle = context.traci.vehicle
+
+    # The vehicle is routed over its own travel times, each edge being given its global edge weight and each internal
+    # edge (within a junction) costing nothing, as the internal edges aren't part of the road network searched
+    routingMode = vehicle.getRoutingMode(veh)
+    vehicle.setRoutingMode(veh, tc.ROUTING_MODE_DEFAULT)
+    searchWeights = getSearchWeights(context)
+    for edge, travelTime in searchWeights.items():
+        vehicle.setAdaptedTraveltime(veh, edge, time=travelTime)
+    for edge in context.internalEdges:
+        vehicle.setAdaptedTraveltime(veh, edge, time=0)
+
+    try:
+        return findPenalisedPathsTraci(veh, currentEdge, context)
+    finally:
+        # The vehicle is left as it would be after being rerouted through kPathsTraci(), with the travel times of the
+        # internal edges (which have no global edge weight) removed
+        resetVehicleAdaptedTravelTime(veh, searchWeights, context)
+        for edge in context.internalEdges:
+            vehicle.setAdaptedTraveltime(veh, edge)
+        vehicle.setRoutingMode(veh, routingMode)
+
+
+def resetVehicleAdaptedTravelTime(vehicle, edges, context=None):
     """
     After a vehicle has undergone rerouting, the vehicle's internal edge travel time should be reset back to the global
     edge travel time (resetting back to global)
 
     :param vehicle: The vehicle whose route should be reset
     :param edges: The edges in which the route consists of
+    :param context: The simulation in which the vehicle exists, by default the module variables
     :return: The reset travel time
     """
+    context = getContext(context)
+
     routeTime = 0
     for edge in edges:
-        edgeTime = edgeSpeedGlobal[edge]
+        edgeTime = context.edgeSpeedGlobal[edge]
         routeTime += edgeTime
-        traci.vehicle.setAdaptedTraveltime(vehID=vehicle, edgeID=edge, time=edgeTime)
+        context.traci.vehicle.setAdaptedTraveltime(vehID=vehicle, edgeID=edge, time=edgeTime)
 
     return edgeTime
 
 
-def congestionOccurrence(k, routeList, bestTime, extraTime):
+def congestionOccurrence(k, routeList, bestTime, extraTime, context=None):
     """
     For some reason, the best time (the route which SUMO considers the best) will not be the best time due to
     skewed congestion detection techniques (the expected time returned by SUMO may be huge to congestion which
@@ -437,13 +935,14 @@ def congestionOccurrence(k, routeList, bestTime, extraTime):
         routeList (str[]): The possible k routes
         bestTime (float): The best time in which the vehicle can achieve
         extraTime: FILL IN
+        context (SimulationContext): The simulation in which the routes exist, by default the module variables
     """
     extraTimeTimeOut = 0
 
     while extraTime < 0:
         randomNum = random.randint(0, k - 1)
         routeSelection = routeList[randomNum]
-        routeTime = sim.getGlobalRoutePathTime(routeSelection)
+        routeTime = sim.getGlobalRoutePathTime(routeSelection, context=context)
         extraTime = routeTime - bestTime
 
         extraTimeTimeOut += 1
@@ -455,7 +954,7 @@ def congestionOccurrence(k, routeList, bestTime, extraTime):
     return extraTime
 
 
-def penalisePathTimeVehicle(veh, route, adjustedEdge={}):
+def penalisePathTimeVehicle(veh, route, adjustedEdge={}, context=None):
     """
     Penalises the path time of a particular vehicle, used for k-shortest paths
 
@@ -464,7 +963,10 @@ def penalisePathTimeVehicle(veh, route, adjustedEdge={}):
         route (str): The route to be penalised for the vehicle, veh
         adjustedEdge: This is the dictionary which contains the edge: travelTime. This keeps track of each individual
         edge's adjusted travel time for a particular vehicle
+        context (SimulationContext): The simulation in which the vehicle exists, by default the module variables
     """
+    traci = getContext(context).traci
+
     for edge in route:
         if adjustedEdge:
             currentAdaptedTime = adjustedEdge[edge]
@@ -472,10 +974,11 @@ def penalisePathTimeVehicle(veh, route, adjustedEdge={}):
             adjustedEdge[edge] = currentAdaptedTime * PENALISATION
             edgeTime = adjustedEdge[edge]
         else:
-            currentAdaptedTime = traci.vehicle.getAdaptedTraveltime(veh, edgeID=edge, time=sim.getCurrentTimestep())
+            currentAdaptedTime = traci.vehicle.getAdaptedTraveltime(veh, edgeID=edge,
+                                                                     time=sim.getCurrentTimestep(context))
             # If adapted time has never been initialised
             if currentAdaptedTime == -1001.0:
-                edgeTime = traci.edge.getAdaptedTraveltime(edge, sim.getCurrentTimestep()) * PENALISATION
+                edgeTime = traci.edge.getAdaptedTraveltime(edge, sim.getCurrentTimestep(context)) * PENALISATION
             else:
                 edgeTime = currentAdaptedTime * PENALISATION
 
@@ -483,16 +986,25 @@ def penalisePathTimeVehicle(veh, route, adjustedEdge={}):
         traci.vehicle.setAdaptedTraveltime(vehID=veh, edgeID=edge, time=edgeTime)
 
 
-def penalisePathTime(route):
+def penalisePathTime(route, context=None):
     """
     Penalises the path time of the edge
 
     Args:
         route (str): The edges (contained within the route) to be penalised
+        context (SimulationContext): The simulation in which the edges exist, by default the module variables
     """
+    context = getContext(context)
+    adjustedEdgeSpeed = context.adjustedEdgeSpeedGlobal
+    edgeWeightStore = context.edgeWeightStore
+
     for edge in route:
         # Getting the current adapted time for that edge
-        currentAdaptedTime = adjustedEdgeSpeedGlobal[edge]
+        currentAdaptedTime = adjustedEdgeSpeed[edge]
         # Penalise the travel time by PENALISATION
-        adjustedEdgeSpeedGlobal[edge] = currentAdaptedTime * 2
-        traci.edge.adaptTraveltime(edge, adjustedEdgeSpeedGlobal[edge])
+        adjustedEdgeSpeed[edge] = currentAdaptedTime * 2
+        context.traci.edge.adaptTraveltime(edge, adjustedEdgeSpeed[edge])
+
+        # Keeping track of the travel time now held by SUMO
+        if edgeWeightStore is not None and edge in edgeWeightStore.edgeIndex:
+            edgeWeightStore.setPushedTravelTime(edge, adjustedEdgeSpeed[edge])
@@ -0,0 +1,256 @@
+###################################################################################################################
+# Holds all of the state of a single simulation (the vehicles, the road network and the connection to SUMO), so   #
+# that it can be passed through the functions used during the simulation rather than being held in module         #
+# variables. Multiple simulations, each with their own context, can then exist within the same process.           #
+#                                                                                                                 #
+# The default context maps onto the module variables (e.g. RoutingFunctions.vehicleReroutedAmount), and is used   #
+# whenever no context is given.                                                                                   #
+#                                                                                                                 #
+# Besides the settings held by each context (see SIMULATION_SETTINGS), the options (e.g. RoutingFunctions.K_MAX)  #
+# are module variables shared by every simulation within the process, so simulations with different options must  #
+# be ran in separate processes (as BatchRunner does).                                                             #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import importlib
+import sys
+
+from src.code.SumoBackend import traci
+from src.code.Fairness import FairnessTracker
+from src.code.RouteCache import RouteCache
+from src.code.RouteIndex import RouteIndex
+from src.code.Vehicles import VehicleStore, VEHICLE_COLUMNS
+
+#############
+# CONSTANTS #
+#############
+
+# The state concerning the vehicles and the progress of a simulation, which is reset at the start of each simulation,
+# in the form {module: (variables)}
+SIMULATION_STATE = {
+    'src.code.RoutingFunctions': ('edgeSpeedGlobal', 'adjustedEdgeSpeedGlobal', 'vehicleReroutedAmount',
+                                  'cumulativeExtraTime', 'reroutedVehicles', 'periodSinceLastRerouted', 'routeIndex',
+                                  'routeCache', 'penaltyPathChecks'),
+    'src.code.SimulationFunctions': ('stoppedStateLastPeriod', 'timeSpentInNetwork', 'timeSpentStopped',
+                                     'initialTimeSpentInNetwork', 'arrivalTime', 'departureTime', 'vehiclesInNetwork',
+                                     'roadCongestion', 'timeTaken', 'skippedTravelTimeWrites', 'subscriptionJunctions',
+                                     'edgeWeightStore', 'fairnessTracker', 'vehicleSnapshot',
+                                     'customisedHierarchy'),
+    'src.code.SumoConnection': ('timerStart', 'timerEnd'),
+    'src.code.Vehicles': ('vehicleStore',),
+}
+
+# The state concerning the road network, which only depends on the scenario and so may be shared between simulations
+# of the same scenario, in the form {module: (variables)}
+NETWORK_STATE = {
+    'src.code.InitialMapHelperFunctions': ('edgesNetwork', 'lanesNetwork', 'fringeEdges', 'laneLengths',
+                                           'edgeLengths', 'directedGraphLanes', 'directedGraphEdges',
+                                           'singleOutgoingEdges', 'reroutingLanes', 'multiIncomingEdges',
+                                           'freeFlowSpeed', 'internalEdges'),
+    'src.code.SimulationFunctions': ('subscribedLanes', 'subscribedEdges', 'subscriptionRange'),
+    'src.code.PathFinding': ('successors', 'predecessors'),
+    'src.code.ContractionHierarchy': ('contractionHierarchy',),
+    'src.code.Landmarks': ('landmarks',),
+}
+
+# The settings of a simulation which may differ between simulations ran within the same process, in the form
+# {module: {variable: attribute}}. A context not given its own settings takes those of the module variables.
+SIMULATION_SETTINGS = {
+    'src.code.SumoConnection': {'ALGORITHM': 'algorithm', 'DATABASE_LOCATION': 'databaseLocation',
+                                'SIMULATION_REFERENCE': 'simulationReference'},
+}
+
+
+class SimulationContext:
+    """
+    The state of a single simulation. A context given the network of a previous context (of the same scenario) reuses
+    the road network held in memory rather than building it again.
+    """
+
+    def __init__(self, connection=None, network=None, label=None, algorithm=None, databaseLocation=None,
+                 simulationReference=None):
+        """
+        Args:
+            connection: The connection to SUMO, either a TraCI connection (see traci.getConnection()) or the libsumo
+                module, by default the connection started when the simulation is ran
+            network (SimulationContext): A context whose road network should be shared with this context
+            label (str): The label of the connection started when the simulation is ran, by default CONNECTION_LABEL
+                (in SumoConnection), which must be unique for simulations ran alongside each other
+            algorithm (int): The rerouting algorithm of the simulation, by default ALGORITHM (in SumoConnection)
+            databaseLocation (str): The database in which the results of the simulation are stored, by default
+                DATABASE_LOCATION (in SumoConnection)
+            simulationReference (str): The reference of the simulation within the database, by default
+                SIMULATION_REFERENCE (in SumoConnection)
+        """
+        self.traci = connection if connection is not None else traci
+        self.label = label
+
+        # The settings not given are those of the module variables when the context is created
+        settings = {'algorithm': algorithm, 'databaseLocation': databaseLocation,
+                    'simulationReference': simulationReference}
+        for module, variables in SIMULATION_SETTINGS.items():
+            for variable, attribute in variables.items():
+                if settings[attribute] is None:
+                    settings[attribute] = getattr(sys.modules.get(module) or importlib.import_module(module), variable)
+                setattr(self, attribute, settings[attribute])
+
+        # The database in which the results of the simulation are stored
+        self.database = None
+        # True once the road network has been loaded into memory
+        self.networkLoaded = False
+
+        self.resetSimulationState()
+
+        if network is not None and network.networkLoaded:
+            self.shareNetwork(network)
+        else:
+            self.resetNetworkState()
+
+    def resetSimulationState(self):
+        """
+        Resets the state of the vehicles and progress of the simulation (as if by running for the first time)
+        """
+        self.edgeSpeedGlobal = {}
+        self.adjustedEdgeSpeedGlobal = {}
+        self.reroutedVehicles = set()
+        self.routeIndex = RouteIndex()
+        self.routeCache = RouteCache()
+        self.penaltyPathChecks = []
+
+        # The metrics of the vehicles (e.g. vehicleReroutedAmount) are each a column of the vehicle store
+        self.vehicleStore = VehicleStore()
+        for metric in VEHICLE_COLUMNS:
+            setattr(self, metric, self.vehicleStore.columns[metric])
+        # Keeps the fairness index of the vehicles up to date between rerouting periods
+        self.fairnessTracker = FairnessTracker(self.vehicleStore)
+        self.vehicleSnapshot = None
+
+        self.vehiclesInNetwork = []
+        self.roadCongestion = {}
+        self.timeTaken = []
+        self.skippedTravelTimeWrites = []
+        self.subscriptionJunctions = ()
+        self.edgeWeightStore = None
+        self.customisedHierarchy = None
+
+        self.timerStart = 0
+        self.timerEnd = 0
+
+    def resetNetworkState(self):
+        """
+        Resets the road network held in memory, so that it is built again when the simulation is initialised
+        """
+        self.edgesNetwork = {}
+        self.lanesNetwork = {}
+        self.fringeEdges = set()
+        self.laneLengths = {}
+        self.edgeLengths = {}
+        self.directedGraphLanes = {}
+        self.directedGraphEdges = {}
+        self.singleOutgoingEdges = set()
+        self.reroutingLanes = set()
+        self.multiIncomingEdges = {}
+        self.freeFlowSpeed = {}
+        self.internalEdges = []
+
+        self.subscribedLanes = []
+        self.subscribedEdges = []
+        self.subscriptionRange = 0
+
+        self.successors = {}
+        self.predecessors = {}
+        self.contractionHierarchy = None
+        self.landmarks = None
+
+        self.networkLoaded = False
+
+    def shareNetwork(self, other):
+        """
+        Uses the road network held in memory by another context (which must be of the same scenario). The road network
+        isn't altered during a simulation, so it may be shared between contexts.
+
+        Args:
+            other (SimulationContext): The context holding the road network
+        """
+        for variables in NETWORK_STATE.values():
+            for variable in variables:
+                setattr(self, variable, getattr(other, variable))
+
+        self.networkLoaded = True
+
+    def isDefault(self):
+        """
+        Returns:
+            bool: True if this is the default context (mapping onto the module variables)
+        """
+        return False
+
+
+def _moduleVariable(module, variable):
+    """
+    Creates a property which reads and writes a module variable
+
+    Args:
+        module (str): The name of the module
+        variable (str): The name of the variable within the module
+    Returns:
+        property: The property
+    """
+    def getVariable(self):
+        return getattr(sys.modules.get(module) or importlib.import_module(module), variable)
+
+    def setVariable(self, value):
+        setattr(sys.modules.get(module) or importlib.import_module(module), variable, value)
+
+    return property(getVariable, setVariable)
+
+
+class _DefaultSimulationContext(SimulationContext):
+    """
+    The context used when no context is given, with its state being the module variables (so that code using the
+    module variables directly sees the same state)
+    """
+
+    def __init__(self):
+        self.traci = traci
+        self.label = None
+
+    database = _moduleVariable('src.code.InitialMapHelperFunctions', 'database_pointer')
+    # The network is always built again for the default context, as the module variables are reset between simulations
+    networkLoaded = property(lambda self: False, lambda self, value: None)
+
+    def isDefault(self):
+        return True
+
+
+for _module, _variables in list(SIMULATION_STATE.items()) + list(NETWORK_STATE.items()):
+    for _variable in _variables:
+        setattr(_DefaultSimulationContext, _variable, _moduleVariable(_module, _variable))
+
+for _module, _variables in SIMULATION_SETTINGS.items():
+    for _variable, _attribute in _variables.items():
+        setattr(_DefaultSimulationContext, _attribute, _moduleVariable(_module, _variable))
+
+# The context used when no context is given
+defaultContext = _DefaultSimulationContext()
+
+
+def getContext(context=None):
+    """
+    Gives the context to be used by a function
+
+    Args:
+        context (SimulationContext): The context given to the function, if any
+    Returns:
+        SimulationContext: The context given, otherwise the default context
+    """
+    if context is None:
+        return defaultContext
+    return context
@@ -21,13 +21,19 @@ if not sumo.COMPUTER:
     os.environ["SUMO_HOME"] = "/Users/jonathan/Documents/comp3200/sumo"
 
 import collections
+import itertools
 import numpy as np
 import sys
-import traci
+from src.code.SumoBackend import traci
 import time
 
 from src.code import RoutingFunctions as func
 from src.code import InitialMapHelperFunctions as initialFunc
+from src.code import EdgeWeights as weights
+from src.code import Vehicles as vehicleState
+from src.code.Fairness import FairnessTracker
+from src.code.SimulationContext import getContext
+from src.code.VehicleSnapshot import VehicleSnapshot
 
 #############
 # VARIABLES #
@@ -35,71 +41,258 @@ from src.code import InitialMapHelperFunctions as initialFunc
 
 # This contains data concerning if the vehicle was in a 'stopped' state (not defined as waiting, e.g. waiting at a
 # traffic light) in the last rerouting period. vehicle: stoppedState (for last rerouting period)
-stoppedStateLastPeriod = {}
+stoppedStateLastPeriod = vehicleState.vehicleStore.stoppedStateLastPeriod
 # This holds the total amount of time spent in the system (in terms of complete rerouting periods in which the vehicle
 # has been present in the system), in the form {vehicle: totalTimeSpent}
-timeSpentInNetwork = {}
+timeSpentInNetwork = vehicleState.vehicleStore.timeSpentInNetwork
 # This holds the approximate time each vehicle was in the 'stopped' state, vehicle:time
-timeSpentStopped = {}
+timeSpentStopped = vehicleState.vehicleStore.timeSpentStopped
 # This holds the initial time spent in the simulation for each vehicle when the simulation begins. This is not updated
 # for the duration of the simulation, it serves its purpose by tracking, at the time of simulation start, the initial
 # time spent metrics
-initialTimeSpentInNetwork = {}
+initialTimeSpentInNetwork = vehicleState.vehicleStore.initialTimeSpentInNetwork
 # Time of arrival at destination (in terms of timesteps) for each vehicle, vehicle:timeOfArrival
-arrivalTime = {}
+arrivalTime = vehicleState.vehicleStore.arrivalTime
 # Time of departure (when the vehicle first arrives) of each vehicle, vehicle:timeEnteredIntoSystem
-departureTime = {}
+departureTime = vehicleState.vehicleStore.departureTime
 # Stores a list of all vehicles in network currently
 vehiclesInNetwork = []
 # Stores the congestion level for each road segment {road segment: congestion level}
 roadCongestion = {}
 # A list of the time taken for the algorithm to run
 timeTaken = []
-
-
-def returnCongestionLevelEdge(edgeID):
+# A list of the number of edges whose travel times weren't given to SUMO (as they hadn't changed), each time the edge
+# weights were retrieved
+skippedTravelTimeWrites = []
+# The lanes, in a fixed order, whose occupancy is retrieved through TraCI subscriptions
+subscribedLanes = []
+# The edges, in a fixed order, whose occupancy is retrieved through TraCI subscriptions
+subscribedEdges = []
+# The junctions in which the lane, edge and vehicle subscriptions are made around, in the form
+# (laneJunction, edgeJunction, vehicleJunction)
+subscriptionJunctions = ()
+# The range of the subscriptions from their junctions, covering the entire road network
+subscriptionRange = 0
+# Holds the estimated travel times of every edge, created when the edge weights are first retrieved
+edgeWeightStore = None
+# Keeps the fairness index of the vehicles in the network up to date between rerouting periods
+fairnessTracker = FairnessTracker(vehicleState.vehicleStore)
+# The vehicles on each edge, and the route and stopped state of each vehicle, during the current rerouting period (None
+# outside of a rerouting period)
+vehicleSnapshot = None
+# The contraction hierarchy of the road network customised with the estimated travel times (None until routes are first
+# found through it, see RoutingFunctions.getCustomisedHierarchy())
+customisedHierarchy = None
+
+
+def returnCongestionLevelEdge(edgeID, context=None):
     """
     Gives the congestion level of the edge
 
     Args:
         edgeID (str): The ID of the edge
+        context (SimulationContext): The simulation, by default the module variables
     Return:
          float: The occupancy (congestion) of the road, in percentage
     """
-    return traci.edge.getLastStepOccupancy(edgeID)
+    return getContext(context).traci.edge.getLastStepOccupancy(edgeID)
 
 
-def getTimeTaken(startTime, endTime):
+def getTimeTaken(startTime, endTime, context=None):
     """
     Records the time taken to perform a task given a start and end time
 
     :param startTime: The starting time
     :param endTime: The ending time
+    :param context: The simulation in which to record the time taken, by default the module variables
     :return: The time taken
     """
     time = endTime - startTime
-    timeTaken.append(time.total_seconds())
+    getContext(context).timeTaken.append(time.total_seconds())
     return time.total_seconds()
 
 
-def returnCongestionLevelLane(laneID):
+def returnCongestionLevelLane(laneID, context=None):
     """
     Gives the congestion level of the road, laneID
 
     Args:
         laneID (str): The ID of the lane (road)
+        context (SimulationContext): The simulation, by default the module variables
     Return:
          float: The occupancy (congestion) of the road, in percentage
     """
-    return traci.lane.getLastStepOccupancy(laneID)
+    return getContext(context).traci.lane.getLastStepOccupancy(laneID)
+
+
+def initialiseRoadCongestionSubscriptions(context=None):
+    """
+    Prepares the retrieval of the occupancy of every road segment which is checked for congestion during a rerouting
+    period (the lanes in reroutingLanes and the edges in singleOutgoingEdges) through TraCI subscriptions.
+
+    Context subscriptions are used, made around a junction with a range covering the entire road network, so that a
+    single subscription covers every lane (or edge) rather than a subscription being made for each road segment.
+
+    This only needs to be called once, after the map has been loaded into memory.
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    """
+    context = getContext(context)
+
+    context.subscribedLanes = list(context.reroutingLanes)
+    context.subscribedEdges = list(context.singleOutgoingEdges)
+
+    # Separate junctions are used for the lanes, edges and vehicles so that their subscription results are kept apart
+    junctions = context.traci.junction.getIDList()
+    context.subscriptionJunctions = (junctions[0], junctions[-1], junctions[len(junctions) // 2])
+
+    # Twice the diagonal of the network ensures every road segment is within range of the junctions
+    (xMin, yMin), (xMax, yMax) = context.traci.simulation.getNetBoundary()
+    context.subscriptionRange = 2 * ((xMax - xMin) ** 2 + (yMax - yMin) ** 2) ** 0.5
+
+
+def subscribeRoadCongestion(context=None):
+    """
+    Subscribes to the occupancy of all lanes and edges (and the travel times and vehicles of all edges, alongside the
+    stopped state of all vehicles) for the next timestep only. SUMO then returns these for the entire road network
+    alongside that single simulation step, rather than with every simulation step (which would be the case with a
+    permanent subscription) or through a TraCI call for each road segment and vehicle.
+
+    The stopped state of every vehicle is needed each rerouting period (see
+    updateVehicleTotalEstimatedTimeSpentInSystem()), whereas routes are only needed for the vehicles upstream of
+    congested road segments, so are retrieved for those vehicles alone (see VehicleSnapshot).
+
+    This should be called in the timestep before a rerouting period.
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    """
+    context = getContext(context)
+    laneJunction, edgeJunction, vehicleJunction = context.subscriptionJunctions
+    # The time of the next timestep
+    nextTimestep = context.traci.simulation.getTime() + float(sumo.STEP_LENGTH)
+
+    context.traci.junction.subscribeContext(laneJunction, traci.constants.CMD_GET_LANE_VARIABLE,
+                                            context.subscriptionRange, [traci.constants.LAST_STEP_OCCUPANCY],
+                                            nextTimestep, nextTimestep)
+    context.traci.junction.subscribeContext(edgeJunction, traci.constants.CMD_GET_EDGE_VARIABLE,
+                                            context.subscriptionRange,
+                                            [traci.constants.LAST_STEP_OCCUPANCY,
+                                             traci.constants.VAR_CURRENT_TRAVELTIME,
+                                             traci.constants.LAST_STEP_VEHICLE_ID_LIST],
+                                            nextTimestep, nextTimestep)
+    context.traci.junction.subscribeContext(vehicleJunction, traci.constants.CMD_GET_VEHICLE_VARIABLE,
+                                            context.subscriptionRange,
+                                            [traci.constants.VAR_STOPSTATE], nextTimestep, nextTimestep)
+
+
+def getRoadCongestionSnapshot(context=None):
+    """
+    Gives the congestion level of every subscribed road segment for the current timestep, using the results of the
+    subscriptions made in subscribeRoadCongestion() during the previous timestep
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Return:
+        laneOccupancy (np.ndarray): The occupancy of each lane, in the same order as subscribedLanes
+        edgeOccupancy (np.ndarray): The occupancy of each edge, in the same order as subscribedEdges
+    """
+    context = getContext(context)
+    subscribedLanes = context.subscribedLanes
+    subscribedEdges = context.subscribedEdges
+
+    laneJunction, edgeJunction, _ = context.subscriptionJunctions
+    laneResults = context.traci.junction.getContextSubscriptionResults(laneJunction)
+    edgeResults = context.traci.junction.getContextSubscriptionResults(edgeJunction)
+    occupancy = traci.constants.LAST_STEP_OCCUPANCY
+
+    laneOccupancy = np.fromiter((laneResults[lane][occupancy] for lane in subscribedLanes), dtype=float,
+                                count=len(subscribedLanes))
+    edgeOccupancy = np.fromiter((edgeResults[edge][occupancy] for edge in subscribedEdges), dtype=float,
+                                count=len(subscribedEdges))
+
+    return laneOccupancy, edgeOccupancy
+
+
+def getTravelTimeSnapshot(edges, context=None):
+    """
+    Gives the estimated travel time of each edge for the current timestep, using the results of the subscriptions made
+    in subscribeRoadCongestion() during the previous timestep
+
+    Args:
+        edges (str[]): The edges whose travel times are needed
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        np.ndarray: The travel time of each edge in the same order as edges, None if no subscription results exist for
+        the current timestep
+    """
+    context = getContext(context)
+    if not context.subscriptionJunctions:
+        return None
+
+    edgeResults = context.traci.junction.getContextSubscriptionResults(context.subscriptionJunctions[1])
+    if not edgeResults:
+        return None
+
+    travelTime = traci.constants.VAR_CURRENT_TRAVELTIME
+
+    return np.fromiter((edgeResults[edge][travelTime] for edge in edges), dtype=float, count=len(edges))
+
+
+def createVehicleSnapshot(context=None):
+    """
+    Creates the snapshot of the vehicles for the current rerouting period, using the results of the subscriptions made
+    in subscribeRoadCongestion() during the previous timestep if they exist. Otherwise, the vehicles are retrieved
+    through TraCI when first needed by the snapshot.
+
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        VehicleSnapshot: The snapshot
+    """
+    context = getContext(context)
+    if not context.subscriptionJunctions:
+        return VehicleSnapshot(context.traci)
+
+    _, edgeJunction, vehicleJunction = context.subscriptionJunctions
+    edgeResults = context.traci.junction.getContextSubscriptionResults(edgeJunction)
+    if not edgeResults:
+        return VehicleSnapshot(context.traci)
+
+    vehicleResults = context.traci.junction.getContextSubscriptionResults(vehicleJunction) or {}
+    vehicleIDs = traci.constants.LAST_STEP_VEHICLE_ID_LIST
+    stopState = traci.constants.VAR_STOPSTATE
+
+    return VehicleSnapshot(context.traci,
+                           {edge: results[vehicleIDs] for edge, results in edgeResults.items()
+                            if vehicleIDs in results},
+                           stopStates={vehicle: results[stopState] for vehicle, results in vehicleResults.items()
+                                       if stopState in results})
+
+
+def getVehicleSnapshot(context=None):
+    """
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    Returns:
+        VehicleSnapshot: The snapshot of the current rerouting period, or a new snapshot (retrieving the vehicles
+        through TraCI) outside of a rerouting period
+    """
+    context = getContext(context)
+    if context.vehicleSnapshot is None:
+        return VehicleSnapshot(context.traci)
+    return context.vehicleSnapshot
 
 
-def calculateAverageRoadCongestion():
+def calculateAverageRoadCongestion(context=None):
     """
     Calculates the average road network congestion level
 
+    :param context: The simulation, by default the module variables
     :return: The mean road network congestion
     """
+    roadCongestion = getContext(context).roadCongestion
     numberOfEntries = len(roadCongestion)
     # All congestion entries added together
     totalCongestion = sum(roadCongestion.values())
@@ -112,18 +305,22 @@ def calculateAverageRoadCongestion():
     return meanCongestion
 
 
-def getEdgeOneAheadVehicleRoute(vehID):
+def getEdgeOneAheadVehicleRoute(vehID, context=None):
     """
     Returns the edge in which the given vehicle shall travel to next (the edge after it's current edge in it's route)
 
     Args:
         vehID (str): The ID of the vehicle
+        context (SimulationContext): The simulation, by default the module variables
     Return:
          nextEdge (str): The next edge in the vehicle's route
     """
+    context = getContext(context)
+    traci = context.traci
+
     # Getting the current location of the vehicle
     actualLocation = traci.vehicle.getLaneID(vehID)
-    edgeLoc = initialFunc.lanesNetwork[actualLocation]
+    edgeLoc = context.lanesNetwork[actualLocation]
     # Getting the edge which appears in the route after it's current edge (adding 1 to the index of the
     # current location)
     nextEdge = traci.vehicle.getRoute(vehID)[traci.vehicle.getRoute(vehID).index(edgeLoc) + 1]
@@ -131,12 +328,13 @@ def getEdgeOneAheadVehicleRoute(vehID):
     return nextEdge
 
 
-def getEdge2DCoordinates(edge):
+def getEdge2DCoordinates(edge, context=None):
     """
     Gets the 2D coordinates of the 'from' node which connects to the lane
 
     Args:
         edge (str): The edge to teleport to
+        context (SimulationContext): The simulation, by default the module variables
     Returns:
         (str, str): Returns the tuple (x, y)
             Individual elements can be accessed by tuple.x and tuple.y
@@ -146,7 +344,7 @@ def getEdge2DCoordinates(edge):
     # Getting the 2D coordinates (x, y) for that node
     x, y = sumo.net.getNode(node).getCoord()
     # Changes the GUI offset to the coordinates of the node
-    traci.gui.setOffset("View #0", x, y)
+    getContext(context).traci.gui.setOffset("View #0", x, y)
 
     # Creating a named tuple to store (x, y) information
     coord = collections.namedtuple('coord', ['x', 'y'])
@@ -154,7 +352,7 @@ def getEdge2DCoordinates(edge):
     return c
 
 
-def getRoutePathTimeVehicle(veh, route="null"):
+def getRoutePathTimeVehicle(veh, route="null", context=None):
     """
     Calculates the total estimated time, considering the current road network conditions, of the route of a particular
     vehicle (for it's particular internal edge weights)
@@ -162,9 +360,13 @@ def getRoutePathTimeVehicle(veh, route="null"):
     Args:
         veh (str): The vehicle with the route to test
         route (str[]): The route the vehicle is taking
+        context (SimulationContext): The simulation, by default the module variables
     Returns:
         int: The estimated route time for veh (for defined route, otherwise current)
     """
+    context = getContext(context)
+    traci = context.traci
+
     currentTime = sumo.Main.getCurrentTime()
     totalEstimatedTime = 0
     # If route has not been defined, set route to the current vehicle route
@@ -177,7 +379,7 @@ def getRoutePathTimeVehicle(veh, route="null"):
         # If adapted travel time has not been set
         if vehAdaptedTime == -1001.0:
             # Setting the vehicle's internal edge travel time to be the same as the global edge travel time
-            vehAdaptedTime = func.edgeSpeedGlobal[edge]
+            vehAdaptedTime = context.edgeSpeedGlobal[edge]
         totalEstimatedTime += vehAdaptedTime
         # Sets the vehicle's internal travel time for that edge
         traci.vehicle.setAdaptedTraveltime(vehID=veh, edgeID=edge, time=vehAdaptedTime)
@@ -185,7 +387,7 @@ def getRoutePathTimeVehicle(veh, route="null"):
     return totalEstimatedTime
 
 
-def getGlobalRoutePathTime(route, realTime=True):
+def getGlobalRoutePathTime(route, realTime=True, context=None):
     """
     Calculates the total path time on a global scale, not specific to a vehicle
 
@@ -193,78 +395,105 @@ def getGlobalRoutePathTime(route, realTime=True):
         route (str): The route across the road network
         realTime (bool): This specifies whether or not the true current travel times should be used or if the user wants
         to test based on a certain adjusted road network (the adjustedEdgeSpeedGlobal) for rerouting purposes
+        context (SimulationContext): The simulation, by default the module variables
     Returns:
         int: The estimated route times
     """
+    context = getContext(context)
     totalEstimatedTime = 0
 
     if realTime:
+        edgeSpeedGlobal = context.edgeSpeedGlobal
         for edgeRealtime in route:
             # noinspection PyBroadException
             try:
-                totalEstimatedTime += func.edgeSpeedGlobal[edgeRealtime]
+                totalEstimatedTime += edgeSpeedGlobal[edgeRealtime]
             except Exception:
                 pass
     else:
+        adjustedEdgeSpeedGlobal = context.adjustedEdgeSpeedGlobal
         for edge in route:
-            totalEstimatedTime += func.adjustedEdgeSpeedGlobal[edge]
+            totalEstimatedTime += adjustedEdgeSpeedGlobal[edge]
 
     return totalEstimatedTime
 
 
-def getCurrentTimestep():
+def getCurrentTimestep(context=None):
     """
+    :param context: The simulation, by default the module variables
     :return: The current timestep, i
     """
-    return traci.simulation.getCurrentTime()
+    return getContext(context).traci.simulation.getCurrentTime()
+
+
+def getGlobalEdgeWeights(context=None):
+    """
+    Populates the global edge weight variables (edgeSpeedGlobal and adjustedEdgeSpeedGlobal), which store the edge and
+    corresponding estimated travel time
 
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
+    """
+    context = getContext(context)
+    traci = context.traci
+
+    if context.edgeWeightStore is None:
+        context.edgeWeightStore = weights.EdgeWeightStore(context.freeFlowSpeed)
+    edgeWeightStore = context.edgeWeightStore
+
+    travelTimes = None
+    if sumo.SUBSCRIPTIONS:
+        travelTimes = getTravelTimeSnapshot(edgeWeightStore.edgeIDs, context)
+
+    if travelTimes is None:
+        travelTimes = np.fromiter((traci.edge.getTraveltime(edge) for edge in edgeWeightStore.edgeIDs), dtype=float,
+                                  count=len(edgeWeightStore.edgeIDs))
 
-def getGlobalEdgeWeights():
     """
-    Populates the global edge weight variable, which stores the edge and corresponding estimated travel time
+    Sometimes congestion skews the road traffic conditions (this is down to the SUMO simulator itself, not my work).
+    For example, if there is congestion ahead and the road is at a standstill for some reason (could be down to, 
+    for example a traffic light) SUMO views this as virtually infinite expected travel time and will therefore
+    have a huge negative impact on the travel times for the road network. So, I decided to bound edges to 15x 
+    their free-flow travel speed conditions in an attempt to alleviate this.
     """
-    for edge in traci.edge.getIDList():
-        travelTime = traci.edge.getTraveltime(edge)
-        """
-        Sometimes congestion skews the road traffic conditions (this is down to the SUMO simulator itself, not my work).
-        For example, if there is congestion ahead and the road is at a standstill for some reason (could be down to, 
-        for example a traffic light) SUMO views this as virtually infinite expected travel time and will therefore
-        have a huge negative impact on the travel times for the road network. So, I decided to bound edges to 15x 
-        their free-flow travel speed conditions in an attempt to alleviate this.
-        """
-        if travelTime > (initialFunc.freeFlowSpeed[edge] * 15):
-            travelTime = initialFunc.freeFlowSpeed[edge] * 15
+    edgeWeightStore.update(travelTimes)
 
-        func.edgeSpeedGlobal[edge] = travelTime
-        func.adjustedEdgeSpeedGlobal[edge] = travelTime
+    context.edgeSpeedGlobal = edgeWeightStore.edgeSpeedGlobal
+    context.adjustedEdgeSpeedGlobal = edgeWeightStore.adjustedEdgeSpeedGlobal
 
-        # Initially setting the weights for the road network as being the current estimated travel times
-        traci.edge.adaptTraveltime(edge, travelTime)
+    # Initially setting the weights for the road network as being the current estimated travel times (only for the
+    # edges whose travel times have changed)
+    context.skippedTravelTimeWrites.append(edgeWeightStore.pushTravelTimes(traci.edge.adaptTraveltime))
 
 
-def fairnessIndex():
+def fairnessIndex(context=None):
     """
     This is the fairness index, F, of all of the vehicle's QOE's in the network currently. This hopes to determine the
     fairness of the system as a whole
 
+    Args:
+        context (SimulationContext): The simulation, by default the module variables
     Returns:
         fairnessIndexCalculated (float): This is the fairness index, F
         standardDeviation (float): This is the standard deviation of the QOEs
     """
-    global vehiclesInNetwork
+    context = getContext(context)
 
     # For all vehicles currently in the network work out the fairness index
-    vehiclesList = vehiclesInNetwork
+    vehiclesList = context.vehiclesInNetwork
 
     if not vehiclesList:
-        vehiclesList = traci.vehicle.getIDList()
+        vehiclesList = context.traci.vehicle.getIDList()
+
+    # Only the vehicles which have changed since the previous rerouting period are updated, unless the metrics aren't
+    # held in the vehicle store (e.g. replaced by dictionaries)
+    if context.fairnessTracker is not None and context.fairnessTracker.canTrack(context):
+        return context.fairnessTracker.fairnessIndex(vehiclesList, func.FAIRNESS_WEIGHTING)
 
     # All QOE values and highest and lowest values observed
-    _, qoe, highestQOE, lowestQOE = selectVehiclesBasedOnFairness(vehiclesList)
+    qoeValues, highestQOE, lowestQOE = calculateQOE(list(dict.fromkeys(vehiclesList)), context)
 
     if lowestQOE < highestQOE:
-        qoeValues = list(qoe.values())
-
         standardDeviation = np.nanstd(np.where(np.isclose(qoeValues, 0), np.nan, qoeValues))
 
         fairnessIndexCalculated = 1 - ((2 * standardDeviation) / (highestQOE - lowestQOE))
@@ -276,7 +505,7 @@ def fairnessIndex():
     return fairnessIndexCalculated, standardDeviation
 
 
-def updateVehicleTotalEstimatedTimeSpentInSystem(period=0):
+def updateVehicleTotalEstimatedTimeSpentInSystem(period=0, context=None):
     """
     This updates the total time spent in the system for each vehicle. Initially, a rough estimate of the time spent
     is calculated by incrementing the total time by the rerouting period IF they were present and WEREN'T stopped during
@@ -287,16 +516,22 @@ def updateVehicleTotalEstimatedTimeSpentInSystem(period=0):
 
     Args:
         period (int): This is the time period in which this method is repeated
+        context (SimulationContext): The simulation, by default the module variables
     """
+    context = getContext(context)
+    stoppedStateLastPeriod = context.stoppedStateLastPeriod
+    timeSpentInNetwork = context.timeSpentInNetwork
+    timeSpentStopped = context.timeSpentStopped
 
     """ Incrementing all of the vehicle's current time spent in the simulation """
     if period == 0:
         period = func.REROUTING_PERIOD
+    vehicleSnapshot = getVehicleSnapshot(context)
     # All vehicles in the road network
-    for vehicle in traci.vehicle.getIDList():
+    for vehicle in context.traci.vehicle.getIDList():
 
         # Current status of the vehicle, if stopped (not defined as waiting at a traffic light), then True
-        currentStatus = traci.vehicle.isStopped(vehicle)
+        currentStatus = vehicleSnapshot.isStopped(vehicle)
         # If vehicle didn't exist in the system for the last rerouting period
         if vehicle not in stoppedStateLastPeriod:
             stoppedStateLastPeriod[vehicle] = currentStatus
@@ -312,37 +547,49 @@ def updateVehicleTotalEstimatedTimeSpentInSystem(period=0):
         stoppedStateLastPeriod[vehicle] = currentStatus
 
 
-def vehiclesDepartedAndArrived(i):
+def vehiclesDepartedAndArrived(i, context=None):
     """
     This tracks the vehicles which have just departed in the simulation and the vehicles which have left the simulation
     once they have arrived at their destination
 
     Args:
         i (int): The timestep of the simulation
+        context (SimulationContext): The simulation, by default the module variables
     """
+    context = getContext(context)
+    timeSpentInNetwork = context.timeSpentInNetwork
+    timeSpentStopped = context.timeSpentStopped
+    departureTime = context.departureTime
+    arrivalTime = context.arrivalTime
+    initialTimeSpentInNetwork = context.initialTimeSpentInNetwork
+    vehicleReroutedAmount = context.vehicleReroutedAmount
+    cumulativeExtraTime = context.cumulativeExtraTime
 
     """ Checking for vehicle's which have just entered the system """
-    for vehicle in traci.simulation.getDepartedIDList():
+    for vehicle in context.traci.simulation.getDepartedIDList():
         departureTime[vehicle] = i
+        # The route of the vehicle is added to the route index when first needed
+        context.routeIndex.removeVehicle(vehicle)
         # If vehicle has never appeared in the system (also not stored on database) then initialise all of the values
         if vehicle not in timeSpentInNetwork:
             timeSpentInNetwork[vehicle] = 0
-        if vehicle not in func.vehicleReroutedAmount:
-            func.vehicleReroutedAmount[vehicle] = 0
-        if vehicle not in func.cumulativeExtraTime:
-            func.cumulativeExtraTime[vehicle] = 0
+        if vehicle not in vehicleReroutedAmount:
+            vehicleReroutedAmount[vehicle] = 0
+        if vehicle not in cumulativeExtraTime:
+            cumulativeExtraTime[vehicle] = 0
         # This is reset every time the simulation is restarted and doesn't need to be tracked between simulations
         timeSpentStopped[vehicle] = 0
         if not sumo.COMPUTER:
             # Setting the vehicle rerouting method to be 'smoothed'
-            traci.vehicle.setRoutingMode(vehicle, traci.constants.ROUTING_MODE_AGGREGATED)
+            context.traci.vehicle.setRoutingMode(vehicle, traci.constants.ROUTING_MODE_AGGREGATED)
         else:
-            traci.vehicle.setParameter(vehicle, '0x89', '1')
+            context.traci.vehicle.setParameter(vehicle, '0x89', '1')
 
     """ Checking for vehicle's which have finished their trip in the system """
     # Checking which vehicles have left the system during this timestep
-    for vehicle in traci.simulation.getArrivedIDList():
+    for vehicle in context.traci.simulation.getArrivedIDList():
         arrivalTime[vehicle] = i
+        context.routeIndex.removeVehicle(vehicle)
         # With time spent with the vehicle in a stopped state being taken into account.
         additionalTimeRunning = (arrivalTime[vehicle] - departureTime[vehicle]) - timeSpentStopped[vehicle]
         # If the vehicle has made a previous appearance in the system
@@ -362,134 +609,105 @@ def vehiclesDepartedAndArrived(i):
                 timeSpentInNetwork[vehicle] = additionalTimeRunning
 
 
-def selectVehiclesBasedOnFairness(reroutedList):
+def calculateQOE(vehicles, context=None):
     """
-    Selects vehicles for rerouting based on their current rerouting metrics
+    Calculates the normalised QOE of each of the vehicles from their current rerouting metrics, all of the vehicles at
+    once through NumPy
 
     Args:
-        reroutedList (set()): All of the vehicles which are eligible to be rerouted
+        vehicles ([str]): The vehicles, without repeats
+        context (SimulationContext): The simulation, by default the module variables
 
     Returns:
-        reroutedFairly (set()): The vehicles which shall be rerouted due to their fairness measures
+        qoe (np.ndarray): The normalised QOE of each vehicle, in the order of vehicles
+        largestQOE (float): The largest normalised QOE
+        smallestQOE (float): The smallest normalised QOE
     """
+    context = getContext(context)
+
+    if not vehicles:
+        return np.empty(0), 0, sys.maxsize
+
     # Quality of Experience relates to the fairness in which the vehicle has experienced throughout their simulations,
     # the higher the QOE the more the system has been 'fair' to the user; similarly, lower values indicate an unfairness
     # given by the system to the vehicle
-    qoe = {}
-
-    # This is the largest value for cumulativeExtraTime out of all of the vehicles
-    largestCET = 0
-    # The largest vehicleReroutedAmount for all of the vehicles in reroutedList
-    largestVRA = 0
-    # This is the least amount of time spent in the system
-    leastTime = sys.maxsize
-    # This is the most time spent in the system
-    mostTime = 0
-
-    # Finding largest values for CET and VRA
-    for vehicle in reroutedList:
-        vehicleVRA = func.vehicleReroutedAmount[vehicle]
-        vehicleCET = func.cumulativeExtraTime[vehicle]
-        vehicleTimeSpent = timeSpentInNetwork[vehicle]
-
-        if vehicleVRA > largestVRA:
-            largestVRA = vehicleVRA
-        if vehicleCET > largestCET:
-            largestCET = vehicleCET
-        if vehicleTimeSpent > mostTime:
-            mostTime = vehicleTimeSpent
-        if vehicleTimeSpent < leastTime:
-            leastTime = vehicleTimeSpent
-
-    # This is the largest QOE value (not necessarily the largest normalised QOE)
-    largestQOEVal = 0
-    # Largest normalised QOE
-    largestQOE = 0
-    # Smallest normalised QOE
-    smallestQOE = sys.maxsize
-    # This is the smallest qoe
-    smallestQOEVal = sys.maxsize
-
-    # Fairness is calculated using these 2 values
-    for vehicle in reroutedList:
-        vehicleVRA = func.vehicleReroutedAmount[vehicle]
-        vehicleCET = func.cumulativeExtraTime[vehicle]
-        vehicleTimeSpent = timeSpentInNetwork[vehicle]
-
-        # Working out the fraction of the largest VRA and CET that the vehicle has
-        if largestVRA == 0:
-            vraPercentage = 0
-        else:
-            vraPercentage = vehicleVRA / largestVRA
+    vehicleVRA, vehicleCET, vehicleTimeSpent = (values.astype(np.float64) for values in vehicleState.gatherValues(
+        vehicles, context.vehicleReroutedAmount, context.cumulativeExtraTime, context.timeSpentInNetwork))
 
-        if largestCET == 0:
-            cetPercentage = 0
-        else:
-            cetPercentage = vehicleCET / largestCET
-
-        """
-        This is used to normalise the QOE of each of the vehicles, keeping in mind that vehicles which has spent
-        longer in the simulation will use the system more (therefore more reroutings). This means that vehicles which
-        are new to the system will always be chosen for rerouting as the system views them as having experienced more
-        fairness (this is not true of course, new vehicles who have experienced no rerouting should be considered in a 
-        similar way to old vehicles [which have used the system for a long time] whom have not experienced many
-        reroutings for their time using the system, therefore this is required to normalise the QOE values based on the
-        time spent in the system.
-        """
-        if mostTime == 0:
-            normalisedTime = 0
-        else:
-            normalisedTime = vehicleTimeSpent / mostTime
+    # The largest VRA, CET and time spent in the system of all of the vehicles (none being less than 0)
+    largestVRA = max(vehicleVRA.max(), 0)
+    largestCET = max(vehicleCET.max(), 0)
+    mostTime = max(vehicleTimeSpent.max(), 0)
 
-        # mainMeasures is the ratio of VRA and CET, with no concern for time
-        mainMeasures = ((vraPercentage * func.FAIRNESS_WEIGHTING) + (cetPercentage * (1 - func.FAIRNESS_WEIGHTING)))
+    # Working out the fraction of the largest VRA and CET that each vehicle has
+    vraPercentage = vehicleVRA / largestVRA if largestVRA != 0 else np.zeros(len(vehicles))
+    cetPercentage = vehicleCET / largestCET if largestCET != 0 else np.zeros(len(vehicles))
 
-        if normalisedTime == 0:
-            val = 0
-        else:
-            val = mainMeasures / normalisedTime
+    # mainMeasures is the ratio of VRA and CET, with no concern for time
+    mainMeasures = (vraPercentage * func.FAIRNESS_WEIGHTING) + (cetPercentage * (1 - func.FAIRNESS_WEIGHTING))
+
+    """
+    This is used to normalise the QOE of each of the vehicles, keeping in mind that vehicles which has spent longer in
+    the simulation will use the system more (therefore more reroutings). This means that vehicles which are new to the
+    system will always be chosen for rerouting as the system views them as having experienced more fairness (this is
+    not true of course, new vehicles who have experienced no rerouting should be considered in a similar way to old
+    vehicles [which have used the system for a long time] whom have not experienced many reroutings for their time
+    using the system, therefore this is required to normalise the QOE values based on the time spent in the system.
+    """
+    if mostTime == 0:
+        qoeVal = np.zeros(len(vehicles))
+    else:
+        normalisedTime = vehicleTimeSpent / mostTime
+        # Vehicles which haven't spent any time in the system have a QOE value of 0
+        qoeVal = np.zeros(len(vehicles))
+        np.divide(mainMeasures, normalisedTime, out=qoeVal, where=normalisedTime != 0)
 
-        # qoeVal represents the QOE in it's non-normalised form
-        qoeVal = val
-        qoe[vehicle] = qoeVal
-        if qoeVal > largestQOEVal:
-            largestQOEVal = qoeVal
-        if qoeVal < smallestQOEVal:
-            smallestQOEVal = qoeVal
+    # qoeVal represents the QOE in it's non-normalised form
+    largestQOEVal = max(qoeVal.max(), 0)
+    smallestQOEVal = qoeVal.min()
 
     """ Normalising the QOE values based on the amount of time spent in the system in total """
 
-    for vehicle in qoe:
-        notNormalised = qoe[vehicle]
-        # The QOE value can be between 0 to largestQOEVal value, we multiply 10 so that the range is extended from 0-10
-        if largestQOEVal == 0:
-            qoe[vehicle] = 1
-        else:
-            # Division by 0 avoidance
-            if largestQOEVal - smallestQOEVal == 0:
-                # Set all values to 10 given that they all have the same QOE value
-                qoe = dict.fromkeys(qoe, 10)
-                break
-            else:
-                # Normalising QOE values back to range 0-1 and then multiplying by 10 to get within range 0-10.
-                # Additionally, we negate this from 10 (qoeVal is +10 more than the QOE we need)
-                qoe[vehicle] = 10 - ((notNormalised - smallestQOEVal) / (largestQOEVal - smallestQOEVal) * 10)
-        if largestQOE < qoe[vehicle]:
-            largestQOE = qoe[vehicle]
-        if smallestQOE > qoe[vehicle]:
-            smallestQOE = qoe[vehicle]
+    if largestQOEVal == 0:
+        return np.ones(len(vehicles)), 1, 1
+    elif largestQOEVal - smallestQOEVal == 0:
+        # Set all values to 10 given that they all have the same QOE value (the largest and smallest normalised QOE
+        # being left unset)
+        return np.full(len(vehicles), 10.0), 0, sys.maxsize
+
+    # Normalising QOE values back to range 0-1 and then multiplying by 10 to get within range 0-10. Additionally, we
+    # negate this from 10 (qoeVal is +10 more than the QOE we need)
+    qoe = 10 - ((qoeVal - smallestQOEVal) / (largestQOEVal - smallestQOEVal) * 10)
+
+    return qoe, float(max(qoe.max(), 0)), float(qoe.min())
+
+
+def selectVehiclesBasedOnFairness(reroutedList, context=None):
+    """
+    Selects vehicles for rerouting based on their current rerouting metrics
+
+    Args:
+        reroutedList (set()): All of the vehicles which are eligible to be rerouted
+        context (SimulationContext): The simulation, by default the module variables
+
+    Returns:
+        reroutedFairly (set()): The vehicles which shall be rerouted due to their fairness measures
+    """
+    vehicles = list(dict.fromkeys(reroutedList))
+    qoeValues, largestQOE, smallestQOE = calculateQOE(vehicles, context)
+    qoe = dict(zip(vehicles, qoeValues.tolist()))
 
     """ Selecting top PERCENTILE to reroute (top PERCENTILE of fairness) """
 
     # Checking if all QOE values for all vehicles are the same (and if so, reroute them all)
-    if len(set(qoe.values())) == 1:
-        reroutedFairly = list(qoe.keys())
+    if len(qoeValues) and (qoeValues == qoeValues[0]).all():
+        reroutedFairly = vehicles
     else:
         """" Select vehicles based on their respective QOEs"""
         # This is the cut-off point in which vehicles having a higher QOE shall be selected for rerouting
         qoePercentile = largestQOE * func.PERCENTILE
 
         # List containing the vehicles with qoe's >= qoePercentile (those which shall be rerouted)
-        reroutedFairly = [k for k, v in qoe.items() if v >= qoePercentile]
+        reroutedFairly = list(itertools.compress(vehicles, (qoeValues >= qoePercentile).tolist()))
 
     return reroutedFairly, qoe, largestQOE, smallestQOE
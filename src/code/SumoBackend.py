@@ -0,0 +1,102 @@
+###################################################################################################################
+# Allows the simulation to be controlled either through TraCI (a socket connection to a separate SUMO process) or  #
+# through libsumo (SUMO ran within this process), without the rest of the code needing to know which is used.     #
+#                                                                                                                 #
+# libsumo avoids a round trip over the socket for every call, however it can't be used with the GUI.              #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import traci as _traci
+
+# The libsumo module, only imported once selected as importing it loads the whole of SUMO into this process. False
+# until the import has been attempted, then None if libsumo isn't installed
+_libsumo = False
+
+
+def _importLibsumo():
+    """
+    Returns:
+        The libsumo module, or None if libsumo isn't installed
+    """
+    global _libsumo
+    if _libsumo is False:
+        try:
+            import libsumo
+            _libsumo = libsumo
+        except ImportError:
+            _libsumo = None
+
+    return _libsumo
+
+
+def getBackend(libsumo):
+    """
+    Returns the module a simulation should be controlled through, without selecting it for the module variables (see
+    SumoBackend.selectBackend())
+
+    Args:
+        libsumo (bool): True if libsumo should be used, False if TraCI should be used
+    Returns:
+        The libsumo module, or the traci module if TraCI was selected or libsumo isn't installed
+    """
+    if libsumo and _importLibsumo() is None:
+        print("libsumo isn't available, running through TraCI instead")
+        libsumo = False
+
+    return _libsumo if libsumo else _traci
+
+
+def isLibsumo(module):
+    """
+    Args:
+        module: A module returned by getBackend()
+    Returns:
+        bool: True if the module is libsumo
+    """
+    return module is not _traci
+
+
+class SumoBackend:
+    """
+    Passes every attribute (e.g. traci.vehicle, traci.simulationStep) through to whichever of the traci or libsumo
+    modules is currently selected, so that it can be used in place of the traci module
+    """
+
+    def __init__(self):
+        self._module = _traci
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def selectBackend(self, libsumo):
+        """
+        Selects which module the simulation is controlled through, this must be done before the simulation is started.
+        Only the simulation of the default context (the module variables) is controlled through the selected module, a
+        simulation with its own context holds its own module or connection (see getBackend())
+
+        Args:
+            libsumo (bool): True if libsumo should be used, False if TraCI should be used
+        Returns:
+            bool: True if libsumo is being used (False if libsumo was selected but isn't installed)
+        """
+        self._module = getBackend(libsumo)
+
+        return self.usingLibsumo()
+
+    def usingLibsumo(self):
+        """
+        Returns:
+            bool: True if libsumo is currently selected
+        """
+        return isLibsumo(self._module)
+
+
+# Used in place of the traci module
+traci = SumoBackend()
@@ -29,15 +29,17 @@ if not COMPUTER:
     # This sets the environment variable 'SUMO_HOME'
     os.environ["SUMO_HOME"] = "/Users/jonathan/Documents/comp3200/sumo"
 
-import traci
+from src.code.SumoBackend import traci, getBackend, isLibsumo
 import sumolib
 import datetime
 
-import src.code.Testing
 from src.code import RoutingAlgorithms as routing
 from src.code import InitialMapHelperFunctions as initialFunc
 from src.code import Database as db
-from src.code import SimulationFunctions as sim
+from src.code import RoutingFunctions as func
+from src.code import NetReader as netReader
+from src.code import ResultsExport as export
+from src.code.SimulationContext import getContext, defaultContext
 
 ########################
 # USER-DEFINED OPTIONS #
@@ -57,9 +59,30 @@ PRINT_REROUTE_PERIOD = True
 SNAP_TO_CONGESTION = False
 # If tests are automated, select as True
 AUTOMATED_TESTING = False
+# If the states of the road network (e.g. congestion levels) should be retrieved in bulk through TraCI subscriptions,
+# rather than through a separate TraCI call for each road segment. Off by default, as the network-wide context
+# subscriptions were measured to be slower than the separate calls under both libsumo and TraCI
+SUBSCRIPTIONS = False
+# If the simulation should be ran within this process through libsumo, rather than through a TraCI connection to a
+# separate SUMO process. The GUI can only be used through TraCI, so this only applies when SUMO_GUI is False
+LIBSUMO = True
+# If the road network put into memory at the start of the simulation should be stored on disk (in NETWORK_CACHE_DIR),
+# so that later simulations of the same scenario load it rather than building it again through TraCI
+NETWORK_CACHE = True
+# If the road network should be read through NetReader (reading only the parts of the net file used by the project)
+# rather than through sumolib
+FAST_NET_READER = True
+# If the results of the simulation should be written to the database by a separate thread, so that the simulation
+# doesn't wait for each rerouting period's results to be committed (test cases always write as the results are given)
+BACKGROUND_DATABASE_WRITES = True
+# If the results of each simulation (its database tables and trip information) should be exported as columnar files
+# (in EXPORT_DIR) once the simulation has finished, for quick analysis of batches of simulations (see ResultsExport)
+EXPORT_RESULTS = True
 
 # This is the unique reference for the simulation in progress
 SIMULATION_REFERENCE = ""
+# The label of the TraCI connection to SUMO, allowing multiple simulations to each have their own connection
+CONNECTION_LABEL = "default"
 
 # Specifies the scenario (map)
 #   0: Testing (small_manhattan)
@@ -70,6 +93,7 @@ SIMULATION_REFERENCE = ""
 #   5: Luton
 #   6: Bristol
 #   7: Bournemouth
+#   8: Testing (small_southampton)
 SCENARIO = 4
 # Specifies the rerouting algorithm to be ran
 #   0: No rerouting
@@ -77,6 +101,7 @@ SCENARIO = 4
 #   2: k-Shortest Path
 #   3: Dynamic Rerouting with Fairness
 #   4: k-Shortest Path with fairness
+#   5: Via-node alternative routes (k-Shortest Path choosing between alternatives found in-process from two searches)
 ALGORITHM = 4
 # Whether or not to calculate the A* distances for this map
 A_STAR_DISTANCES = True
@@ -178,6 +203,8 @@ if COMPUTER:
         OUTPUT_DIRECTORY = "D:/Users/Jonathan/Desktop/Work/sumo/sumo_output/"
         DATABASE_LOCATION = "D:/Users/Jonathan/Desktop/Work/sumo/database/output_database.sqlite"
         DATABASE_DIR = "D:/Users/Jonathan/Desktop/Work/sumo/database/"
+        NETWORK_CACHE_DIR = "D:/Users/Jonathan/Desktop/Work/sumo/network_cache/"
+        EXPORT_DIR = "D:/Users/Jonathan/Desktop/Work/sumo/exported_results/"
     else:
         MAIN_PROJECT = 'D:/Nina/Dropbox/UNIVERSITY/YEAR 3/COMP3200 - 3rd Year Individual Project/' \
                        'ReroutingWithFairness/src/configuration_files/'
@@ -188,6 +215,8 @@ if COMPUTER:
         OUTPUT_DIRECTORY = "D:/Nina/Desktop/new_sumo/sumo_output/"
         DATABASE_LOCATION = "D:/Nina/Desktop/new_sumo/database/output_database.sqlite"
         DATABASE_DIR = "D:/Nina/Desktop/new_sumo/database/"
+        NETWORK_CACHE_DIR = "D:/Nina/Desktop/new_sumo/network_cache/"
+        EXPORT_DIR = "D:/Nina/Desktop/new_sumo/exported_results/"
 else:
     MAIN_PROJECT = "/Users/jonathan/Documents/comp3200/ReroutingWithFairness/src/configuration_files/"
     if SUMO_GUI:
@@ -197,6 +226,8 @@ else:
     OUTPUT_DIRECTORY = "/Users/jonathan/Documents/comp3200/sumo_output/"
     DATABASE_LOCATION = "/Users/jonathan/Documents/comp3200/database/output_database.sqlite"
     DATABASE_DIR = "/Users/jonathan/Documents/comp3200/database/"
+    NETWORK_CACHE_DIR = "/Users/jonathan/Documents/comp3200/network_cache/"
+    EXPORT_DIR = "/Users/jonathan/Documents/comp3200/exported_results/"
 
 # SUMO Configuration files
 SM_CONFIG = MAIN_PROJECT + "small_manhattan/normal/small_manhattan_config.cfg"
@@ -220,38 +251,90 @@ BRISTOL_DIRECTORY = MAIN_PROJECT + 'new_stuff/bristol/'
 NET_FILE_BOURNEMOUTH = MAIN_PROJECT + "new_stuff/bournemouth/bournemouth.net.xml"
 BOURNEMOUTH_DIRECTORY = MAIN_PROJECT + 'new_stuff/bournemouth/'
 
-try:
-    # Small manhattan
-    if SCENARIO == 0 or SCENARIO == 1:
-        # Passes the network file into sumolib for analysis and use
-        net = sumolib.net.readNet(NET_FILE_SM)
-    # Newark
-    elif SCENARIO == 2 or SCENARIO == 3:
-        net = sumolib.net.readNet(NET_FILE_NEWARK)
-    elif SCENARIO == 4:
-        net = sumolib.net.readNet(NET_FILE_SOUTHAMPTON)
+NET_FILE_SMALL_SOUTHAMPTON = MAIN_PROJECT + "testing_configs/small_southampton/small_southampton.net.xml"
+SMALL_SOUTHAMPTON_DIRECTORY = MAIN_PROJECT + 'testing_configs/small_southampton/'
+
+# The net file of each SCENARIO
+NET_FILES = {0: NET_FILE_SM,
+             1: NET_FILE_SM,
+             2: NET_FILE_NEWARK,
+             3: NET_FILE_NEWARK,
+             4: NET_FILE_SOUTHAMPTON,
+             5: NET_FILE_LUTON,
+             6: NET_FILE_BRISTOL,
+             7: NET_FILE_BOURNEMOUTH,
+             8: NET_FILE_SMALL_SOUTHAMPTON}
+
+
+def loadScenario(scenario):
+    """
+    Selects the scenario (map), whose road network is read once used, and sets the scenario specific locations
+
+    Args:
+        scenario (int): The SCENARIO to be loaded
+    """
+    global SCENARIO, SCENARIO_DIRECTORY, POLYFILE_LOCATION, SCENARIO_NAME
+    SCENARIO = scenario
+
+    if SCENARIO not in NET_FILES:
+        sys.exit("Please enter a valid SCENARIO number")
+
+    # The road network of the previous scenario is discarded, the new one only being read once used (see __getattr__)
+    globals().pop('net', None)
+
+    if SCENARIO == 4:
         SCENARIO_DIRECTORY = SOUTHAMPTON_DIRECTORY
         POLYFILE_LOCATION = SOUTHAMPTON_DIRECTORY + 'southampton.poly.xml'
         SCENARIO_NAME = 'southampton'
     elif SCENARIO == 5:
-        net = sumolib.net.readNet(NET_FILE_LUTON)
         SCENARIO_DIRECTORY = LUTON_DIRECTORY
         POLYFILE_LOCATION = LUTON_DIRECTORY + 'luton.poly.xml'
         SCENARIO_NAME = 'luton'
     elif SCENARIO == 6:
-        net = sumolib.net.readNet(NET_FILE_BRISTOL)
         SCENARIO_DIRECTORY = BRISTOL_DIRECTORY
         POLYFILE_LOCATION = BRISTOL_DIRECTORY + 'bristol.poly.xml'
         SCENARIO_NAME = 'bristol'
     elif SCENARIO == 7:
-        net = sumolib.net.readNet(NET_FILE_BOURNEMOUTH)
         SCENARIO_DIRECTORY = BOURNEMOUTH_DIRECTORY
         POLYFILE_LOCATION = BOURNEMOUTH_DIRECTORY + 'bournemouth.poly.xml'
         SCENARIO_NAME = 'bournemouth'
-    else:
-        sys.exit("Please enter a valid SCENARIO number")
-except TypeError:
-    sys.exit("Ensure that you have the COMPUTER boolean set correctly, currently {}".format(COMPUTER))
+    elif SCENARIO == 8:
+        SCENARIO_DIRECTORY = SMALL_SOUTHAMPTON_DIRECTORY
+        # No polyfile exists for this scenario
+        POLYFILE_LOCATION = ''
+        SCENARIO_NAME = 'small_southampton'
+
+
+def loadNet():
+    """
+    Reads the road network of the current SCENARIO, through NetReader if FAST_NET_READER is enabled and otherwise
+    through sumolib
+
+    Returns:
+        The road network (as given by sumolib.net.readNet())
+    """
+    try:
+        if FAST_NET_READER:
+            return netReader.readNet(NET_FILES[SCENARIO])
+        return sumolib.net.readNet(NET_FILES[SCENARIO])
+    except (TypeError, OSError):
+        sys.exit("Ensure that you have the COMPUTER boolean set correctly, currently {}".format(COMPUTER))
+
+
+def __getattr__(name):
+    """
+    Reads the road network (net) the first time it is used rather than when this module is imported, as every other
+    module imports this module but many (e.g. the analysis scripts) never use the road network. When the road network
+    put into memory is loaded from the cache (see NETWORK_CACHE), the net file need not be read at all.
+    """
+    if name == 'net':
+        global net
+        net = loadNet()
+        return net
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+loadScenario(SCENARIO)
 
 
 class Main:
@@ -270,7 +353,7 @@ class Main:
         return int(traci.simulation.getCurrentTime() / 1000)
 
     @staticmethod
-    def configureSumo(sumoConfig):
+    def configureSumo(sumoConfig, algorithm=None):
         """
         This allows for the configuration of SUMO to be done based on the scenario picked and additional options
         selected
@@ -278,12 +361,16 @@ class Main:
         Args:
             sumoConfig (str[]): This is the initial list of global arguments shared by all scenarios and any additional
              options
+            algorithm (int): The rerouting algorithm of the simulation, by default ALGORITHM
         Return:
             str[]: The new configuration of SUMO based upon the options selected
         """
+        if algorithm is None:
+            algorithm = ALGORITHM
+
         # Input validation
-        if (SCENARIO == 1 or SCENARIO == 2 or SCENARIO == 4 or SCENARIO == 5 or SCENARIO == 6 or SCENARIO == 7) \
-                and not (0 <= ALGORITHM <= 4):
+        if (SCENARIO == 1 or SCENARIO == 2 or SCENARIO == 4 or SCENARIO == 5 or SCENARIO == 6 or SCENARIO == 7 or
+                SCENARIO == 8) and not (0 <= algorithm <= 5):
             sys.exit("Please enter a valid ALGORITHM number.")
 
         # Current date-time
@@ -299,7 +386,7 @@ class Main:
         tripInfo = OUTPUT_DIRECTORY + '{}/trips_info/trip_info_{}.xml'
 
         # Choosing the scenario
-        if SCENARIO == 4 or SCENARIO == 5 or SCENARIO == 6 or SCENARIO == 7:
+        if SCENARIO == 4 or SCENARIO == 5 or SCENARIO == 6 or SCENARIO == 7 or SCENARIO == 8:
             sumoConfig.insert(1, '--net-file')
         else:
             sumoConfig.insert(1, "-c")
@@ -484,9 +571,31 @@ class Main:
                     sumoConfig.append("--tripinfo-output")
                     sumoConfig.append(tripInfo.format('bournemouth', windowsDateTime))
 
+        # Small southampton test
+        elif SCENARIO == 8:
+            sumoConfig.insert(2, NET_FILE_SMALL_SOUTHAMPTON)
+
+            # Outputs
+            if OUTPUTS:
+                if SUMMARY_OUTPUT:
+                    sumoConfig.append("--summary")
+                    sumoConfig.append(summaryOut.format('small_southampton', windowsDateTime))
+                if VEHICLE_FULL_OUTPUT:
+                    sumoConfig.append("--full-output")
+                    sumoConfig.append(vehicleFullOut.format('small_southampton', windowsDateTime))
+                if VTK_OUTPUT:
+                    sumoConfig.append("--vtk-output")
+                    sumoConfig.append(vtkOut.format('small_southampton', windowsDateTime))
+                if FLOATING_CAR_DATA_OUTPUT:
+                    sumoConfig.append("--fcd-output")
+                    sumoConfig.append(floatingCarData.format('small_southampton', windowsDateTime))
+                if TRIPS_OUTPUT:
+                    sumoConfig.append("--tripinfo-output")
+                    sumoConfig.append(tripInfo.format('small_southampton', windowsDateTime))
+
         return sumoConfig
 
-    def run(self, testCase=False, instantStart=False, quitOnEnd=False, routeFile="", functionName=""):
+    def run(self, testCase=False, instantStart=False, quitOnEnd=False, routeFile="", functionName="", context=None):
         """
         Starts the simulation and Traci
 
@@ -496,6 +605,10 @@ class Main:
             quitOnEnd (bool): True if the GUI should quit at the end of the simulation
             routeFile (str): The route file to use for execution
             functionName (str): This is the name of the function which called the main method
+            context (SimulationContext): The simulation's state and settings (e.g. its algorithm), by default the
+                module variables
+        Returns:
+            SimulationContext: The simulation's state once it has finished
         """
 
         """
@@ -522,7 +635,7 @@ class Main:
                              '-W', 'true']
 
         # If the polyfile should be loaded into the simulation (if the simulation should be given colour).
-        if POLYFILE and SUMO_GUI:
+        if POLYFILE and SUMO_GUI and POLYFILE_LOCATION:
             sumoConfigInitial.extend(['--additional-files', '{vehicles_file},{polyfile}'.
                                      format(vehicles_file=VEHICLES_FILE, polyfile=POLYFILE_LOCATION)])
         else:
@@ -538,42 +651,61 @@ class Main:
         if routeFile != "":
             sumoConfigInitial.extend(['-r', routeFile])
 
-        sumoConfig = self.configureSumo(sumoConfigInitial)
+        context = getContext(context)
+        label = context.label or CONNECTION_LABEL
+
+        sumoConfig = self.configureSumo(sumoConfigInitial, context.algorithm)
 
-        traci.start(sumoConfig)
+        # The GUI is only available through TraCI
+        useLibsumo = LIBSUMO and not SUMO_GUI
+        if context.isDefault():
+            traci.selectBackend(useLibsumo)
+            traci.start(sumoConfig, label=label)
+        else:
+            # A simulation with its own context is controlled through its own connection rather than whichever
+            # connection was started last (libsumo only ever has a single connection), leaving the backend selected
+            # for the module variables untouched
+            backend = getBackend(useLibsumo)
+            backend.start(sumoConfig, label=label)
+            context.traci = backend if isLibsumo(backend) else backend.getConnection(label)
 
         # Initialising the database
-        database = db.Database()
+        database = db.Database(backgroundWriter=BACKGROUND_DATABASE_WRITES and not testCase,
+                               location=context.databaseLocation)
 
-        test = src.code.Testing.Testing()
-        reroutingAlgorithm = routing.ReroutingAlgorithms()
+        reroutingAlgorithm = routing.ReroutingAlgorithms(context)
         # Initialise data regarding the map into memory for quick real-time access
-        initialFunc.initialisation(database)
+        initialFunc.initialisation(database, context)
 
         algorithm = ''
-        if ALGORITHM == 0:
+        if context.algorithm == 0:
             algorithm = 'No Rerouting'
-        elif ALGORITHM == 1:
+        elif context.algorithm == 1:
             algorithm = 'Dynamic Shortest Path'
-        elif ALGORITHM == 2:
+        elif context.algorithm == 2:
             algorithm = 'k-Shortest Paths'
-        elif ALGORITHM == 3:
+        elif context.algorithm == 3:
             algorithm = 'Dynamic Shortest Path with Fairness'
-        elif ALGORITHM == 4:
+        elif context.algorithm == 4:
             algorithm = 'k-Shortest Paths with Fairness'
+        elif context.algorithm == 5:
+            algorithm = 'Via-Node Alternative Routes'
 
         print("Running with algorithm {}.".format(algorithm))
 
         if SCENARIO == 0 or SCENARIO == 3:
+            # Only imported when testing, as it isn't needed by any other scenario
+            from src.code import Testing as testing
+            test = testing.Testing()
             test.beforeLoop(functionName)
 
             for i in range(START_TIME, END_TIME):
                 test.duringLoop(i+1)
         else:
             # No rerouting
-            if ALGORITHM == 0:
+            if context.algorithm == 0:
                 for i in range(START_TIME, END_TIME):
-                    traci.simulationStep()
+                    context.traci.simulationStep()
             else:
                 for i in range(START_TIME, END_TIME):
                     reroutingAlgorithm.main(i+1, database)
@@ -581,74 +713,43 @@ class Main:
         # If not running test cases close when the END_TIME is reached
         if not testCase:
             # Close the Sumo-Traci connection once the simulation has elapsed
-            traci.close()
+            context.traci.close()
+            database.closeDB()
+
+            # The trip information is only complete once SUMO has closed. Simulations without a reference (those not
+            # ran as part of a batch) aren't exported
+            if EXPORT_RESULTS and context.simulationReference:
+                tripInfoLocation = None
+                if '--tripinfo-output' in sumoConfig:
+                    tripInfoLocation = sumoConfig[sumoConfig.index('--tripinfo-output') + 1]
+                export.exportRun(context.databaseLocation, context.simulationReference, tripInfoLocation)
+
+        return context
 
 
-def createSim(routeFile, instantStart=True, quitOnEnd=True):
+def createSim(routeFile, instantStart=True, quitOnEnd=True, context=None):
+    """
+    Runs a single simulation of the current SCENARIO
+
+    Args:
+        routeFile (str): The route file, within SCENARIO_DIRECTORY
+        instantStart (bool): True if the simulation is required to be instantly started
+        quitOnEnd (bool): True if the GUI should quit at the end of the simulation
+        context (SimulationContext): The simulation's state, by default the module variables
+    Returns:
+        SimulationContext: The simulation's state once it has finished
+    """
     main = Main()
     routeFileLocation = "{}{}".format(SCENARIO_DIRECTORY, routeFile)
-    main.run(routeFile=routeFileLocation,
-             instantStart=instantStart, quitOnEnd=quitOnEnd)
+    return main.run(routeFile=routeFileLocation, instantStart=instantStart, quitOnEnd=quitOnEnd, context=context)
 
 
 def resetSimVariables():
     """
     Ensuring reset of simulation variables (as if by running for the first time)
     """
-    # if func.cumulativeExtraTime:
-    func.cumulativeExtraTime = {}
-    func.vehicleReroutedAmount = {}
-    # if func.reroutedVehicles:
-    func.reroutedVehicles = set()
-    # if func.edgeSpeedGlobal:
-    func.edgeSpeedGlobal = {}
-    # if func.adjustedEdgeSpeedGlobal:
-    func.adjustedEdgeSpeedGlobal = {}
-    func.periodSinceLastRerouted = {}
-
-    # if sim.stoppedStateLastPeriod:
-    sim.stoppedStateLastPeriod = {}
-    # if sim.timeSpentInNetwork:
-    sim.timeSpentInNetwork = {}
-    # if sim.timeSpentStopped:
-    sim.timeSpentStopped = {}
-    # if sim.initialTimeSpentInNetwork:
-    sim.initialTimeSpentInNetwork = {}
-    # if sim.arrivalTime:
-    sim.arrivalTime = {}
-    # if sim.departureTime:
-    sim.departureTime = {}
-    # if sim.vehiclesInNetwork:
-    sim.vehiclesInNetwork = []
-    # if sim.roadCongestion:
-    sim.roadCongestion = {}
-    # if sim.timeTaken:
-    sim.timeTaken = []
-
-    # if initialFunc.edgesNetwork:
-    initialFunc.edgesNetwork = {}
-    # if initialFunc.lanesNetwork:
-    initialFunc.lanesNetwork = {}
-    # if initialFunc.fringeEdges:
-    initialFunc.fringeEdges = set()
-    # if initialFunc.laneLengths:
-    initialFunc.laneLengths = {}
-    # if initialFunc.edgeLengths:
-    initialFunc.edgeLengths = {}
-    # if initialFunc.directedGraphLanes:
-    initialFunc.directedGraphLanes = {}
-    # if initialFunc.directedGraphEdges:
-    initialFunc.directedGraphEdges = {}
-    # if initialFunc.singleOutgoingEdges:
-    initialFunc.singleOutgoingEdges = set()
-    # if initialFunc.reroutingLanes:
-    initialFunc.reroutingLanes = set()
-    # if initialFunc.multiIncomingEdges:
-    initialFunc.multiIncomingEdges = {}
-    # if initialFunc.freeFlowSpeed:
-    initialFunc.freeFlowSpeed = {}
-    # # if initialFunc.database_pointer:
-    # initialFunc.database_pointer = None
+    defaultContext.resetSimulationState()
+    defaultContext.resetNetworkState()
 
 
 def createSimLoopWithkPathArguments(simulationReference, databaseReference, kMax, kPathMaxAllowedTime, loopNumber=10):
@@ -670,122 +771,22 @@ def createSimLoopWithkPathArguments(simulationReference, databaseReference, kMax
         routeFile = 'routes_{}_testing_{}.xml'.format(SCENARIO_NAME, i + 1)
         createSim(routeFile)
 
-        time.sleep(10)
         resetSimVariables()
 
-    time.sleep(60)
-
 
 if __name__ == '__main__':
     """
     The main method for all running
     """
     import src.code.SumoConnection as sumo
-    import time
-    import src.code.RoutingFunctions as func
+    from src.code import BatchRunner as batch
 
     if sumo.AUTOMATED_TESTING:
+        # kPaths with fairness, kPaths, DSP and no rerouting, each over 40 route files, ran across all cores
+        chains = batch.createJobs([sumo.SCENARIO], [4, 2, 1, 0], 40)
 
-        ########################
-        # kPaths With Fairness #
-        ########################
-
-
-        sumo.ALGORITHM = 4
-
-        sumo.DATABASE_LOCATION = "{location}{reference}.sqlite".format(location=sumo.DATABASE_DIR,
-                                                                       reference='{}_2_hours_fairness'.
-                                                                       format(sumo.SCENARIO_NAME))
-
-        for i in range(40):
-            sumo.SIMULATION_REFERENCE = "{reference}_{simNum}_".format(reference='{}_2_hours_fairness'.
-                                                                       format(sumo.SCENARIO_NAME), simNum=(i+1))
-
-            print('########################')
-            print('Simulation reference: {}'.format('{}_2_hours_fairness'.format(sumo.SCENARIO_NAME)))
-            print('Loop {} out of {}'.format(i+1, 40))
-            print('########################')
-
-            routeFile = 'routes_{}_2hours_{}.xml'.format(SCENARIO_NAME, i + 1)
-            createSim(routeFile)
-
-            time.sleep(30)
-            resetSimVariables()
-
-        ##########
-        # kPaths #
-        ##########
-
-        sumo.ALGORITHM = 2
-
-        sumo.DATABASE_LOCATION = "{location}{reference}.sqlite".format(location=sumo.DATABASE_DIR,
-                                                                       reference='{}_2_hours_kPaths'.
-                                                                       format(sumo.SCENARIO_NAME))
-
-        for i in range(40):
-            sumo.SIMULATION_REFERENCE = "{reference}_{simNum}_".format(reference='{}_2_hours_kPaths'.
-                                                                       format(sumo.SCENARIO_NAME), simNum=(i+1))
-
-            print('########################')
-            print('Simulation reference: {}'.format('{}_2_hours_kPaths'.format(sumo.SCENARIO_NAME)))
-            print('Loop {} out of {}'.format(i+1, 40))
-            print('########################')
-
-            routeFile = 'routes_{}_2hours_{}.xml'.format(SCENARIO_NAME, i + 1)
-            createSim(routeFile)
-
-            time.sleep(30)
-            resetSimVariables()
-
-        #######
-        # DSP #
-        #######
-
-        sumo.ALGORITHM = 1
-
-        sumo.DATABASE_LOCATION = "{location}{reference}.sqlite".format(location=sumo.DATABASE_DIR,
-                                                                       reference='{}_2_hours_DSP'.
-                                                                       format(sumo.SCENARIO_NAME))
-
-        for i in range(40):
-            sumo.SIMULATION_REFERENCE = "{reference}_{simNum}_".format(reference='{}_2_hours_DSP'.
-                                                                       format(sumo.SCENARIO_NAME), simNum=(i+1))
-
-            print('########################')
-            print('Simulation reference: {}'.format('{}_2_hours_DSP'.format(sumo.SCENARIO_NAME)))
-            print('Loop {} out of {}'.format(i+1, 40))
-            print('########################')
-
-            routeFile = 'routes_{}_2hours_{}.xml'.format(SCENARIO_NAME, i + 1)
-            createSim(routeFile)
-
-            time.sleep(30)
-            resetSimVariables()
-
-        ################
-        # No Rerouting #
-        ################
-
-        sumo.ALGORITHM = 0
-
-        sumo.DATABASE_LOCATION = "{location}{reference}.sqlite".format(location=sumo.DATABASE_DIR,
-                                                                       reference='{}_2_hours_noRerouting'.
-                                                                       format(sumo.SCENARIO_NAME))
-
-        for i in range(40):
-            sumo.SIMULATION_REFERENCE = "{reference}_{simNum}_".format(reference='{}_2_hours_noRerouting'.
-                                                                       format(sumo.SCENARIO_NAME), simNum=(i + 1))
-
-            print('########################')
-            print('Simulation reference: {}'.format('{}_2_hours_noRerouting'.format(sumo.SCENARIO_NAME)))
-            print('Loop {} out of {}'.format(i + 1, 40))
-            print('########################')
-
-            routeFile = 'routes_{}_2hours_{}.xml'.format(SCENARIO_NAME, i + 1)
-            createSim(routeFile)
-
-            time.sleep(30)
-            resetSimVariables()
+        for simulationReference, timeTaken in sorted(batch.runBatch(chains)):
+            print('Simulation {} took {} seconds'.format(simulationReference, timeTaken))
     else:
         routeFile = 'routes_{}_2hours_1.xml'.format(SCENARIO_NAME)
         createSim(routeFile, instantStart=False, quitOnEnd=False)
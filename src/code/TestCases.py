@@ -19,11 +19,15 @@ if not sumo.COMPUTER:
     os.environ["SUMO_HOME"] = "/Users/jonathan/Documents/comp3200/sumo"
 
 import random
+import shutil
+import sqlite3
+import tempfile
 import unittest
 import warnings
 import sumolib
 import sys
-import traci
+from src.code.SumoBackend import traci
+import numpy as np
 from copy import deepcopy
 
 import src.code.RoutingFunctions
@@ -32,6 +36,20 @@ from src.code import Testing as testing
 from src.code import InitialMapHelperFunctions as initialFunc
 from src.code import SimulationFunctions as sim
 from src.code import Database as db
+from src.code import PathFinding as pathFinding
+from src.code import EdgeWeights as weights
+from src.code import BatchRunner as batch
+from src.code import SimulationContext as simContext
+from src.code import NetworkCache as cache
+from src.code.IncomingEdges import IncomingEdgeIndex
+from src.code.ContractionHierarchy import ContractionHierarchy
+from src.code import Landmarks as landmarks
+from src.code.Landmarks import LandmarkDistances
+from src.code.RouteCache import RouteCache
+from src.code.RouteIndex import RouteIndex
+from src.code import NetReader as netReader
+from src.code import ResultsExport as export
+from src.code import Vehicles as vehicleState
 
 #############
 # CONSTANTS #
@@ -61,8 +79,7 @@ class SmallSouthamptonTestsRoute(unittest.TestCase):
 
     def tearDown(self):
         traci.close(False)
-        with self.assertRaises(SystemExit):
-            initialFunc.endSim(0)
+        initialFunc.endSim(0)
         del self.main
         # time.sleep(2)
 
@@ -220,8 +237,7 @@ class DatabaseTests(unittest.TestCase):
         """
         Closes the traci connection once used
         """
-        with self.assertRaises(SystemExit):
-            initialFunc.endSim(0)
+        initialFunc.endSim(0)
         del self.mainMethod
 
     def test_smallManhattan_vehicleReroutingAmount(self):
@@ -499,8 +515,7 @@ class DatabaseTests(unittest.TestCase):
         database = db.Database()
         database.clearTable(db.VEHICLE_OUTPUT_TABLE)
 
-        with self.assertRaises(SystemExit):
-            initialFunc.endSim(0, database=True, closeDB=False)
+        initialFunc.endSim(0, database=True, closeDB=False)
 
         # Should be only a single tuple in the table
         self.assertEqual(len(database.getDBTableContents(db.VEHICLE_OUTPUT_TABLE)), 1)
@@ -925,8 +940,7 @@ class SmallSouthamptonTests(unittest.TestCase):
         Closes the traci connection once used
         """
         traci.close(False)
-        with self.assertRaises(SystemExit):
-            initialFunc.endSim(0)
+        initialFunc.endSim(0)
         del self.mainMethod
         # time.sleep(2)
 
@@ -1068,7 +1082,7 @@ class SmallSouthamptonTests(unittest.TestCase):
 
     def test_smallManhattan_multiIncomingRecursion_4Recursions(self):
         """
-        Tests that multiIncomingRecursion (and consequently recursiveIncomingEdges) returns the correct edges list when
+        Tests that getMultiIncomingEdges (and consequently IncomingEdgeIndex) returns the correct edges list when
         number of recursions (MAX_EDGE_RECURSIONS_RANGE) is equal to 2
         """
         src.code.RoutingFunctions.MAX_EDGE_RECURSIONS_RANGE = 4
@@ -1080,7 +1094,7 @@ class SmallSouthamptonTests(unittest.TestCase):
 
     def test_smallManhattan_multiIncomingRecursion_3Recursions(self):
         """
-        Tests that multiIncomingRecursion (and consequently recursiveIncomingEdges) returns the correct edges list when
+        Tests that getMultiIncomingEdges (and consequently IncomingEdgeIndex) returns the correct edges list when
         number of recursions (MAX_EDGE_RECURSIONS_RANGE) is equal to 3
         """
         src.code.RoutingFunctions.MAX_EDGE_RECURSIONS_RANGE = 3
@@ -1091,7 +1105,7 @@ class SmallSouthamptonTests(unittest.TestCase):
 
     def test_smallManhattan_multiIncomingRecursion_2Recursions(self):
         """
-        Tests that multiIncomingRecursion (and consequently recursiveIncomingEdges) returns the correct edges list when
+        Tests that getMultiIncomingEdges (and consequently IncomingEdgeIndex) returns the correct edges list when
         number of recursions (MAX_EDGE_RECURSIONS_RANGE) is equal to 2
         """
         src.code.RoutingFunctions.MAX_EDGE_RECURSIONS_RANGE = 2
@@ -1443,15 +1457,16 @@ class SmallSouthamptonTests(unittest.TestCase):
 
     def test_smallManhattan_endSim(self):
         """
-        Checks that the simulation has been successfully ended if endSim() is manually called
+        Checks that the simulation has been successfully ended if endSim() is manually called, returning rather than
+        exiting the programme
 
-        :return: True if SystemExit is raised when endSim() is called
+        :return: True if the time at which the simulation ended is recorded
         """
-        with self.assertRaises(SystemExit):
-            for i in range(sumo.END_TIME):
-                traci.simulationStep()
-                if i == 20:
-                    initialFunc.endSim(i)
+        for i in range(21):
+            traci.simulationStep()
+        initialFunc.endSim(20)
+
+        self.assertGreater(sumo.timerEnd, sumo.timerStart)
 
     def test_smallManhattan_rerouteSelectedVehicles_lane_noVehiclesSelectedAsTurnOffWrong(self):
         """
@@ -2083,6 +2098,62 @@ class SmallSouthamptonTests(unittest.TestCase):
         initialFunc.initialisation(database)
         self.assertEqual(initialFunc.multiIncomingEdges[targetEdge], expectedOutput)
 
+    def test_smallManhattan_getRoadCongestionSnapshot(self):
+        """
+        Checks that the occupancy retrieved through the subscriptions matches the occupancy given directly by TraCI for
+        each of the subscribed lanes and edges
+        """
+        testing.Testing().setupGenericCarSM()
+        sim.initialiseRoadCongestionSubscriptions()
+
+        for i in range(10):
+            traci.simulationStep()
+
+        # Results are only given for the timestep after subscribing
+        sim.subscribeRoadCongestion()
+        traci.simulationStep()
+
+        laneOccupancy, edgeOccupancy = sim.getRoadCongestionSnapshot()
+
+        self.assertEqual(len(laneOccupancy), len(initialFunc.reroutingLanes))
+        self.assertEqual(len(edgeOccupancy), len(initialFunc.singleOutgoingEdges))
+
+        for lane, occupancy in zip(sim.subscribedLanes, laneOccupancy):
+            self.assertEqual(occupancy, sim.returnCongestionLevelLane(lane))
+        for edge, occupancy in zip(sim.subscribedEdges, edgeOccupancy):
+            self.assertEqual(occupancy, sim.returnCongestionLevelEdge(edge))
+
+    def test_smallManhattan_createVehicleSnapshot(self):
+        """
+        Checks that the vehicles on each edge and the stopped state of each vehicle, retrieved through the
+        subscriptions, and the routes retrieved when needed match those given directly by TraCI, and that rerouted
+        vehicles have their route updated
+        """
+        testing.Testing().setupGenericCarSM(zoom=False)
+        for i in range(20): traci.simulationStep()
+        testing.Testing().setupGenericCarSM("testVeh2", zoom=False, routeName="testVeh2Route")
+        sim.initialiseRoadCongestionSubscriptions()
+
+        for i in range(10):
+            traci.simulationStep()
+
+        sim.subscribeRoadCongestion()
+        traci.simulationStep()
+
+        vehicleSnapshot = sim.createVehicleSnapshot()
+
+        # Only the stopped states are subscribed to for every vehicle
+        self.assertEqual({}, vehicleSnapshot.routes)
+        for vehicle in traci.vehicle.getIDList():
+            self.assertIn(vehicle, vehicleSnapshot.stopStates)
+            self.assertEqual(vehicleSnapshot.getRoute(vehicle), traci.vehicle.getRoute(vehicle))
+            self.assertEqual(vehicleSnapshot.isStopped(vehicle), traci.vehicle.isStopped(vehicle))
+        for edge in initialFunc.edgesNetwork:
+            self.assertEqual(vehicleSnapshot.getEdgeVehicles(edge), traci.edge.getLastStepVehicleIDs(edge))
+
+        vehicleSnapshot.updateRoute('testVeh', ['edge1', 'edge2'])
+        self.assertEqual(vehicleSnapshot.getRoute('testVeh'), ('edge1', 'edge2'))
+
     def test_calculateAverageRoadCongestion(self):
         """
         Ensures that the calculateAverageRoadCongestion() function works
@@ -2098,5 +2169,729 @@ class SmallSouthamptonTests(unittest.TestCase):
 
         self.assertEqual(manualCalculation, functionCalculation)
 
+
+class SmallSouthamptonSimulationTests(unittest.TestCase):
+    """
+    Tests which run whole simulations of the 'Small southampton' scenario without the GUI, each with its own context.
+    These only need SUMO and the scenario (not the database being tested), so are skipped only when either is missing.
+    """
+
+    def setUp(self):
+        """
+        Ensures that the scenario is that of 'Small southampton', ran without the GUI
+        """
+        if shutil.which(sumo.SUMO_BINARY.replace('sumo-gui', 'sumo')) is None or \
+                not os.path.exists(sumo.NET_FILE_SMALL_SOUTHAMPTON):
+            raise unittest.SkipTest("Skipping simulation tests, SUMO or the 'Small southampton' scenario is missing")
+
+        self.settings = (sumo.SCENARIO, sumo.SUMO_GUI, sumo.SUMO_BINARY, sumo.END_TIME, sumo.NETWORK_CACHE)
+        sumo.loadScenario(8)
+        sumo.SUMO_GUI = False
+        sumo.SUMO_BINARY = sumo.SUMO_BINARY.replace('sumo-gui', 'sumo')
+        # The road network is built from the net file, rather than loaded from (or stored in) the cache
+        sumo.NETWORK_CACHE = False
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """
+        Restores the scenario and options altered by the test
+        """
+        scenario, sumo.SUMO_GUI, sumo.SUMO_BINARY, sumo.END_TIME, sumo.NETWORK_CACHE = self.settings
+        sumo.loadScenario(scenario)
+        self.directory.cleanup()
+
+    def runSimulation(self, algorithm):
+        """
+        Runs a simulation of the scenario's routes, with its results stored in a temporary database
+
+        Args:
+            algorithm (int): The rerouting algorithm of the simulation
+        Returns:
+            SimulationContext: The simulation's state once it has finished
+        """
+        context = simContext.SimulationContext(label=self.id(), algorithm=algorithm, simulationReference='',
+                                               databaseLocation=os.path.join(self.directory.name, 'test.sqlite'))
+        return sumo.Main().run(instantStart=True, quitOnEnd=True, routeFile=sumo.SCENARIO_DIRECTORY + 'routes.xml',
+                               functionName=self.id(), context=context)
+
+    def test_smallSouthampton_kPaths_penaltyMethodEquivalence(self):
+        """
+        Assumption that k = 3
+
+        Pass if the paths found in-process through the penalty method match those found through TraCI (each vehicle's
+        full list of paths, in order) for at least 90% of the vehicles rerouted, each of which is checked. SUMO reroutes
+        a vehicle which can no longer brake before the junction from its next edge, and breaks near ties differently, so
+        the paths of a few vehicles differ (96-99% matched when last measured)
+        """
+        sumo.END_TIME = 3600
+        options = (func.K_MAX, func.NATIVE_KPATHS, func.PENALTY_KPATHS, func.PENALTY_KPATHS_CHECK,
+                   func.PENALTY_KPATHS_CHECK_SAMPLE)
+        func.K_MAX, func.NATIVE_KPATHS, func.PENALTY_KPATHS, func.PENALTY_KPATHS_CHECK = 3, True, True, True
+        func.PENALTY_KPATHS_CHECK_SAMPLE = 1
+
+        try:
+            context = self.runSimulation(2)
+        finally:
+            (func.K_MAX, func.NATIVE_KPATHS, func.PENALTY_KPATHS, func.PENALTY_KPATHS_CHECK,
+             func.PENALTY_KPATHS_CHECK_SAMPLE) = options
+
+        matched = sum(matched for _, matched in context.penaltyPathChecks)
+
+        self.assertGreater(len(context.penaltyPathChecks), 50)
+        self.assertGreaterEqual(matched / len(context.penaltyPathChecks), 0.9)
+
+
+class StandaloneTests(unittest.TestCase):
+    """
+    Tests which run without SUMO (and without the database being tested), so are always ran
+    """
+
+    def test_edgeWeightStore(self):
+        """
+        Checks that travel times are bounded to MAX_FREE_FLOW_MULTIPLIER times their free-flow travel time, that
+        adjusting the travel time of an edge doesn't alter the unadjusted travel times, and that the snapshot of the
+        travel times is only taken again once they change
+        """
+        store = weights.EdgeWeightStore({'edge_1': 1.0, ':junction_0': 2.0})
+        store.update(np.array([100.0, 3.0]))
+
+        self.assertEqual({'edge_1': 1.0 * weights.MAX_FREE_FLOW_MULTIPLIER, ':junction_0': 3.0},
+                         store.edgeSpeedGlobal)
+
+        store.adjustedEdgeSpeedGlobal[':junction_0'] = 6.0
+        edgeSpeed = deepcopy(store.edgeSpeedGlobal)
+        store.update(np.array([4.0, 5.0]))
+
+        self.assertEqual(3.0, edgeSpeed[':junction_0'])
+        self.assertEqual(5.0, store.adjustedEdgeSpeedGlobal[':junction_0'])
+
+        # The snapshot searched through is only taken again once the travel times change
+        snapshot = store.getSnapshot()
+        self.assertEqual(dict(store.edgeSpeedGlobal), snapshot)
+        store.update(np.array([4.0, 5.0]))
+        self.assertIs(snapshot, store.getSnapshot())
+        store.update(np.array([4.0, 6.0]))
+        self.assertEqual({'edge_1': 4.0, ':junction_0': 6.0}, store.getSnapshot())
+
+    def test_edgeWeightStore_pushTravelTimes(self):
+        """
+        Checks that only those travel times which have changed by more than ADAPTED_TRAVEL_TIME_TOLERANCE are given to
+        SUMO, with the number of skipped edges being returned
+        """
+        store = weights.EdgeWeightStore({'edge_1': 10.0, 'edge_2': 10.0, 'edge_3': 10.0})
+        pushed = {}
+
+        # Every edge is given to SUMO the first time
+        self.assertEqual(0, store.pushTravelTimes(pushed.__setitem__))
+        self.assertEqual({'edge_1': 10.0, 'edge_2': 10.0, 'edge_3': 10.0}, pushed)
+
+        pushed.clear()
+        store.setPushedTravelTime('edge_3', 20.0)
+        store.update(np.array([10.0, 10.0 * (1 + weights.ADAPTED_TRAVEL_TIME_TOLERANCE * 2), 10.0]))
+
+        self.assertEqual(1, store.pushTravelTimes(pushed.__setitem__))
+        self.assertEqual({'edge_2': 10.0 * (1 + weights.ADAPTED_TRAVEL_TIME_TOLERANCE * 2), 'edge_3': 10.0}, pushed)
+
+    def test_kShortestPaths(self):
+        """
+        Checks that the k shortest paths are found in order of cost on a small graph, without looping and without
+        exceeding the best cost * maxAllowedTime
+        """
+        graph = {'a': ('b', 'c'), 'b': ('d', 'a'), 'c': ('d', 'e'), 'd': ('f',), 'e': ('f',), 'f': ()}
+        weights = {'a': 1, 'b': 2, 'c': 1, 'd': 3, 'e': 5, 'f': 1}
+
+        routes = pathFinding.kShortestPaths('a', 'f', 4, weights, graph=graph)
+
+        self.assertEqual([(6, ['a', 'c', 'd', 'f']), (7, ['a', 'b', 'd', 'f']), (8, ['a', 'c', 'e', 'f'])], routes)
+
+        # Only routes costing up to 6 * 1.2 are allowed
+        routes = pathFinding.kShortestPaths('a', 'f', 4, weights, maxAllowedTime=1.2, graph=graph)
+
+        self.assertEqual([(6, ['a', 'c', 'd', 'f']), (7, ['a', 'b', 'd', 'f'])], routes)
+        self.assertEqual([], pathFinding.kShortestPaths('f', 'a', 4, weights, graph=graph))
+
+    def test_generateShortestPaths(self):
+        """
+        Checks that routes are only searched for as they are taken, and that once the search budget runs out only the
+        routes already found are given
+        """
+        graph = {'a': ('b', 'c'), 'b': ('d', 'a'), 'c': ('d', 'e'), 'd': ('f',), 'e': ('f',), 'f': ()}
+        weights = {'a': 1, 'b': 2, 'c': 1, 'd': 3, 'e': 5, 'f': 1}
+
+        budget = pathFinding.SearchBudget(maxWork=100)
+        routes = pathFinding.generateShortestPaths('a', 'f', weights, graph=graph, budget=budget)
+
+        # The best route is given by the reverse shortest path tree, without spending the budget
+        self.assertEqual((6, ['a', 'c', 'd', 'f']), next(routes))
+        self.assertEqual(100, budget.remainingWork)
+        self.assertEqual((7, ['a', 'b', 'd', 'f']), next(routes))
+        self.assertLess(budget.remainingWork, 100)
+        self.assertEqual([(8, ['a', 'c', 'e', 'f'])], list(routes))
+
+        # Without enough budget to find the next route, the best route is given alone
+        budget = pathFinding.SearchBudget(maxWork=2)
+        routes = pathFinding.kShortestPaths('a', 'f', 4, weights, graph=graph, budget=budget)
+
+        self.assertEqual([(6, ['a', 'c', 'd', 'f'])], routes)
+        self.assertTrue(budget.exhausted)
+
+        budget = pathFinding.SearchBudget(maxWork=2)
+        routes = pathFinding.penalisedPaths('a', 'f', 4, weights, 2, graph=graph, budget=budget)
+
+        self.assertEqual([(6, ['a', 'c', 'd', 'f'])], routes)
+
+    def test_penalisedPaths(self):
+        """
+        Checks that each route found through the penalty method is the best route once the edges of the previous route
+        are penalised, stopping once a route is found again or exceeds the best cost * maxAllowedTime, without the
+        weights themselves being penalised
+        """
+        graph = {'a': ('b', 'c'), 'b': ('d',), 'c': ('d', 'e'), 'd': ('f',), 'e': ('f',), 'f': ()}
+        weights = {'a': 1, 'b': 2, 'c': 1, 'd': 3, 'e': 5, 'f': 1}
+        originalWeights = dict(weights)
+
+        # Once 'a', 'c', 'd' and 'f' are doubled, 'a' -> 'c' -> 'e' -> 'f' costs the least (11), then once 'a', 'c',
+        # 'e' and 'f' are doubled again, 'a' -> 'b' -> 'd' -> 'f' (16), after which 'a' -> 'c' -> 'e' -> 'f' is found
+        # again
+        routes = pathFinding.penalisedPaths('a', 'f', 4, weights, 2, graph=graph)
+
+        self.assertEqual([(6, ['a', 'c', 'd', 'f']), (8, ['a', 'c', 'e', 'f']), (7, ['a', 'b', 'd', 'f'])], routes)
+        self.assertEqual(originalWeights, weights)
+
+        # Only routes costing up to 6 * 1.2 are allowed
+        routes = pathFinding.penalisedPaths('a', 'f', 4, weights, 2, maxAllowedTime=1.2, graph=graph)
+
+        self.assertEqual([(6, ['a', 'c', 'd', 'f'])], routes)
+        self.assertEqual([], pathFinding.penalisedPaths('f', 'a', 4, weights, 2, graph=graph))
+
+    def test_viaPaths(self):
+        """
+        Checks that the via-node alternatives follow the best route, and are only taken if within the cost limit, not
+        sharing too much of the routes already taken and locally optimal
+        """
+        graph = {'s': ('a', 'x'), 'a': ('b', 'c'), 'b': ('t',), 'c': ('b',), 'x': ('y',), 'y': ('t',), 't': ()}
+        weights = {'s': 1, 'a': 2, 'b': 2, 'c': 1, 'x': 2, 'y': 3, 't': 1}
+        best = (6, ['s', 'a', 'b', 't'])
+        disjoint = (7, ['s', 'x', 'y', 't'])
+        # Only differs from the best route by the detour through 'c'
+        detour = (7, ['s', 'a', 'c', 'b', 't'])
+
+        routes = pathFinding.viaPaths('s', 't', 3, weights, graph=graph)
+        self.assertEqual(best, routes[0])
+        self.assertCountEqual([disjoint, detour], routes[1:])
+
+        # The detour shares all 6 of the cost of the best route
+        self.assertEqual([best, disjoint], pathFinding.viaPaths('s', 't', 3, weights, maxOverlap=0.8, graph=graph))
+        # 'a' -> 'c' -> 'b' (costing 5) around 'c' costs more than 'a' -> 'b'
+        self.assertEqual([best, disjoint], pathFinding.viaPaths('s', 't', 3, weights, localOptimality=0.25,
+                                                                graph=graph))
+
+        self.assertEqual([best], pathFinding.viaPaths('s', 't', 3, weights, maxAllowedTime=1.1, graph=graph))
+        self.assertEqual([best], pathFinding.viaPaths('s', 't', 1, weights, graph=graph))
+        self.assertEqual([], pathFinding.viaPaths('t', 's', 3, weights, graph=graph))
+
+    def test_getDestinationTree_shared(self):
+        """
+        Checks that a single reverse shortest path tree is found for each destination and shared by the k shortest
+        paths of every source edge heading to it, giving the same paths as a search for each source edge
+        """
+        context = simContext.SimulationContext()
+        context.successors = {'a': ('c',), 'b': ('c', 'd'), 'c': ('e',), 'd': ('e',), 'e': ()}
+        context.predecessors = pathFinding.reverseGraph(context.successors)
+        context.edgeSpeedGlobal = {'a': 1, 'b': 1, 'c': 2, 'd': 1, 'e': 1}
+        trees = {}
+
+        for source in ('a', 'b'):
+            self.assertEqual(pathFinding.kShortestPaths(source, 'e', 3, context.edgeSpeedGlobal,
+                                                        graph=context.successors),
+                             func.findKShortestPaths(source, 'e', context, trees))
+
+        tree = trees['e']
+        self.assertIs(tree, func.getDestinationTree('e', context, trees))
+        self.assertEqual(['e'], list(trees))
+        self.assertEqual((3, ['b', 'd', 'e']), pathFinding.getRouteFromTree('b', *tree, context.edgeSpeedGlobal))
+
+    def test_contractionHierarchy(self):
+        """
+        Checks that the routes found through the contraction hierarchy cost the same as the routes found by searching
+        the road network, and that the hierarchy is customised when first needed and then only once the edge weights
+        change
+        """
+        successors = {'a': ('b', 'c'), 'b': ('d',), 'c': ('d', 'e'), 'd': ('f',), 'e': ('f',), 'f': ('a',), 'g': ()}
+        random.seed(3)
+        edgeWeights = {edge: random.uniform(1, 10) for edge in successors}
+        customisedHierarchy = ContractionHierarchy(successors).customise(edgeWeights)
+
+        for source in successors:
+            for target in successors:
+                cost, route = pathFinding.shortestPath(source, target, edgeWeights, graph=successors)
+                hierarchyCost, hierarchyRoute = customisedHierarchy.shortestPath(source, target)
+                if route is None:
+                    self.assertIsNone(hierarchyRoute)
+                else:
+                    self.assertAlmostEqual(cost, hierarchyCost)
+                    self.assertEqual(hierarchyCost, pathFinding.getRouteCost(hierarchyRoute, edgeWeights))
+                    self.assertTrue(all(nextEdge in successors[edge]
+                                        for edge, nextEdge in zip(hierarchyRoute, hierarchyRoute[1:])))
+
+        remainingCost, nextEdge = customisedHierarchy.reverseShortestPathTree('f')
+        expectedCost, _ = pathFinding.reverseShortestPathTree('f', edgeWeights,
+                                                              graph=pathFinding.reverseGraph(successors))
+        self.assertEqual(set(expectedCost), set(remainingCost))
+        for edge in expectedCost:
+            self.assertAlmostEqual(expectedCost[edge], remainingCost[edge])
+        self.assertEqual(customisedHierarchy.shortestPath('a', 'f')[1],
+                         pathFinding.getRouteFromTree('a', remainingCost, nextEdge, edgeWeights)[1])
+
+        context = simContext.SimulationContext()
+        context.contractionHierarchy = ContractionHierarchy(successors)
+        context.edgeWeightStore = weights.EdgeWeightStore(edgeWeights)
+        context.edgeSpeedGlobal = context.edgeWeightStore.edgeSpeedGlobal
+        self.assertIsNone(context.customisedHierarchy)
+
+        # The hierarchy is customised the first time it's needed, and then only again once the edge weights change
+        customisedHierarchy = func.getCustomisedHierarchy(context)
+        self.assertIs(context.customisedHierarchy, customisedHierarchy)
+        self.assertIs(customisedHierarchy, func.getCustomisedHierarchy(context))
+
+        context.edgeWeightStore.update(np.full(len(successors), 5.0))
+        self.assertIsNot(customisedHierarchy, func.getCustomisedHierarchy(context))
+        self.assertEqual(context.edgeWeightStore.version, context.customisedHierarchy.version)
+        self.assertAlmostEqual(pathFinding.shortestPath('a', 'f', context.edgeSpeedGlobal, graph=successors)[0],
+                               context.customisedHierarchy.shortestPath('a', 'f')[0])
+
+    def test_landmarkHeuristic(self):
+        """
+        Checks that the landmark bounds never exceed the remaining cost to the target, so that routes found through
+        them are shortest paths, including when edge weights fall below their free-flow travel times
+        """
+        successors = {'a': ('b', 'c'), 'b': ('d',), 'c': ('d', 'e'), 'd': ('f',), 'e': ('f',), 'f': ('a',), 'g': ()}
+        random.seed(5)
+        freeFlowTimes = {edge: random.uniform(1, 5) for edge in successors}
+        landmarkDistances = LandmarkDistances(successors, freeFlowTimes, landmarkCount=3)
+        self.assertEqual(3, len(set(landmarkDistances.landmarks)))
+
+        for edgeWeights in ({edge: time * random.uniform(1, 3) for edge, time in freeFlowTimes.items()},
+                            {edge: time * random.uniform(0.5, 3) for edge, time in freeFlowTimes.items()}):
+            for target in successors:
+                heuristic = landmarkDistances.getHeuristic(target, edgeWeights)
+                remainingCost, _ = pathFinding.reverseShortestPathTree(target, edgeWeights,
+                                                                       graph=pathFinding.reverseGraph(successors))
+                # Edges unable to reach the target are left out, the rest bounded by their remaining cost
+                self.assertTrue(set(heuristic) >= set(remainingCost))
+                for edge in remainingCost:
+                    self.assertLessEqual(heuristic[edge], remainingCost[edge] + 1e-9)
+
+                for source in successors:
+                    cost, _ = pathFinding.shortestPath(source, target, edgeWeights, graph=successors)
+                    directedCost, _ = pathFinding.shortestPath(source, target, edgeWeights, graph=successors,
+                                                               remainingCost=heuristic)
+                    self.assertAlmostEqual(cost, directedCost)
+
+        self.assertNotIn('g', landmarkDistances.getHeuristic('a', freeFlowTimes))
+
+    def test_findKShortestPaths_routeCache(self):
+        """
+        Checks that the k shortest paths are only searched for once for each version of the edge weights, the version
+        only changing when the weights do, and that the least recently used paths are removed once the cache is full
+        """
+        context = simContext.SimulationContext()
+        context.successors = {'a': ('b', 'c'), 'b': ('d',), 'c': ('d',), 'd': ()}
+        context.predecessors = pathFinding.reverseGraph(context.successors)
+        context.edgeWeightStore = weights.EdgeWeightStore({'a': 1.0, 'b': 1.0, 'c': 2.0, 'd': 1.0})
+        context.edgeSpeedGlobal = context.edgeWeightStore.edgeSpeedGlobal
+
+        routes = func.findKShortestPaths('a', 'd', context)
+        routes[0][1].append('e')
+        self.assertEqual(routes[1:], func.findKShortestPaths('a', 'd', context)[1:])
+        self.assertEqual(['a', 'b', 'd'], func.findKShortestPaths('a', 'd', context)[0][1])
+        self.assertEqual((2, 1), (context.routeCache.hits, context.routeCache.misses))
+
+        # The same weights don't change the version, whereas 'b' becoming slower changes the best path
+        context.edgeWeightStore.update(np.array([1.0, 1.0, 2.0, 1.0]))
+        func.findKShortestPaths('a', 'd', context)
+        context.edgeWeightStore.update(np.array([1.0, 5.0, 2.0, 1.0]))
+        self.assertEqual(['a', 'c', 'd'], func.findKShortestPaths('a', 'd', context)[0][1])
+        self.assertEqual((3, 2), (context.routeCache.hits, context.routeCache.misses))
+
+        routeCache = RouteCache(maxSize=2)
+        for key in ('x', 'y', 'x', 'z'):
+            if routeCache.get(key, 0) is None:
+                routeCache.put(key, 0, key.upper())
+        self.assertEqual(['x', 'z'], list(routeCache.entries))
+        self.assertEqual(0.25, routeCache.hitRate())
+
+    def test_createJobs(self):
+        """
+        Checks that the simulations of each (scenario, algorithm) are kept within a single chain, in order of route
+        file, unless the simulations are ran independently
+        """
+        chains = batch.createJobs([4], [4, 1], 3)
+
+        self.assertEqual(2, len(chains))
+        self.assertEqual([batch.BatchJob(4, 4, 1), batch.BatchJob(4, 4, 2), batch.BatchJob(4, 4, 3)], chains[0])
+
+        batch.BATCH_INDEPENDENT_RUNS = True
+        try:
+            chains = batch.createJobs([4], [4, 1], 3)
+        finally:
+            batch.BATCH_INDEPENDENT_RUNS = False
+
+        self.assertEqual(6, len(chains))
+        self.assertEqual([batch.BatchJob(4, 1, 3)], chains[-1])
+
+    def test_simulationContext(self):
+        """
+        Checks that the state of a simulation with its own context is kept apart from the module variables (used by the
+        default context), and that only the road network is shared between contexts
+        """
+        self.assertIs(func.vehicleReroutedAmount, simContext.getContext().vehicleReroutedAmount)
+
+        context = simContext.SimulationContext()
+        context.vehicleReroutedAmount['testVeh'] = 1
+        context.edgeSpeedGlobal = {'edge_1': 10, 'edge_2': 5}
+        context.edgesNetwork['edge_1'] = ['edge_1_0']
+        context.networkLoaded = True
+
+        self.assertNotIn('testVeh', func.vehicleReroutedAmount)
+        self.assertEqual(15, sim.getGlobalRoutePathTime(['edge_1', 'edge_2'], context=context))
+
+        nextContext = simContext.SimulationContext(network=context)
+
+        self.assertIs(context.edgesNetwork, nextContext.edgesNetwork)
+        self.assertTrue(nextContext.networkLoaded)
+        self.assertEqual({}, nextContext.vehicleReroutedAmount)
+
+        # The settings of a simulation are those of the module variables unless given its own
+        self.assertEqual(sumo.ALGORITHM, context.algorithm)
+        self.assertEqual(sumo.DATABASE_LOCATION, context.databaseLocation)
+
+        ownContext = simContext.SimulationContext(algorithm=1, databaseLocation='test.sqlite',
+                                                  simulationReference='test_1_')
+        self.assertEqual((1, 'test.sqlite', 'test_1_'),
+                         (ownContext.algorithm, ownContext.databaseLocation, ownContext.simulationReference))
+        self.assertEqual(sumo.SIMULATION_REFERENCE, simContext.getContext().simulationReference)
+
+    def test_networkCache(self):
+        """
+        Checks that the road network stored in the cache is loaded back for the same net file and settings only
+        """
+        cacheDirectory = sumo.NETWORK_CACHE_DIR
+        minEdgeLength = initialFunc.MIN_EDGE_LENGTH
+        landmarkCount = landmarks.LANDMARK_COUNT
+
+        with tempfile.TemporaryDirectory() as directory:
+            sumo.NETWORK_CACHE_DIR = directory
+            netFile = os.path.join(directory, 'test.net.xml')
+            with open(netFile, 'w') as net:
+                net.write('<net/>')
+
+            try:
+                context = simContext.SimulationContext()
+                context.edgesNetwork['edge_1'] = ['edge_1_0']
+                context.multiIncomingEdges['edge_1'] = {'edge_2'}
+                context.freeFlowSpeed[':internal_0'] = 1.5
+
+                key = cache.getCacheKey(netFile)
+                self.assertFalse(cache.loadNetwork(netFile, key, simContext.SimulationContext()))
+                cache.saveNetwork(netFile, key, context)
+
+                loadedContext = simContext.SimulationContext()
+                self.assertTrue(cache.loadNetwork(netFile, key, loadedContext))
+                self.assertEqual(context.edgesNetwork, loadedContext.edgesNetwork)
+                self.assertEqual(context.multiIncomingEdges, loadedContext.multiIncomingEdges)
+                self.assertEqual(context.freeFlowSpeed, loadedContext.freeFlowSpeed)
+
+                # A change in settings requires the road network to be built again
+                initialFunc.MIN_EDGE_LENGTH = minEdgeLength + 1
+                self.assertNotEqual(key, cache.getCacheKey(netFile))
+                initialFunc.MIN_EDGE_LENGTH = minEdgeLength
+                landmarks.LANDMARK_COUNT = landmarkCount + 1
+                self.assertNotEqual(key, cache.getCacheKey(netFile))
+            finally:
+                sumo.NETWORK_CACHE_DIR = cacheDirectory
+                initialFunc.MIN_EDGE_LENGTH = minEdgeLength
+                landmarks.LANDMARK_COUNT = landmarkCount
+
+    def test_incomingEdgeIndex(self):
+        """
+        Checks that the upstream edges are those reached within MAX_EDGE_RECURSIONS_RANGE incoming edges (the edge
+        itself included when on a loop) and that they are only found once for each edge and range
+        """
+        recursionsRange = func.MAX_EDGE_RECURSIONS_RANGE
+        # edge_1 -> edge_2 -> edge_3 -> edge_4, with edge_4 -> edge_2 closing a loop and edge_5 -> edge_1
+        directedGraphEdges = {'edge_1': {'edge_2'}, 'edge_2': {'edge_3'}, 'edge_3': {'edge_4'}, 'edge_4': {'edge_2'},
+                              'edge_5': {'edge_1'}}
+        index = IncomingEdgeIndex(directedGraphEdges)
+
+        try:
+            func.MAX_EDGE_RECURSIONS_RANGE = 2
+            self.assertEqual({'edge_1', 'edge_4', 'edge_5', 'edge_3'}, index['edge_2'])
+            self.assertEqual({'edge_2', 'edge_1', 'edge_4'}, index['edge_3'])
+            self.assertEqual(set(), index['edge_5'])
+
+            func.MAX_EDGE_RECURSIONS_RANGE = 3
+            self.assertEqual({'edge_2', 'edge_1', 'edge_4', 'edge_5', 'edge_3'}, index['edge_3'])
+            self.assertIs(index['edge_3'], index.getUpstreamEdges('edge_3', 3))
+            self.assertEqual(set(directedGraphEdges), set(index))
+        finally:
+            func.MAX_EDGE_RECURSIONS_RANGE = recursionsRange
+
+    def test_populateDBVehicleTable_changedVehiclesOnly(self):
+        """
+        Checks that only the vehicles whose fairness metrics have changed are written to the vehicle table again
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            database = db.Database(location=os.path.join(directory, 'test.sqlite'))
+
+            try:
+                context = simContext.SimulationContext()
+                for vehicle in ('1', '2', '3'):
+                    context.vehicleReroutedAmount[vehicle] = 0
+                    context.cumulativeExtraTime[vehicle] = 0
+                    context.timeSpentInNetwork[vehicle] = 0
+
+                database.populateDBVehicleTable(context)
+                self.assertEqual(3, database.conn.total_changes)
+
+                context.vehicleReroutedAmount['2'] = 1
+                context.timeSpentInNetwork['3'] = 30
+                database.populateDBVehicleTable(context)
+                self.assertEqual(5, database.conn.total_changes)
+
+                # Nothing has changed, so nothing is written
+                database.populateDBVehicleTable(context)
+                self.assertEqual(5, database.conn.total_changes)
+                self.assertEqual({1: (0, 0, 0), 2: (1, 0, 0), 3: (0, 0, 30)}, database.fairnessMetricsIntoDictionary())
+            finally:
+                database.closeDB()
+
+    def test_databaseBackgroundWriter(self):
+        """
+        Checks that the rows written in the background are committed before being read, and that an error raised by the
+        background writer is raised again within the simulation
+        """
+        databaseLocation = sumo.DATABASE_LOCATION
+
+        with tempfile.TemporaryDirectory() as directory:
+            sumo.DATABASE_LOCATION = os.path.join(directory, 'test.sqlite')
+            database = db.Database(backgroundWriter=True)
+
+            try:
+                for i in range(db.WRITER_QUEUE_SIZE * 2):
+                    database.populateDBSimulationTable(i, 0.9, 0.1, 'test_', 0.5)
+                self.assertEqual(db.WRITER_QUEUE_SIZE * 2,
+                                 len(database.getDBTableContents(db.SIMULATION_OUTPUT_TABLE)))
+
+                database.write("INSERT INTO missing_table VALUES (?)", ((1,),))
+                with self.assertRaises(sqlite3.Error):
+                    database.flush()
+
+                database.stopWriter()
+                self.assertIsNone(database.writer)
+            finally:
+                database.closeDB()
+                sumo.DATABASE_LOCATION = databaseLocation
+
+            # The writer still stops when a write fails alongside the request to stop
+            writer = db.DatabaseWriter(os.path.join(directory, 'test.sqlite'))
+            writer.write("INSERT INTO missing_table VALUES (?)", ((1,),))
+            writer.writes.put(None)
+            writer.start()
+            writer.join(5)
+
+            self.assertFalse(writer.is_alive())
+            with self.assertRaises(sqlite3.Error):
+                writer.flush()
+
+    def test_netReader(self):
+        """
+        Checks that the road network read through NetReader matches that read through sumolib
+        """
+        sumolibNet = sumolib.net.readNet(sumo.NET_FILE_SM)
+        net = netReader.readNet(sumo.NET_FILE_SM)
+
+        self.assertEqual([edge.getID() for edge in sumolibNet.getEdges(withInternal=False)],
+                         [edge.getID() for edge in net.getEdges()])
+
+        for sumolibEdge in sumolibNet.getEdges(withInternal=False):
+            edge = net.getEdge(sumolibEdge.getID())
+            self.assertEqual(sumolibEdge.getLength(), edge.getLength())
+            self.assertEqual(sumolibEdge.is_fringe(), edge.is_fringe())
+            self.assertEqual(sumolibEdge.allows(pathFinding.VEHICLE_CLASS), edge.allows(pathFinding.VEHICLE_CLASS))
+            self.assertEqual({outgoing.getID() for outgoing in sumolibEdge.getOutgoing()},
+                             {outgoing.getID() for outgoing in edge.getOutgoing()})
+            self.assertEqual({incoming.getID() for incoming in sumolibEdge.getIncoming()},
+                             {incoming.getID() for incoming in edge.getIncoming()})
+            self.assertEqual(sumolibEdge.getFromNode().getCoord(), edge.getFromNode().getCoord())
+
+            for sumolibLane in sumolibEdge.getLanes():
+                self.assertEqual({connection.getToLane().getID() for connection in sumolibLane.getOutgoing()},
+                                 {connection.getToLane().getID() for connection in
+                                  net.getLane(sumolibLane.getID()).getOutgoing()})
+
+    def test_resultsExport(self):
+        """
+        Checks that only the simulation_output rows of the exported simulation are exported, alongside the vehicle
+        table and the trip information, and that these are loaded back memory-mapped
+        """
+        databaseLocation = sumo.DATABASE_LOCATION
+
+        with tempfile.TemporaryDirectory() as directory:
+            sumo.DATABASE_LOCATION = os.path.join(directory, 'test.sqlite')
+            database = db.Database()
+
+            try:
+                for i in range(3):
+                    database.populateDBSimulationTable(i, 0.9, 0.1, 'test_1_', 0.5)
+                    database.populateDBSimulationTable(i, 0.5, 0.2, 'test_2_', 0.5)
+
+                context = simContext.SimulationContext()
+                for vehicle in ('1', '2'):
+                    context.vehicleReroutedAmount[vehicle] = int(vehicle)
+                    context.cumulativeExtraTime[vehicle] = 10
+                    context.timeSpentInNetwork[vehicle] = 60
+                database.populateDBVehicleTable(context)
+            finally:
+                database.closeDB()
+                sumo.DATABASE_LOCATION = databaseLocation
+
+            tripInfoLocation = os.path.join(directory, 'tripinfo.xml')
+            with open(tripInfoLocation, 'w') as tripInfo:
+                tripInfo.write('<tripinfos>\n'
+                               '    <tripinfo id="1" depart="0.00" arrival="60.00" duration="60.00" '
+                               'routeLength="600.00" waitingTime="5.00" timeLoss="10.00" rerouteNo="1"/>\n'
+                               '</tripinfos>\n')
+
+            runDirectory = export.exportRun(os.path.join(directory, 'test.sqlite'), 'test_2_', tripInfoLocation,
+                                            os.path.join(directory, 'export'))
+            run = export.loadRun(runDirectory)
+
+            self.assertEqual(os.path.join(directory, 'export', 'test_2'), runDirectory)
+            self.assertEqual({export.SIMULATION_TABLE, export.VEHICLE_TABLE, export.TRIP_INFO_TABLE}, set(run))
+            self.assertIsInstance(run[export.SIMULATION_TABLE]['fairnessIndex'], np.memmap)
+            self.assertEqual([0, 1, 2], list(run[export.SIMULATION_TABLE]['timestep']))
+            self.assertEqual([0.5] * 3, list(run[export.SIMULATION_TABLE]['fairnessIndex']))
+            self.assertEqual([1, 2], list(run[export.VEHICLE_TABLE]['numberTimesRerouted']))
+            self.assertEqual(['1'], list(run[export.TRIP_INFO_TABLE]['id']))
+            self.assertEqual([600], list(run[export.TRIP_INFO_TABLE]['routeLength']))
+            self.assertEqual(['test_2'], list(export.loadBatch(os.path.join(directory, 'export'))))
+
+    def test_selectVehiclesBasedOnFairness_context(self):
+        """
+        Checks the QOEs and selection of vehicles given by their metrics in a context (without a simulation running),
+        vehicles repeated in the list only being selected once
+        """
+        context = simContext.SimulationContext()
+        for vehicle, metrics in {'a': (2, 10, 100), 'b': (0, 0, 100), 'c': (1, 5, 50)}.items():
+            context.vehicleReroutedAmount[vehicle], context.cumulativeExtraTime[vehicle], \
+                context.timeSpentInNetwork[vehicle] = metrics
+
+        selectedVehicles, qoe, largestQOE, smallestQOE = sim.selectVehiclesBasedOnFairness(['a', 'b', 'c', 'a'],
+                                                                                            context)
+
+        # 'a' and 'c' have had the same metrics for their time spent in the network, 'b' has never been rerouted
+        self.assertEqual(['b'], selectedVehicles)
+        self.assertEqual({'a': 0, 'b': 10, 'c': 0}, qoe)
+        self.assertEqual((10, 0), (largestQOE, smallestQOE))
+
+        self.assertEqual(([], {}, 0, sys.maxsize), sim.selectVehiclesBasedOnFairness([], context))
+
+    def test_vehicleStore(self):
+        """
+        Checks that the columns of the vehicle store behave as dictionaries (including when the store grows), and that
+        the metrics are updated in the same way whether held in the store or in dictionaries
+        """
+        store = vehicleState.VehicleStore(capacity=2)
+        periodSinceLastRerouted = store.periodSinceLastRerouted
+
+        for vehicle in ('a', 'b', 'c'):
+            periodSinceLastRerouted[vehicle] = 1
+        periodSinceLastRerouted['b'] += 1
+        store.timeSpentInNetwork['d'] = 30
+
+        self.assertEqual({'a': 1, 'b': 2, 'c': 1}, periodSinceLastRerouted)
+        self.assertEqual(3, len(periodSinceLastRerouted))
+        self.assertNotIn('d', periodSinceLastRerouted)
+        self.assertEqual(4, len(store))
+        with self.assertRaises(KeyError):
+            periodSinceLastRerouted['d']
+        with self.assertRaises(KeyError):
+            periodSinceLastRerouted.gather(['a', 'd'])
+
+        dictionary = {'a': 1, 'b': 2, 'c': 1}
+        for metric in (periodSinceLastRerouted, dictionary):
+            vehicleState.incrementAll(metric, 1)
+            vehicleState.deleteAtLeast(metric, 3)
+        self.assertEqual({'a': 2, 'c': 2}, periodSinceLastRerouted)
+        self.assertEqual(dictionary, periodSinceLastRerouted)
+        self.assertEqual(2, len(periodSinceLastRerouted))
+
+        del periodSinceLastRerouted['a']
+        self.assertEqual(['c'], list(periodSinceLastRerouted))
+        self.assertEqual([[2], [30]], [values.tolist() for values in vehicleState.gatherValues(
+            ['c'], periodSinceLastRerouted, {'c': 30})])
+
+    def test_fairnessTracker(self):
+        """
+        Checks that the fairness index kept up to date by the fairness tracker is the same as that calculated from the
+        QOE of every vehicle each period, as vehicles enter, leave and have their metrics changed
+        """
+        randomGenerator = random.Random(16)
+        trackedContext = simContext.SimulationContext()
+        dictionaryContext = simContext.SimulationContext()
+        for metric in ('vehicleReroutedAmount', 'cumulativeExtraTime', 'timeSpentInNetwork'):
+            setattr(dictionaryContext, metric, {})
+
+        self.assertTrue(trackedContext.fairnessTracker.canTrack(trackedContext))
+        self.assertFalse(dictionaryContext.fairnessTracker.canTrack(dictionaryContext))
+
+        vehicles = []
+        for period in range(30):
+            vehicles = [vehicle for vehicle in vehicles if randomGenerator.random() > 0.1]
+            vehicles += [str(period * 10 + vehicle) for vehicle in range(randomGenerator.randint(0, 10))]
+
+            for vehicle in vehicles:
+                if vehicle not in dictionaryContext.timeSpentInNetwork or randomGenerator.random() < 0.3:
+                    metrics = (randomGenerator.randint(0, 3), randomGenerator.uniform(-10, 50),
+                               randomGenerator.randint(0, 300))
+                    for context in (trackedContext, dictionaryContext):
+                        context.vehicleReroutedAmount[vehicle], context.cumulativeExtraTime[vehicle], \
+                            context.timeSpentInNetwork[vehicle] = metrics
+
+            for context in (trackedContext, dictionaryContext):
+                context.vehiclesInNetwork = list(vehicles)
+
+            if vehicles:
+                for tracked, calculated in zip(sim.fairnessIndex(trackedContext), sim.fairnessIndex(dictionaryContext)):
+                    self.assertAlmostEqual(calculated, tracked)
+
+    def test_routeIndex(self):
+        """
+        Checks that the route index gives the vehicles passing through each edge, and the position of the edge within
+        each route (the first position if passed through more than once), as routes are changed and removed
+        """
+        routeIndex = RouteIndex()
+        routeIndex.setRoute('a', ['e1', 'e2', 'e3', 'e2'])
+        routeIndex.setRoute('b', ('e2', 'e4'))
+
+        self.assertEqual({'a': 1, 'b': 0}, routeIndex.getVehicles('e2'))
+        self.assertEqual(2, routeIndex.getPosition('e3', 'a'))
+        self.assertIsNone(routeIndex.getPosition('e3', 'b'))
+        self.assertEqual(('e1', 'e2', 'e3', 'e2'), routeIndex.getRoute('a'))
+
+        # 'a' is rerouted away from e3, then 'b' leaves the network
+        routeIndex.setRoute('a', ('e1', 'e2', 'e5'))
+        routeIndex.removeVehicle('b')
+        routeIndex.removeVehicle('b')
+
+        self.assertEqual({'a': 1}, routeIndex.getVehicles('e2'))
+        self.assertEqual({}, routeIndex.getVehicles('e3'))
+        self.assertEqual({'e1', 'e2', 'e5'}, set(routeIndex.edgePositions))
+        self.assertNotIn('b', routeIndex)
+        self.assertEqual(1, len(routeIndex))
+
+
 if __name__=="__main__":
     unittest.main(exit=False, warnings='ignore')
@@ -1,6 +1,6 @@
 import sys
 
-import traci
+from src.code.SumoBackend import traci
 import time
 
 from src.code import SumoConnection as sumo
@@ -0,0 +1,82 @@
+###################################################################################################################
+# Holds the vehicles on each edge, and the route and stopped state of each vehicle, for a single rerouting        #
+# period, so that the congested road segments of the period which share upstream edges (and so vehicles) don't    #
+# each retrieve them again through TraCI.                                                                         #
+#                                                                                                                 #
+# When TraCI subscriptions are used, the vehicles on each edge and the stopped state of each vehicle are filled   #
+# from the results of the subscriptions made alongside the congestion levels (see                                 #
+# SimulationFunctions.subscribeRoadCongestion()). Everything else (e.g. the routes, which are only needed for the #
+# vehicles upstream of congested road segments) is retrieved through TraCI when first needed and then remembered  #
+# until the end of the rerouting period.                                                                          #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+
+class VehicleSnapshot:
+    """
+    The vehicles on each edge, and the route and stopped state of each vehicle, during a single rerouting period. The
+    simulation doesn't advance during a rerouting period, so only the routes of rerouted vehicles change (which must
+    be given through updateRoute()).
+    """
+
+    def __init__(self, connection, edgeVehicles=None, routes=None, stopStates=None):
+        """
+        Args:
+            connection: The connection to SUMO through which values not held are retrieved
+            edgeVehicles ({str: (str)}): The vehicles on each edge, in the form {edge: (vehicleIDs)}
+            routes ({str: (str)}): The route of each vehicle, in the form {vehicleID: (edges)}
+            stopStates ({str: int}): The stop state of each vehicle (see traci.vehicle.getStopState())
+        """
+        self.connection = connection
+        self.edgeVehicles = edgeVehicles if edgeVehicles is not None else {}
+        self.routes = routes if routes is not None else {}
+        self.stopStates = stopStates if stopStates is not None else {}
+
+    def getEdgeVehicles(self, edge):
+        """
+        Args:
+            edge (str): The edge
+        Returns:
+            (str): The vehicles on the edge during the last timestep
+        """
+        vehicles = self.edgeVehicles.get(edge)
+        if vehicles is None:
+            vehicles = self.edgeVehicles[edge] = self.connection.edge.getLastStepVehicleIDs(edge)
+        return vehicles
+
+    def getRoute(self, vehicle):
+        """
+        Args:
+            vehicle (str): The vehicle ID
+        Returns:
+            (str): The edges of the current route of the vehicle
+        """
+        route = self.routes.get(vehicle)
+        if route is None:
+            route = self.routes[vehicle] = self.connection.vehicle.getRoute(vehicle)
+        return route
+
+    def isStopped(self, vehicle):
+        """
+        Args:
+            vehicle (str): The vehicle ID
+        Returns:
+            bool: True if the vehicle is in the 'stopped' state (not the same as waiting, e.g. at a traffic light)
+        """
+        stopState = self.stopStates.get(vehicle)
+        if stopState is None:
+            stopState = self.stopStates[vehicle] = self.connection.vehicle.getStopState(vehicle)
+        return (stopState & 1) == 1
+
+    def updateRoute(self, vehicle, route):
+        """
+        Records the route of a vehicle which has been rerouted during the rerouting period
+
+        Args:
+            vehicle (str): The vehicle ID
+            route ((str)): The edges of the new route of the vehicle
+        """
+        self.routes[vehicle] = tuple(route)
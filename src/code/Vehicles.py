@@ -0,0 +1,318 @@
+###################################################################################################################
+# Holds the state of every vehicle seen during a simulation (the metrics used to determine fairness and the times #
+# used to track each vehicle's time spent in the system) in place of a dictionary for each metric.                #
+#                                                                                                                 #
+# Each vehicle ID is given a dense integer slot when first seen, and each metric is held as a typed NumPy column   #
+# indexed by slot, so the metrics of many vehicles can be gathered and updated at once. Each column is also given  #
+# as a dictionary-like VehicleColumn ({vehicleID: value}), so that it can be used in place of a dictionary.        #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+###########
+# IMPORTS #
+###########
+
+import sys
+
+from collections.abc import MutableMapping
+
+import numpy as np
+
+#############
+# CONSTANTS #
+#############
+
+# The metrics held for each vehicle and their types, in the form {metric: dtype}
+VEHICLE_COLUMNS = {'vehicleReroutedAmount': np.int64,
+                   'cumulativeExtraTime': np.float64,
+                   'periodSinceLastRerouted': np.int64,
+                   'stoppedStateLastPeriod': np.bool_,
+                   'timeSpentInNetwork': np.float64,
+                   'timeSpentStopped': np.float64,
+                   'initialTimeSpentInNetwork': np.float64,
+                   'arrivalTime': np.float64,
+                   'departureTime': np.float64}
+
+# The number of vehicles a store initially has room for (doubled each time it's filled)
+INITIAL_CAPACITY = 1024
+
+
+class VehicleStore:
+    """
+    The state of every vehicle seen during a simulation. The value of a metric for a vehicle is given by
+    values[metric][slots[vehicleID]], only being set if present[metric][slots[vehicleID]] is True.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """
+        Args:
+            capacity (int): The number of vehicles initially given room for
+        """
+        # The slot of each vehicle, in the form {vehicleID: slot}, and the vehicle in each slot
+        self.slots = {}
+        self.vehicleIDs = []
+        self.capacity = capacity
+
+        self.values = {metric: np.zeros(capacity, dtype=dtype) for metric, dtype in VEHICLE_COLUMNS.items()}
+        self.present = {metric: np.zeros(capacity, dtype=np.bool_) for metric in VEHICLE_COLUMNS}
+        # The number of vehicles which have a value set for each metric
+        self.counts = dict.fromkeys(VEHICLE_COLUMNS, 0)
+        # True for the slots of the vehicles which have had a metric set or deleted since last taken (see
+        # takeChangedSlots())
+        self.changed = np.zeros(capacity, dtype=np.bool_)
+
+        self.columns = {metric: VehicleColumn(self, metric) for metric in VEHICLE_COLUMNS}
+
+    def __getattr__(self, metric):
+        try:
+            return self.__dict__['columns'][metric]
+        except KeyError:
+            raise AttributeError(metric) from None
+
+    def __len__(self):
+        return len(self.vehicleIDs)
+
+    def getSlot(self, vehicle):
+        """
+        Gives the slot of a vehicle, giving the vehicle a slot if it hasn't been seen before
+
+        Args:
+            vehicle (str): The vehicle ID
+        Returns:
+            int: The slot of the vehicle
+        """
+        slot = self.slots.get(vehicle)
+        if slot is None:
+            slot = len(self.vehicleIDs)
+            if slot == self.capacity:
+                self._grow()
+
+            vehicle = sys.intern(vehicle) if type(vehicle) is str else vehicle
+            self.slots[vehicle] = slot
+            self.vehicleIDs.append(vehicle)
+
+        return slot
+
+    def getSlots(self, vehicles):
+        """
+        Args:
+            vehicles ([str]): The vehicle IDs, each of which must have been seen before
+        Returns:
+            np.ndarray: The slot of each vehicle
+        """
+        return np.fromiter(map(self.slots.__getitem__, vehicles), dtype=np.intp, count=len(vehicles))
+
+    def takeChangedSlots(self):
+        """
+        Gives the slots of the vehicles which have had a metric set or deleted since this was last called
+
+        Returns:
+            np.ndarray: The slots of the vehicles, in order
+        """
+        changedSlots = np.flatnonzero(self.changed[:len(self.vehicleIDs)])
+        self.changed[changedSlots] = False
+        return changedSlots
+
+    def _grow(self):
+        """
+        Doubles the number of vehicles the store has room for
+        """
+        for metric in VEHICLE_COLUMNS:
+            self.values[metric] = np.concatenate((self.values[metric], np.zeros_like(self.values[metric])))
+            self.present[metric] = np.concatenate((self.present[metric], np.zeros_like(self.present[metric])))
+        self.changed = np.concatenate((self.changed, np.zeros_like(self.changed)))
+        self.capacity *= 2
+
+
+class VehicleColumn(MutableMapping):
+    """
+    A single metric of a VehicleStore, given as a dictionary in the form {vehicleID: value}
+    """
+
+    __slots__ = ('store', 'metric')
+
+    def __init__(self, store, metric):
+        """
+        Args:
+            store (VehicleStore): The store holding the metric
+            metric (str): The metric (of VEHICLE_COLUMNS)
+        """
+        self.store = store
+        self.metric = metric
+
+    def __getitem__(self, vehicle):
+        slot = self.store.slots.get(vehicle)
+        if slot is None or not self.store.present[self.metric][slot]:
+            raise KeyError(vehicle)
+        return self.store.values[self.metric][slot].item()
+
+    def __setitem__(self, vehicle, value):
+        store = self.store
+        slot = store.getSlot(vehicle)
+        if not store.present[self.metric][slot]:
+            store.present[self.metric][slot] = True
+            store.counts[self.metric] += 1
+        store.values[self.metric][slot] = value
+        store.changed[slot] = True
+
+    def __delitem__(self, vehicle):
+        slot = self.store.slots.get(vehicle)
+        if slot is None or not self.store.present[self.metric][slot]:
+            raise KeyError(vehicle)
+        self.store.present[self.metric][slot] = False
+        self.store.values[self.metric][slot] = 0
+        self.store.counts[self.metric] -= 1
+        self.store.changed[slot] = True
+
+    def __contains__(self, vehicle):
+        slot = self.store.slots.get(vehicle)
+        return slot is not None and bool(self.store.present[self.metric][slot])
+
+    def __iter__(self):
+        vehicleIDs = self.store.vehicleIDs
+        for slot in self.getPresentSlots().tolist():
+            yield vehicleIDs[slot]
+
+    def __len__(self):
+        return self.store.counts[self.metric]
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        """
+        Returns:
+            {str: value}: A dictionary holding the metric of each vehicle as it currently is
+        """
+        vehicleIDs = self.store.vehicleIDs
+        slots = self.getPresentSlots()
+        return dict(zip([vehicleIDs[slot] for slot in slots.tolist()], self.store.values[self.metric][slots].tolist()))
+
+    def __deepcopy__(self, memo):
+        # A copy of the values only, as the copy needn't be kept in the store
+        return self.copy()
+
+    def clear(self):
+        self.store.changed[self.store.present[self.metric]] = True
+        self.store.present[self.metric][:] = False
+        self.store.values[self.metric][:] = 0
+        self.store.counts[self.metric] = 0
+
+    def getPresentSlots(self):
+        """
+        Returns:
+            np.ndarray: The slots of the vehicles which have a value set for the metric, in order
+        """
+        return np.flatnonzero(self.store.present[self.metric][:len(self.store.vehicleIDs)])
+
+    def gather(self, vehicles, slots=None):
+        """
+        Gives the values of many vehicles at once
+
+        Args:
+            vehicles ([str]): The vehicle IDs, each of which must have a value set
+            slots (np.ndarray): The slots of the vehicles if already known (from VehicleStore.getSlots())
+        Returns:
+            np.ndarray: The value of each vehicle
+        """
+        if slots is None:
+            slots = self.store.getSlots(vehicles)
+
+        present = self.store.present[self.metric][slots]
+        if not present.all():
+            raise KeyError(vehicles[int(np.argmin(present))])
+
+        return self.store.values[self.metric][slots]
+
+    def incrementAll(self, amount):
+        """
+        Adds the amount to the value of every vehicle which has a value set
+
+        Args:
+            amount (int): The amount
+        """
+        vehicleCount = len(self.store.vehicleIDs)
+        values = self.store.values[self.metric][:vehicleCount]
+        present = self.store.present[self.metric][:vehicleCount]
+        values[present] += amount
+        self.store.changed[:vehicleCount] |= present
+
+    def deleteAtLeast(self, threshold):
+        """
+        Deletes every vehicle whose value is at least the threshold
+
+        Args:
+            threshold (int): The threshold
+        """
+        vehicleCount = len(self.store.vehicleIDs)
+        present = self.store.present[self.metric][:vehicleCount]
+        values = self.store.values[self.metric][:vehicleCount]
+
+        deleted = present & (values >= threshold)
+        self.store.changed[:vehicleCount] |= deleted
+        present[deleted] = False
+        values[deleted] = 0
+        self.store.counts[self.metric] -= int(deleted.sum())
+
+
+def gatherValues(vehicles, *metrics):
+    """
+    Gives the values of many vehicles for each of the metrics, the metrics being either VehicleColumns or dictionaries
+
+    Args:
+        vehicles ([str]): The vehicle IDs, each of which must have a value set for each metric
+        metrics ({str: value}): The metrics
+    Returns:
+        [np.ndarray]: The value of each vehicle for each metric
+    """
+    values = []
+    # The slots of the vehicles in each store, only found once for each store
+    storeSlots = {}
+
+    for metric in metrics:
+        if isinstance(metric, VehicleColumn):
+            if id(metric.store) not in storeSlots:
+                storeSlots[id(metric.store)] = metric.store.getSlots(vehicles)
+            values.append(metric.gather(vehicles, storeSlots[id(metric.store)]))
+        else:
+            values.append(np.array(list(map(metric.__getitem__, vehicles))))
+
+    return values
+
+
+def incrementAll(metric, amount):
+    """
+    Adds the amount to the value of every vehicle of the metric, the metric being either a VehicleColumn or a dictionary
+
+    Args:
+        metric ({str: int}): The metric
+        amount (int): The amount
+    """
+    if isinstance(metric, VehicleColumn):
+        metric.incrementAll(amount)
+    else:
+        for vehicle in metric:
+            metric[vehicle] += amount
+
+
+def deleteAtLeast(metric, threshold):
+    """
+    Deletes every vehicle whose value is at least the threshold from the metric, the metric being either a
+    VehicleColumn or a dictionary
+
+    Args:
+        metric ({str: int}): The metric
+        threshold (int): The threshold
+    """
+    if isinstance(metric, VehicleColumn):
+        metric.deleteAtLeast(threshold)
+    else:
+        for vehicle in [vehicle for vehicle, value in metric.items() if value >= threshold]:
+            del metric[vehicle]
+
+
+# The state of the vehicles of the default context (see SimulationContext)
+vehicleStore = VehicleStore()
@@ -0,0 +1,107 @@
+###################################################################################################################
+# Summarises the results of batches of simulations exported by ResultsExport, giving the mean fairness index,     #
+# reroutes, extra time and trip statistics of each (scenario, algorithm) across all of its simulations.           #
+#                                                                                                                 #
+# Databases of simulations ran before the results were exported can be exported first with --database.           #
+#                                                                                                                 #
+# Usage: python -m src.code.scripts.batch_results [--directory DIRECTORY] [--prefix PREFIX] [--database DATABASE] #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+import argparse
+import collections
+import re
+import sqlite3
+
+import numpy as np
+
+from src.code import Database as db
+from src.code import ResultsExport as export
+
+# The number of the simulation (route file) at the end of each reference, e.g. southampton_2_hours_kPaths_12
+SIMULATION_NUMBER = re.compile(r'_\d+$')
+
+
+def exportDatabase(databaseLocation, exportDirectory):
+    """
+    Exports every simulation held within a database, the vehicle_output table of each being the table as it stands
+
+    Args:
+        databaseLocation (str): The location of the database
+        exportDirectory (str): The directory in which to export the simulations
+    """
+    conn = sqlite3.connect(databaseLocation)
+    # The reference of each simulation is its simIndexTimestep with the timestep removed
+    references = {re.sub(r'\d+$', '', row[0]) for row in
+                  conn.execute("SELECT simIndexTimestep FROM {}".format(db.SIMULATION_OUTPUT_TABLE))}
+    conn.close()
+
+    for reference in sorted(references):
+        print('Exported {}'.format(export.exportRun(databaseLocation, reference, exportDirectory=exportDirectory)))
+
+
+def summariseRun(run):
+    """
+    Args:
+        run ({str: {str: np.ndarray}}): The columns of the simulation, as given by ResultsExport.loadRun()
+    Returns:
+        {str: float}: The mean of each statistic over the simulation
+    """
+    simulation = run[export.SIMULATION_TABLE]
+    vehicles = run[export.VEHICLE_TABLE]
+
+    summary = {'fairnessIndex': np.mean(simulation['fairnessIndex']) if len(simulation['fairnessIndex']) else np.nan,
+               'reroutes': np.mean(vehicles['numberTimesRerouted']) if len(vehicles['vehicleID']) else np.nan,
+               'extraTime': np.mean(vehicles['cumulativeExtraTime']) if len(vehicles['vehicleID']) else np.nan}
+
+    tripInfo = run.get(export.TRIP_INFO_TABLE)
+    if tripInfo is not None and len(tripInfo['duration']):
+        completed = tripInfo['duration'] > 0
+        summary['speed'] = np.mean(tripInfo['routeLength'][completed] / tripInfo['duration'][completed])
+        summary['timeLoss'] = np.mean(tripInfo['timeLoss'])
+
+    return summary
+
+
+def summariseBatch(exportDirectory, prefix):
+    """
+    Prints the mean of each statistic for each (scenario, algorithm) across all of its simulations
+
+    Args:
+        exportDirectory (str): The directory holding the exported simulations
+        prefix (str): The start of the references of the simulations to summarise
+    """
+    summaries = collections.defaultdict(list)
+    for reference, run in export.loadBatch(exportDirectory, prefix).items():
+        summaries[SIMULATION_NUMBER.sub('', reference)].append(summariseRun(run))
+
+    statistics = ('fairnessIndex', 'reroutes', 'extraTime', 'speed', 'timeLoss')
+    print('{:<45}{:>6}'.format('Simulations', 'Runs') + ''.join('{:>15}'.format(name) for name in statistics))
+    for simulations, runSummaries in sorted(summaries.items()):
+        # Statistics missing from every simulation (e.g. without trip information) are given as nan
+        means = []
+        for name in statistics:
+            values = [summary[name] for summary in runSummaries if not np.isnan(summary.get(name, np.nan))]
+            means.append(np.mean(values) if values else np.nan)
+        print('{:<45}{:>6}'.format(simulations, len(runSummaries)) + ''.join('{:>15.4f}'.format(mean)
+                                                                             for mean in means))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarises batches of exported simulations")
+    parser.add_argument('--directory', default=None, help="The directory of the exported simulations (EXPORT_DIR)")
+    parser.add_argument('--prefix', default='', help="The start of the references of the simulations to summarise")
+    parser.add_argument('--database', nargs='+', default=[], help="Databases to export before summarising")
+    arguments = parser.parse_args()
+
+    if arguments.directory is None:
+        from src.code import SumoConnection as sumo
+        arguments.directory = sumo.EXPORT_DIR
+
+    for database in arguments.database:
+        exportDatabase(database, arguments.directory)
+
+    summariseBatch(arguments.directory, arguments.prefix)
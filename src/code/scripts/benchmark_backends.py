@@ -0,0 +1,94 @@
+###################################################################################################################
+# Compares the number of simulation steps per second achieved through TraCI and through libsumo for each          #
+# ALGORITHM on the bundled small_southampton scenario (SCENARIO 8).                                               #
+#                                                                                                                 #
+# Each run takes place in a separate process, as libsumo can only run a single simulation per process.            #
+#                                                                                                                 #
+# Usage: python -m src.code.scripts.benchmark_backends [--steps STEPS] [--algorithms 0 1 2 3 4]                   #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# The name of each ALGORITHM
+ALGORITHMS = {0: 'No Rerouting',
+              1: 'Dynamic Shortest Path',
+              2: 'k-Shortest Paths',
+              3: 'Dynamic Shortest Path with Fairness',
+              4: 'k-Shortest Paths with Fairness',
+              5: 'Via-Node Alternative Routes'}
+
+
+def runSingle(algorithm, libsumo, steps):
+    """
+    Runs a single simulation of small_southampton, printing the steps per second achieved as the final line
+
+    Args:
+        algorithm (int): The ALGORITHM to be ran
+        libsumo (bool): True if libsumo should be used, False if TraCI should be used
+        steps (int): The number of timesteps to simulate
+    """
+    from src.code import SumoConnection as sumo
+
+    sumo.loadScenario(8)
+    sumo.ALGORITHM = algorithm
+    sumo.LIBSUMO = libsumo
+    sumo.SUMO_GUI = False
+    sumo.SUMO_BINARY = sumo.SUMO_BINARY.replace('sumo-gui', 'sumo')
+    sumo.AUTOMATED_TESTING = True
+    sumo.PRINT_ROAD_REROUTED = False
+    sumo.PRINT_REROUTE_PERIOD = False
+    sumo.END_TIME = steps
+    sumo.DATABASE_LOCATION = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite')
+
+    startTime = time.perf_counter()
+    sumo.createSim('routes.xml')
+    timeTaken = time.perf_counter() - startTime
+
+    print(steps / timeTaken)
+
+
+def benchmark(algorithms, steps):
+    """
+    Runs each ALGORITHM through both TraCI and libsumo and prints the steps per second achieved
+
+    Args:
+        algorithms (int[]): The ALGORITHMs to be ran
+        steps (int): The number of timesteps to simulate in each run
+    """
+    print('{:<40}{:>17}{:>17}{:>10}'.format('ALGORITHM', 'TraCI steps/s', 'libsumo steps/s', 'speedup'))
+
+    for algorithm in algorithms:
+        stepsPerSecond = []
+        for libsumo in (False, True):
+            output = subprocess.run([sys.executable, '-m', 'src.code.scripts.benchmark_backends', '--single',
+                                     str(algorithm), str(int(libsumo)), '--steps', str(steps)],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+                                    check=True).stdout
+            stepsPerSecond.append(float(output.strip().splitlines()[-1]))
+
+        print('{:<40}{:>17.1f}{:>17.1f}{:>9.2f}x'.format('{}: {}'.format(algorithm, ALGORITHMS[algorithm]),
+                                                         stepsPerSecond[0], stepsPerSecond[1],
+                                                         stepsPerSecond[1] / stepsPerSecond[0]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks TraCI against libsumo on small_southampton")
+    parser.add_argument('--steps', type=int, default=3600, help="The number of timesteps to simulate per run")
+    parser.add_argument('--algorithms', type=int, nargs='+', default=sorted(ALGORITHMS),
+                        help="The ALGORITHMs to benchmark")
+    parser.add_argument('--single', type=int, nargs=2, metavar=('ALGORITHM', 'LIBSUMO'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.single:
+        runSingle(arguments.single[0], bool(arguments.single[1]), arguments.steps)
+    else:
+        benchmark(arguments.algorithms, arguments.steps)
@@ -0,0 +1,127 @@
+###################################################################################################################
+# Compares the time taken to select vehicles based on their fairness (SimulationFunctions.                       #
+# selectVehiclesBasedOnFairness()) through NumPy with the time taken by the previous pure Python implementation,  #
+# for 1k, 10k and 100k vehicles with random rerouting metrics. The selections of both are checked to be the same. #
+#                                                                                                                 #
+# Usage: python -m src.code.scripts.benchmark_fairness [--vehicles 1000 10000 100000] [--repeats REPEATS]         #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+import argparse
+import random
+import sys
+import timeit
+
+from src.code import SumoConnection as sumo
+from src.code import SimulationFunctions as sim
+from src.code import RoutingFunctions as func
+from src.code.SimulationContext import SimulationContext
+
+
+def selectVehiclesBasedOnFairnessPython(reroutedList, context):
+    """
+    The previous implementation of selectVehiclesBasedOnFairness(), one vehicle at a time
+
+    Args:
+        reroutedList ([str]): All of the vehicles which are eligible to be rerouted
+        context (SimulationContext): The simulation
+    Returns:
+        ([str], {str: float}, float, float): The same as selectVehiclesBasedOnFairness()
+    """
+    vehicleReroutedAmount = context.vehicleReroutedAmount
+    cumulativeExtraTime = context.cumulativeExtraTime
+    timeSpentInNetwork = context.timeSpentInNetwork
+
+    largestVRA = max([0] + [vehicleReroutedAmount[vehicle] for vehicle in reroutedList])
+    largestCET = max([0] + [cumulativeExtraTime[vehicle] for vehicle in reroutedList])
+    mostTime = max([0] + [timeSpentInNetwork[vehicle] for vehicle in reroutedList])
+
+    qoe = {}
+    for vehicle in reroutedList:
+        vraPercentage = 0 if largestVRA == 0 else vehicleReroutedAmount[vehicle] / largestVRA
+        cetPercentage = 0 if largestCET == 0 else cumulativeExtraTime[vehicle] / largestCET
+        normalisedTime = 0 if mostTime == 0 else timeSpentInNetwork[vehicle] / mostTime
+
+        mainMeasures = (vraPercentage * func.FAIRNESS_WEIGHTING) + (cetPercentage * (1 - func.FAIRNESS_WEIGHTING))
+        qoe[vehicle] = 0 if normalisedTime == 0 else mainMeasures / normalisedTime
+
+    largestQOEVal = max([0] + list(qoe.values()))
+    smallestQOEVal = min([sys.maxsize] + list(qoe.values()))
+
+    largestQOE = 0
+    smallestQOE = sys.maxsize
+    for vehicle in qoe:
+        if largestQOEVal == 0:
+            qoe[vehicle] = 1
+        elif largestQOEVal - smallestQOEVal == 0:
+            qoe = dict.fromkeys(qoe, 10)
+            break
+        else:
+            qoe[vehicle] = 10 - ((qoe[vehicle] - smallestQOEVal) / (largestQOEVal - smallestQOEVal) * 10)
+        largestQOE = max(largestQOE, qoe[vehicle])
+        smallestQOE = min(smallestQOE, qoe[vehicle])
+
+    if len(set(qoe.values())) == 1:
+        reroutedFairly = list(qoe.keys())
+    else:
+        qoePercentile = largestQOE * func.PERCENTILE
+        reroutedFairly = [k for k, v in qoe.items() if v >= qoePercentile]
+
+    return reroutedFairly, qoe, largestQOE, smallestQOE
+
+
+def createContext(vehicleCount):
+    """
+    Args:
+        vehicleCount (int): The number of vehicles
+    Returns:
+        (SimulationContext, [str]): A simulation holding random rerouting metrics for the vehicles, and the vehicles
+    """
+    randomGenerator = random.Random(vehicleCount)
+    context = SimulationContext()
+    vehicles = [str(vehicle) for vehicle in range(vehicleCount)]
+
+    for vehicle in vehicles:
+        context.vehicleReroutedAmount[vehicle] = randomGenerator.randint(0, 10)
+        context.cumulativeExtraTime[vehicle] = randomGenerator.uniform(-50, 500)
+        context.timeSpentInNetwork[vehicle] = randomGenerator.randint(0, 3600)
+
+    return context, vehicles
+
+
+def benchmark(vehicleCounts, repeats):
+    """
+    Times both implementations for each number of vehicles and prints the fastest time of each
+
+    Args:
+        vehicleCounts ([int]): The numbers of vehicles
+        repeats (int): The number of times to time each implementation
+    """
+    print('{:>10}{:>15}{:>15}{:>10}'.format('Vehicles', 'Python (ms)', 'NumPy (ms)', 'Speedup'))
+    for vehicleCount in vehicleCounts:
+        context, vehicles = createContext(vehicleCount)
+
+        if selectVehiclesBasedOnFairnessPython(vehicles, context) != \
+                sim.selectVehiclesBasedOnFairness(vehicles, context):
+            raise AssertionError("The selections of {} vehicles differ".format(vehicleCount))
+
+        pythonTime = min(timeit.repeat(lambda: selectVehiclesBasedOnFairnessPython(vehicles, context), number=1,
+                                       repeat=repeats))
+        numpyTime = min(timeit.repeat(lambda: sim.selectVehiclesBasedOnFairness(vehicles, context), number=1,
+                                      repeat=repeats))
+
+        print('{:>10}{:>15.2f}{:>15.2f}{:>9.1f}x'.format(vehicleCount, pythonTime * 1000, numpyTime * 1000,
+                                                         pythonTime / numpyTime))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks selecting vehicles based on their fairness")
+    parser.add_argument('--vehicles', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="The numbers of vehicles")
+    parser.add_argument('--repeats', type=int, default=5, help="The number of times to time each implementation")
+    arguments = parser.parse_args()
+
+    benchmark(arguments.vehicles, arguments.repeats)
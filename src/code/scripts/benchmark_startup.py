@@ -0,0 +1,102 @@
+###################################################################################################################
+# Measures the time taken to start a simulation of the bundled small_southampton scenario (SCENARIO 8): the time  #
+# taken to import SumoConnection, to read the road network through sumolib and through NetReader, and to run the  #
+# first timestep of a simulation with each (and with the road network loaded from the cache).                     #
+#                                                                                                                 #
+# Each measurement takes place in a separate process, so that nothing imported or read is reused between them.    #
+#                                                                                                                 #
+# Usage: python -m src.code.scripts.benchmark_startup [--repeats REPEATS]                                         #
+#                                                                                                                 #
+# Author: Jonathan Harper                                                                                         #
+###################################################################################################################
+
+__author__ = "Jonathan Harper"
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# The measurements taken, in the form {measurement: description}
+MEASUREMENTS = {'import': 'Importing SumoConnection',
+                'sumolib': 'Reading the road network (sumolib)',
+                'netReader': 'Reading the road network (NetReader)',
+                'firstStepSumolib': 'First timestep (sumolib)',
+                'firstStepNetReader': 'First timestep (NetReader)',
+                'firstStepCache': 'First timestep (network cache)'}
+
+
+def runSingle(measurement, cacheDirectory):
+    """
+    Takes a single measurement, printing the time taken (in seconds) as the final line
+
+    Args:
+        measurement (str): The measurement to be taken (of MEASUREMENTS)
+        cacheDirectory (str): The directory holding the network cache, shared between measurements
+    """
+    startTime = time.perf_counter()
+    from src.code import SumoConnection as sumo
+    importTime = time.perf_counter() - startTime
+
+    if measurement == 'import':
+        print(importTime)
+        return
+
+    sumo.loadScenario(8)
+    sumo.FAST_NET_READER = measurement in ('netReader', 'firstStepNetReader')
+
+    if measurement in ('sumolib', 'netReader'):
+        startTime = time.perf_counter()
+        sumo.loadNet()
+        print(time.perf_counter() - startTime)
+        return
+
+    sumo.ALGORITHM = 0
+    sumo.SUMO_GUI = False
+    sumo.SUMO_BINARY = sumo.SUMO_BINARY.replace('sumo-gui', 'sumo')
+    sumo.AUTOMATED_TESTING = True
+    sumo.END_TIME = 1
+    sumo.NETWORK_CACHE = measurement == 'firstStepCache'
+    sumo.NETWORK_CACHE_DIR = cacheDirectory
+    sumo.DATABASE_LOCATION = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite')
+
+    startTime = time.perf_counter()
+    sumo.createSim('routes.xml')
+    print(time.perf_counter() - startTime)
+
+
+def benchmark(repeats):
+    """
+    Takes each measurement the number of times given and prints the fastest
+
+    Args:
+        repeats (int): The number of times to take each measurement
+    """
+    with tempfile.TemporaryDirectory() as cacheDirectory:
+        timesTaken = {}
+        # The first simulation with the cache enabled builds the cache, so isn't measured
+        for measurement in ['firstStepCache'] + list(MEASUREMENTS):
+            timesTaken[measurement] = []
+            for _ in range(repeats):
+                output = subprocess.run([sys.executable, '-m', 'src.code.scripts.benchmark_startup', '--single',
+                                         measurement, cacheDirectory], stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout
+                timesTaken[measurement].append(float(output.strip().splitlines()[-1]))
+
+    print('{:<40}{:>12}'.format('Measurement', 'Time (ms)'))
+    for measurement, description in MEASUREMENTS.items():
+        print('{:<40}{:>12.1f}'.format(description, min(timesTaken[measurement]) * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the start of a simulation of small_southampton")
+    parser.add_argument('--repeats', type=int, default=3, help="The number of times to take each measurement")
+    parser.add_argument('--single', nargs=2, metavar=('MEASUREMENT', 'CACHE_DIRECTORY'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.single:
+        runSingle(*arguments.single)
+    else:
+        benchmark(arguments.repeats)